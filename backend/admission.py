@@ -0,0 +1,285 @@
+"""
+Admission Module
+
+Admission control for the expensive route endpoints, applied before a
+request gets a worker thread:
+- Per-client token buckets, keyed by API key (X-API-Key, when it is one
+  of API_KEYS) or else by client IP. A request costs a fixed amount plus
+  the number of route points in its body, so one client sending large
+  route sets runs out long before one sending small ones. Over the limit:
+  429 with Retry-After for when the bucket will hold enough again
+- Per-endpoint concurrency limits with a bounded wait queue. Requests wait
+  (without holding a thread) until a slot frees up, at most the queue
+  timeout or what is left of the request deadline. Queue full or wait
+  too long: 503 with Retry-After from the endpoint's recent service time
+
+Everything runs on the event loop, so the state needs no locks. With
+several workers each one enforces its own limits.
+"""
+
+import math
+import time
+import json
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Callable, Dict, Optional
+
+import metrics
+import resilience
+
+logger = logging.getLogger(__name__)
+
+
+def json_route_points(body: bytes, content_type: str) -> int:
+    """
+    Estimated route points in a JSON body: every point is one `[lat, lng]`
+    pair, so counting brackets is close enough and far cheaper than parsing
+    """
+    return body.count(b"[")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self, cost: float) -> float:
+        """Take `cost` tokens; returns 0 on success, else seconds until they'd be there"""
+        cost = min(cost, self.burst)  # larger requests drain a full bucket
+        self._refill()
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+    def give_back(self, cost: float) -> None:
+        self.tokens = min(self.burst, self.tokens + min(cost, self.burst))
+
+
+class ClientLimiter:
+    """Token buckets per client; the least recently seen are dropped past `max_clients`"""
+
+    def __init__(self, rate: float, burst: float, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def bucket(self, client: str) -> TokenBucket:
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class QueueFull(Exception):
+    pass
+
+
+class EndpointLimiter:
+    """At most `concurrency` requests running, `queue_size` waiting"""
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.running = 0
+        self.waiting = 0
+        self.service_seconds = 1.0  # moving average, for Retry-After
+        self._semaphore = asyncio.Semaphore(concurrency)
+
+    async def acquire(self) -> None:
+        """
+        Raises:
+            QueueFull: Too many requests already waiting
+            asyncio.TimeoutError: No slot within the queue timeout or deadline
+        """
+        if self._semaphore.locked():
+            if self.waiting >= self.queue_size:
+                raise QueueFull()
+            timeout = max(0.0, min(self.queue_timeout, resilience.time_left()))
+            self.waiting += 1
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout)
+            finally:
+                self.waiting -= 1
+                WAIT_SECONDS.observe(time.perf_counter() - start, self.name)
+        else:
+            await self._semaphore.acquire()
+        self.running += 1
+
+    def release(self, elapsed: float) -> None:
+        self.running -= 1
+        self.service_seconds += 0.2 * (elapsed - self.service_seconds)
+        self._semaphore.release()
+
+    def retry_after(self) -> int:
+        """Seconds until the queue has likely drained"""
+        return max(1, math.ceil(self.service_seconds * (self.waiting + 1) / self.concurrency))
+
+
+class Policy:
+    """Admission settings for one endpoint"""
+
+    def __init__(self, concurrency: int, queue_size: int, queue_timeout: float,
+                 base_cost: float = 100.0, points: Callable[[bytes, str], int] = json_route_points):
+        """
+        Args:
+            concurrency: Requests handled at once (0: unlimited)
+            queue_size: Requests allowed to wait for a slot
+            queue_timeout: Longest wait for a slot, in seconds
+            base_cost: Tokens per request on top of one per route point
+            points: Estimates the route points in a request body (given its content type)
+        """
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.base_cost = base_cost
+        self.points = points
+
+
+REJECTED = metrics.register(metrics.Counter(
+    "safenav_admission_rejected_total", "Requests refused by admission control", ("endpoint", "reason")
+))
+WAIT_SECONDS = metrics.register(metrics.Histogram(
+    "safenav_admission_wait_seconds", "Time queued requests waited for a slot", ("endpoint",)
+))
+
+_limiters: Dict[str, EndpointLimiter] = {}
+
+metrics.gauge(
+    "safenav_admission_queue_depth", "Requests waiting for a slot", ("endpoint",),
+    lambda: {(name,): limiter.waiting for name, limiter in _limiters.items()}
+)
+metrics.gauge(
+    "safenav_admission_in_flight", "Requests holding a slot", ("endpoint",),
+    lambda: {(name,): limiter.running for name, limiter in _limiters.items()}
+)
+
+
+async def _reject(send, status: int, message: str, retry_after: int) -> None:
+    body = json.dumps({"message": message}).encode()
+    await send({"type": "http.response.start", "status": status, "headers": [
+        (b"content-type", b"application/json"),
+        (b"content-length", str(len(body)).encode()),
+        (b"retry-after", str(retry_after).encode()),
+    ]})
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware applying `policies` ({path: Policy}) to POST requests;
+    other requests pass straight through
+    """
+
+    def __init__(self, app, policies: Dict[str, Policy], client_rate: float, client_burst: float,
+                 api_keys: Optional[set] = None, key_header: str = "X-API-Key"):
+        """
+        Args:
+            policies: Admission settings per request path
+            client_rate: Tokens (route points) per second per client (0: no rate limit)
+            client_burst: Bucket size per client
+            api_keys: Recognised API keys; other clients are limited per IP
+            key_header: Header carrying the API key
+        """
+        self.app = app
+        self.policies = policies
+        self.clients = ClientLimiter(client_rate, client_burst) if client_rate > 0 else None
+        self.api_keys = api_keys or set()
+        self.key_header = key_header.lower().encode("latin-1")
+        for path, policy in policies.items():
+            if policy.concurrency > 0:
+                _limiters[path] = EndpointLimiter(path, policy.concurrency, policy.queue_size, policy.queue_timeout)
+
+    def _client(self, scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == self.key_header:
+                key = value.decode("latin-1")
+                if key in self.api_keys:
+                    return f"key:{key}"
+                break
+        client = scope.get("client")
+        return f"ip:{client[0]}" if client else "ip:unknown"
+
+    async def __call__(self, scope, receive, send):
+        policy = self.policies.get(scope.get("path")) if scope["type"] == "http" else None
+        if policy is None or scope.get("method") != "POST":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+
+        # The body is needed for the cost; buffer it and replay it to the app
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+        replayed = False
+
+        async def replay():
+            nonlocal replayed
+            if not replayed:
+                replayed = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        content_type = ""
+        for name, value in scope.get("headers", []):
+            if name == b"content-type":
+                content_type = value.decode("latin-1")
+                break
+        cost = policy.base_cost + policy.points(body, content_type)
+        bucket = None
+        if self.clients is not None:
+            client = self._client(scope)
+            bucket = self.clients.bucket(client)
+            wait = bucket.take(cost)
+            if wait > 0:
+                REJECTED.inc(path, "rate_limited")
+                logger.warning(f"Rate limited {client} on {path} (cost {cost:.0f})")
+                await _reject(send, 429, "Rate limit exceeded, retry later", max(1, math.ceil(wait)))
+                return
+
+        limiter = _limiters.get(path)
+        if limiter is None:
+            await self.app(scope, replay, send)
+            return
+
+        try:
+            await limiter.acquire()
+        except (QueueFull, asyncio.TimeoutError) as e:
+            reason = "queue_full" if isinstance(e, QueueFull) else "queue_timeout"
+            REJECTED.inc(path, reason)
+            if bucket is not None:
+                bucket.give_back(cost)  # not the client's fault
+            logger.warning(f"Shed {path}: {reason} ({limiter.running} running, {limiter.waiting} waiting)")
+            await _reject(send, 503, "Server busy, retry later", limiter.retry_after())
+            return
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, replay, send)
+        finally:
+            limiter.release(time.perf_counter() - start)
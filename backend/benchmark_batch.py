@@ -0,0 +1,109 @@
+"""
+Benchmark: /score-routes/batch vs the same work through /score-routes
+
+Scores N route sets once with one /score-routes call per set, then once
+with a single /score-routes/batch call, against a running server.
+
+    python benchmark_batch.py --sets 50 --routes 2 --points 300
+
+Each run uses freshly jittered routes so the response cache does not
+serve either side. /score-routes always asks Gemini for insights, so the
+batch does too; --no-gemini measures the batch with fallback summaries
+(not a like-for-like comparison).
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import requests
+
+# Kolkata area, as in test_dijkstra.py
+START = [22.5726, 88.3639]
+END = [22.6208, 88.4300]
+
+
+def make_route(points, jitter):
+    """Polyline from START to END bent through a random waypoint"""
+    mid = [
+        (START[0] + END[0]) / 2 + random.uniform(-jitter, jitter),
+        (START[1] + END[1]) / 2 + random.uniform(-jitter, jitter)
+    ]
+    half = points // 2
+    route = []
+    for a, b, n in ((START, mid, half), (mid, END, points - half)):
+        for i in range(n):
+            t = i / n
+            route.append([a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t])
+    route.append(END)
+    return route
+
+
+def make_sets(count, routes, points):
+    return [
+        {"id": f"set-{i}", "mode": "monsoon", "routes": [{"coordinates": make_route(points, 0.03)} for _ in range(routes)]}
+        for i in range(count)
+    ]
+
+
+def run_single(url, sets):
+    start = time.time()
+    for s in sets:
+        response = requests.post(f"{url}/score-routes", json={"routes": s["routes"], "mode": s["mode"]}, timeout=600)
+        response.raise_for_status()
+    return time.time() - start
+
+
+def run_batch(url, sets, gemini):
+    start = time.time()
+    first_line = None
+    lines = 0
+    with requests.post(
+        f"{url}/score-routes/batch", json={"sets": sets, "use_gemini": gemini}, stream=True, timeout=600
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            if first_line is None:
+                first_line = time.time() - start
+            item = json.loads(line)
+            if "summary" not in item:
+                lines += 1
+    assert lines == len(sets), f"expected {len(sets)} result lines, got {lines}"
+    return time.time() - start, first_line
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--sets", type=int, default=20)
+    parser.add_argument("--routes", type=int, default=2, help="routes per set")
+    parser.add_argument("--points", type=int, default=300, help="points per route")
+    parser.add_argument("--no-gemini", dest="gemini", action="store_false",
+                        help="batch uses fallback summaries instead of Gemini insights")
+    args = parser.parse_args()
+
+    total_routes = args.sets * args.routes
+    print("Batch scoring benchmark")
+    print("=" * 60)
+    print(f"{args.sets} sets x {args.routes} routes x {args.points} points = {total_routes} routes")
+    print()
+
+    try:
+        single = run_single(args.url, make_sets(args.sets, args.routes, args.points))
+        batch, first = run_batch(args.url, make_sets(args.sets, args.routes, args.points), args.gemini)
+    except requests.RequestException as e:
+        print(f"✗ Error: {e}")
+        sys.exit(1)
+
+    print(f"{'/score-routes (one call per set)':<32}: {single:8.2f}s  {total_routes / single:8.1f} routes/s")
+    label = "/score-routes/batch" if args.gemini else "/score-routes/batch (no Gemini)"
+    print(f"{label:<32}: {batch:8.2f}s  {total_routes / batch:8.1f} routes/s"
+          f"  (first set after {first:.2f}s)")
+    print(f"Speedup: {single / batch:.1f}x")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,334 @@
+"""
+Offline benchmark suite for the routing and scoring hot paths
+
+Runs without network access or credentials: Firestore, Gemini and the
+OpenWeather HTTP API are replaced by deterministic in-process stubs before
+main.py is imported, and route sets are generated from a fixed seed.
+
+Timed:
+    predict_route_risk            one route
+    dijkstra_shortest_safest_path route set (--routes routes)
+    get_reports_on_route          one route against --reports hazards
+    POST /score-routes            full handler through TestClient
+    POST /dijkstra-multi-route    full handler through TestClient
+    ... polyline                  same, polyline request and response
+    parse json|polyline|f32|octet-stream
+                                  request body to DijkstraRequest, per
+                                  wire format (see wire.py)
+
+    python benchmark_suite.py --sizes 100,1000,5000,20000 --output bench.json
+    python benchmark_suite.py --sizes 100,1000 --compare bench.json
+
+Response and weather caches are cleared before every run, so each run does
+the full work. Results are JSON so runs from different commits can be diffed
+with --compare.
+"""
+import os
+import sys
+import json
+import time
+import types
+import random
+import hashlib
+import platform
+import argparse
+import datetime
+import statistics
+import subprocess
+
+# Kolkata area, as in test_dijkstra.py
+ORIGIN = (22.5726, 88.3639)
+
+
+# ---------------------------------------------------------------------- stubs
+
+def install_stubs():
+    """Register in-memory firebase_admin and google.generativeai modules"""
+    store = {}
+
+    class Doc:
+        def __init__(self, collection, key):
+            self.collection, self.id = collection, key
+            self.reference = self
+
+        def set(self, data, merge=False):
+            self.collection[self.id] = {**self.collection.get(self.id, {}), **data} if merge else dict(data)
+
+        def update(self, data):
+            if self.id not in self.collection:
+                raise KeyError(self.id)
+            self.collection[self.id].update(data)
+
+        def delete(self):
+            self.collection.pop(self.id, None)
+
+        def to_dict(self):
+            return dict(self.collection[self.id])
+
+    class Query:
+        OPS = {"<": lambda a, b: a < b, ">": lambda a, b: a > b, ">=": lambda a, b: a >= b, "==": lambda a, b: a == b}
+
+        def __init__(self, collection, filters=()):
+            self.collection, self.filters = collection, filters
+
+        def where(self, field, op, value):
+            return Query(self.collection, self.filters + ((field, self.OPS[op], value),))
+
+        def document(self, key):
+            return Doc(self.collection, key)
+
+        def stream(self):
+            return [
+                Doc(self.collection, key) for key, data in list(self.collection.items())
+                if all(field in data and op(data[field], value) for field, op, value in self.filters)
+            ]
+
+    class Client:
+        def collection(self, name):
+            return Query(store.setdefault(name, {}))
+
+    firebase_admin = types.ModuleType("firebase_admin")
+    firebase_admin._apps = {"[DEFAULT]": object()}  # skip credential loading
+    firebase_admin.initialize_app = lambda *a, **k: None
+    credentials = types.ModuleType("firebase_admin.credentials")
+    credentials.Certificate = lambda value: value
+    firestore = types.ModuleType("firebase_admin.firestore")
+    firestore.client = Client
+    firebase_admin.credentials, firebase_admin.firestore = credentials, firestore
+
+    class Response:
+        text = "Route conditions look stable\nNo reported hazards on this route"
+
+    class GenerativeModel:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def generate_content(self, prompt):
+            return Response()
+
+    google = sys.modules.get("google") or types.ModuleType("google")
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = lambda **kwargs: None
+    genai.GenerativeModel = GenerativeModel
+    google.generativeai = genai
+
+    sys.modules.update({
+        "firebase_admin": firebase_admin,
+        "firebase_admin.credentials": credentials,
+        "firebase_admin.firestore": firestore,
+        "google": google,
+        "google.generativeai": genai,
+    })
+    return store
+
+
+class StubResponse:
+    def __init__(self, payload):
+        self.payload = payload
+        self.status_code = 200
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+
+def stub_requests_get(url, params=None, **kwargs):
+    """Deterministic OpenWeather responses (current weather and geocoding)"""
+    params = params or {}
+    if "geo" in url:
+        return StubResponse([{"lat": ORIGIN[0], "lon": ORIGIN[1]}])
+    cell = f"{float(params.get('lat', 0)):.2f},{float(params.get('lon', 0)):.2f}"
+    rain = int(hashlib.md5(cell.encode()).hexdigest()[:2], 16) / 255 * 12
+    return StubResponse({
+        "main": {"temp": 29.0, "humidity": 80, "pressure": 1005},
+        "rain": {"1h": round(rain, 2)},
+        "wind": {"speed": 3.0},
+        "weather": [{"main": "Rain"}],
+        "dt": int(time.time()),
+    })
+
+
+# ----------------------------------------------------------------- workloads
+
+def make_route(rng, points, start=ORIGIN, step=0.0004):
+    """Random-walk polyline heading roughly north-east"""
+    lat, lng = start
+    route = [[lat, lng]]
+    for _ in range(points - 1):
+        lat += step * rng.uniform(0.2, 1.0)
+        lng += step * rng.uniform(0.2, 1.0)
+        route.append([round(lat, 6), round(lng, 6)])
+    return route
+
+
+def make_route_set(rng, routes, points):
+    """Routes sharing start and end points, as the client sends them"""
+    route_set = [make_route(rng, points) for _ in range(routes)]
+    end = route_set[0][-1]
+    for route in route_set[1:]:
+        route[-1] = list(end)
+    return route_set
+
+
+def make_reports(rng, count, route):
+    """Hazard reports, a third of them on the route"""
+    expires = (datetime.datetime.now() + datetime.timedelta(days=1)).isoformat()
+    reports = []
+    for i in range(count):
+        if i % 3 == 0:
+            lat, lng = route[rng.randrange(len(route))]
+        else:
+            lat = ORIGIN[0] + rng.uniform(-0.2, 0.2)
+            lng = ORIGIN[1] + rng.uniform(-0.2, 0.2)
+        reports.append({
+            "id": f"bench-{i}", "lat": lat, "lng": lng, "issue_type": "flood",
+            "description": "Synthetic report", "image_url": None, "timestamp": expires
+        })
+    return reports
+
+
+# -------------------------------------------------------------------- timing
+
+def measure(fn, repeat, budget, reset):
+    """Run fn up to `repeat` times (at least once) within a time budget"""
+    times = []
+    started = time.perf_counter()
+    while len(times) < repeat:
+        reset()
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+        if time.perf_counter() - started > budget:
+            break
+    return {
+        "runs": len(times),
+        "min_ms": round(min(times), 3),
+        "median_ms": round(statistics.median(times), 3),
+        "mean_ms": round(statistics.fmean(times), 3),
+        "max_ms": round(max(times), 3),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["name"], r["points"]): r for r in json.load(f)["results"]}
+    print()
+    print(f"{'benchmark':36} {'points':>7} {'before ms':>11} {'after ms':>11} {'change':>8}")
+    for r in results:
+        old = baseline.get((r["name"], r["points"]))
+        if old is None:
+            continue
+        change = r["median_ms"] / old["median_ms"] if old["median_ms"] else float("inf")
+        print(f"{r['name']:36} {r['points']:>7} {old['median_ms']:>11.1f} {r['median_ms']:>11.1f} {change:>7.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,5000,20000", help="points per route, comma separated")
+    parser.add_argument("--routes", type=int, default=3, help="routes per set")
+    parser.add_argument("--reports", type=int, default=200, help="active hazard reports")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=20.0, help="seconds per benchmark before stopping repeats")
+    parser.add_argument("--only", default=None, help="comma separated benchmark names")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="write JSON results here")
+    parser.add_argument("--compare", default=None, help="baseline JSON to compare against")
+    args = parser.parse_args()
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.getcwd())
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("OPENWEATHER_API_KEY", "benchmark")
+    os.environ["ROAD_GRAPH_PATH"] = os.environ.get("BENCH_ROAD_GRAPH_PATH", "__no_road_graph__.npz")
+    os.environ["TILE_CACHE_DIR"] = ""
+    os.environ["ADMISSION_CLIENT_RATE"] = "0"  # every request comes from one client
+    store = install_stubs()
+
+    import logging
+    logging.disable(logging.CRITICAL)
+    import main as app_main
+    import wire
+    from fastapi.testclient import TestClient
+    app_main.requests.get = stub_requests_get
+
+    def reset():
+        app_main.weather_cache.clear()
+        app_main.route_responses.clear()
+
+    rng = random.Random(args.seed)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    only = set(args.only.split(",")) if args.only else None
+    results = []
+
+    with TestClient(app_main.app) as client:
+        for size in sizes:
+            route_set = make_route_set(rng, args.routes, size)
+            reports = make_reports(rng, args.reports, route_set[0])
+            store.setdefault("reports", {}).clear()
+            for report in reports:
+                store["reports"][report["id"]] = dict(report)
+            app_main.report_log.sync(app_main.database.get_all_reports())
+
+            body = {"routes": [{"coordinates": r} for r in route_set], "mode": "monsoon"}
+            polyline_body = {"routes": [{"polyline": wire.encode_polyline(r)} for r in route_set], "mode": "monsoon"}
+            wire_bodies = {
+                "json": (json.dumps(body).encode(), "application/json"),
+                "polyline": (json.dumps(polyline_body).encode(), "application/json"),
+                "f32": (json.dumps({
+                    "routes": [{"points_f32": wire.encode_f32(r)} for r in route_set], "mode": "monsoon"
+                }).encode(), "application/json"),
+                "octet-stream": (wire.pack_routes(route_set), wire.OCTET_STREAM),
+            }
+            benchmarks = {
+                "predict_route_risk": lambda: app_main.predict_route_risk(route_set[0], 7),
+                "dijkstra_shortest_safest_path": lambda: app_main.dijkstra_shortest_safest_path(route_set, 7),
+                "get_reports_on_route": lambda: app_main.get_reports_on_route(route_set[0], reports),
+                "POST /score-routes": lambda: client.post("/score-routes", json=body).raise_for_status(),
+                "POST /dijkstra-multi-route": lambda: client.post("/dijkstra-multi-route", json=body).raise_for_status(),
+                "POST /dijkstra-multi-route polyline": lambda: client.post(
+                    "/dijkstra-multi-route?format=polyline", json=polyline_body
+                ).raise_for_status(),
+            }
+            for fmt, (raw, content_type) in wire_bodies.items():
+                benchmarks[f"parse {fmt}"] = lambda raw=raw, content_type=content_type: app_main.parse_route_body(
+                    app_main.DijkstraRequest, raw, content_type, {"mode": "monsoon"}
+                )
+            for name, fn in benchmarks.items():
+                if only and name not in only:
+                    continue
+                stats = measure(fn, args.repeat, args.budget, reset)
+                results.append({"name": name, "points": size, "routes": args.routes, **stats})
+                print(f"{name:36} {size:>7} pts  median {stats['median_ms']:>10.1f} ms  ({stats['runs']} runs)")
+
+    output = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(output, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,10 @@ import datetime
 from typing import List
 import os
 import json
+import logging
+import metrics
+
+logger = logging.getLogger(__name__)
 
 # Initialize Firebase Admin SDK
 # Check for environment variable first (Production), then file (Local)
@@ -18,20 +22,34 @@ if not firebase_admin._apps:
             cred_dict = json.loads(firebase_creds_env)
             cred = credentials.Certificate(cred_dict)
             firebase_admin.initialize_app(cred)
-            print("✓ Firebase initialized from environment variable")
+            logger.info("✓ Firebase initialized from environment variable")
         except json.JSONDecodeError as e:
-            print(f"Error parsing FIREBASE_CREDENTIALS: {e}")
+            logger.error(f"Error parsing FIREBASE_CREDENTIALS: {e}")
     elif os.path.exists(cred_path):
         # Local: Load from file
         cred = credentials.Certificate(cred_path)
         firebase_admin.initialize_app(cred)
-        print("✓ Firebase initialized from local file")
+        logger.info("✓ Firebase initialized from local file")
     else:
-        print("Warning: No Firebase credentials found (Env var or File)")
+        logger.warning("No Firebase credentials found (Env var or File)")
 
 db = firestore.client()
 COLLECTION_NAME = "reports"
 
+# Callbacks fn(event, report) notified on "added", "updated" and "expired"
+_listeners = []
+
+def add_listener(callback):
+    """Register a callback for report changes."""
+    _listeners.append(callback)
+
+def _notify(event: str, report: dict):
+    for callback in _listeners:
+        try:
+            callback(event, report)
+        except Exception as e:
+            logger.warning(f"Report listener failed on {event}: {e}")
+
 def init_db():
     """
     Firestore is schemaless, so no table creation is needed.
@@ -39,19 +57,32 @@ def init_db():
     """
     try:
         # Optional: Check connection by trying to get a reference
-        print("✓ Connected to Firestore")
+        logger.info("✓ Connected to Firestore")
     except Exception as e:
-        print(f"Error connecting to Firestore: {e}")
+        logger.error(f"Error connecting to Firestore: {e}")
 
 def add_report(report: dict):
     """Add a new report to Firestore."""
     try:
         # Use the report ID as the document ID
         doc_ref = db.collection(COLLECTION_NAME).document(report['id'])
-        doc_ref.set(report)
-        print(f"Report {report['id']} added to Firestore")
+        with metrics.upstream("firestore"):
+            doc_ref.set(report)
+        logger.info(f"Report {report['id']} added to Firestore")
+        _notify("added", report)
+    except Exception as e:
+        logger.error(f"Failed to add report: {e}")
+
+def update_report(report_id: str, fields: dict):
+    """Merge fields into an existing report in Firestore."""
+    try:
+        with metrics.upstream("firestore"):
+            db.collection(COLLECTION_NAME).document(report_id).update(fields)
+        logger.info(f"Report {report_id} updated in Firestore")
+        _notify("updated", {"id": report_id, **fields})
     except Exception as e:
-        print(f"Failed to add report: {e}")
+        # Report may already have expired and been deleted
+        logger.warning(f"Failed to update report {report_id}: {e}")
 
 def cleanup_expired_reports():
     """
@@ -64,18 +95,22 @@ def cleanup_expired_reports():
 
         # Query for documents where timestamp is less than cutoff
         # Note: You might need to create a composite index in Firebase Console if you filter by multiple fields
-        docs = db.collection(COLLECTION_NAME).where('timestamp', '<', cutoff_iso).stream()
+        with metrics.upstream("firestore"):
+            docs = list(db.collection(COLLECTION_NAME).where('timestamp', '<', cutoff_iso).stream())
 
         deleted_count = 0
         for doc in docs:
-            doc.reference.delete()
+            expired = doc.to_dict()
+            with metrics.upstream("firestore"):
+                doc.reference.delete()
             deleted_count += 1
+            _notify("expired", expired)
         
         if deleted_count > 0:
-            print(f"Cleaned up {deleted_count} expired reports")
+            logger.info(f"Cleaned up {deleted_count} expired reports")
             
     except Exception as e:
-        print(f"Cleanup failed: {e}")
+        logger.error(f"Cleanup failed: {e}")
 
 def get_all_reports() -> List[dict]:
     """Retrieve valid reports (not expired) from Firestore."""
@@ -86,12 +121,13 @@ def get_all_reports() -> List[dict]:
     # 2. Fetch remaining reports
     try:
         reports = []
-        docs = db.collection(COLLECTION_NAME).stream()
+        with metrics.upstream("firestore"):
+            docs = list(db.collection(COLLECTION_NAME).stream())
         
         for doc in docs:
             reports.append(doc.to_dict())
             
         return reports
     except Exception as e:
-        print(f"Failed to fetch reports: {e}")
+        logger.error(f"Failed to fetch reports: {e}")
         return []
@@ -0,0 +1,102 @@
+"""
+Degradation Module
+
+Graceful degradation of route scoring under a latency budget. Steps, in
+the order they kick in as the request deadline approaches:
+1. coarse_sampling: sample route points more sparsely, so the remaining
+   routes' model work fits in part of the time left
+2. cached_weather: use cached (even stale) weather only, no upstream calls
+3. fallback_summaries: template summaries instead of Gemini
+
+Decisions use the time left on the request deadline (resilience.time_left)
+and running estimates of the cost per sampled point and per Gemini call.
+"""
+
+import math
+import threading
+from typing import List
+
+import resilience
+
+MIN_SAMPLES_PER_ROUTE = 5
+
+
+class UnitCost:
+    """
+    Moving average of seconds per unit of work: a sampled route point
+    (weather + model) or a Gemini call
+    """
+
+    def __init__(self, initial: float = 0.03, alpha: float = 0.2):
+        self.seconds = initial
+        self.alpha = alpha
+        self._lock = threading.Lock()
+
+    def update(self, elapsed: float, units: int = 1) -> None:
+        if units <= 0:
+            return
+        with self._lock:
+            self.seconds += self.alpha * (elapsed / units - self.seconds)
+
+
+class Budget:
+    """Degradation decisions for one request; records the steps it applied"""
+
+    def __init__(self, point_cost: UnitCost, summary_cost: UnitCost, sampling_share: float = 0.6, cached_weather_share: float = 0.5):
+        """
+        Args:
+            point_cost: Shared per-point cost estimate
+            summary_cost: Shared per-Gemini-call cost estimate
+            sampling_share: Fraction of the time left that model work may use
+            cached_weather_share: Switch to cached weather once less than this
+                fraction of the initial budget is left
+        """
+        self.point_cost = point_cost
+        self.summary_cost = summary_cost
+        self.sampling_share = sampling_share
+        self.initial = resilience.time_left()
+        self.cached_weather_below = self.initial * cached_weather_share
+        self.max_stride = 0
+        self.base_stride = 0
+        self._weather = False
+        self._summaries = False
+
+    def stride(self, base: int, points: int, points_left: int) -> int:
+        """
+        Sampling stride for the next route of `points` points, given the
+        points in all routes still to score (this one included); never fewer
+        than MIN_SAMPLES_PER_ROUTE samples
+        """
+        self.base_stride = base
+        left = resilience.time_left()
+        if math.isinf(left) or points_left <= 0:
+            return base
+        affordable = max(1, int(max(left, 0.0) * self.sampling_share / self.point_cost.seconds))
+        if math.ceil(points_left / base) <= affordable:
+            return base
+        stride = min(math.ceil(points_left / affordable), max(base, math.ceil(points / MIN_SAMPLES_PER_ROUTE)))
+        if stride > base:
+            self.max_stride = max(self.max_stride, stride)
+        return max(stride, base)
+
+    def cached_weather(self) -> bool:
+        if not self._weather and resilience.time_left() < self.cached_weather_below:
+            self._weather = True
+        return self._weather
+
+    def fallback_summaries(self, calls: int) -> bool:
+        """True once the Gemini calls still to make no longer fit in the time left"""
+        if not self._summaries and resilience.time_left() < calls * self.summary_cost.seconds:
+            self._summaries = True
+        return self._summaries
+
+    @property
+    def applied(self) -> List[dict]:
+        steps = []
+        if self.max_stride:
+            steps.append({"step": "coarse_sampling", "stride": self.max_stride, "default_stride": self.base_stride})
+        if self._weather:
+            steps.append({"step": "cached_weather"})
+        if self._summaries:
+            steps.append({"step": "fallback_summaries"})
+        return steps
@@ -0,0 +1,138 @@
+"""
+Departures Module
+
+Departure-time planning over the weather forecast:
+- Candidate departures: now, then every forecast slot within a horizon
+- Expected risk of a fixed route set for all departures at once
+  (one model pass, then a vectorized departures x segments evaluation),
+  with forecasts for the routes' own weather cells
+- Parallel sweep of per-departure evaluations and ranking of the windows
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+import numpy as np
+
+import risk_model
+import risk_weights
+from road_graph import haversine_km
+
+MAX_HORIZON_HOURS = 120  # the 5-day forecast
+
+
+def departure_times(now: float, slot_times: Sequence[float], horizon_hours: float) -> List[float]:
+    """Now, followed by every forecast slot start within the horizon"""
+    end = now + min(horizon_hours, MAX_HORIZON_HOURS) * 3600
+    return [now] + [t for t in slot_times if now < t <= end]
+
+
+class RouteSet:
+    """
+    Fixed candidate routes prepared once for evaluation at many departures
+
+    Model outputs and segment geometry don't depend on the departure time,
+    so they are computed once; only rain varies per departure.
+    """
+
+    def __init__(self, routes: Sequence[Sequence[Sequence[float]]], clf, reg, month: int):
+        """
+        Args:
+            routes: Polylines of [lat, lng] points
+            clf, reg: Flood models
+            month: Month number used for the model features
+        """
+        mid_lat, mid_lng, length, offset, route_of = [], [], [], [], []
+        self.distance_km = []
+
+        for idx, route in enumerate(routes):
+            points = np.asarray(route, dtype=np.float64).reshape(-1, 2)
+            if len(points) < 2:
+                self.distance_km.append(0.0)
+                continue
+            seg = haversine_km(points[:-1, 0], points[:-1, 1], points[1:, 0], points[1:, 1])
+            mid_lat.append((points[:-1, 0] + points[1:, 0]) / 2)
+            mid_lng.append((points[:-1, 1] + points[1:, 1]) / 2)
+            length.append(seg)
+            # Distance already covered when each segment is entered
+            offset.append(np.concatenate([[0.0], np.cumsum(seg)[:-1]]))
+            route_of.append(np.full(len(seg), idx))
+            self.distance_km.append(float(seg.sum()))
+
+        self.route_count = len(routes)
+        concat = lambda parts: np.concatenate(parts) if parts else np.zeros(0)
+        self.mid_lat = concat(mid_lat)
+        self.mid_lng = concat(mid_lng)
+        self.length_km = concat(length)
+        self.offset_km = concat(offset)
+        self.route_of = concat(route_of).astype(np.int64)
+        self.probability, self.severity = risk_model.predict_points(clf, reg, self.mid_lat, self.mid_lng, month)
+
+    def costs(self, departures: Sequence[float], rain_fn: Callable, speed_kmh: float) -> np.ndarray:
+        """
+        Risk-weighted cost of every route for every departure
+
+        Args:
+            departures: Epoch seconds, shape (d,)
+            rain_fn: (lats, lngs, when) -> rain (mm/h), when shaped (d, segments)
+            speed_kmh: Assumed travel speed for arrival times along the route
+
+        Returns:
+            (d, route_count) costs, same units as road graph edge weights
+        """
+        departures = np.asarray(departures, dtype=np.float64)
+        costs = np.zeros((len(departures), self.route_count))
+        if len(self.length_km) == 0:
+            return costs
+
+        when = departures[:, None] + (self.offset_km / speed_kmh * 3600.0)[None, :]
+        rain = rain_fn(self.mid_lat, self.mid_lng, when)
+        segment_cost = self.length_km * risk_model.edge_weight_factor(self.probability, self.severity, rain)
+        for d in range(len(departures)):
+            costs[d] = np.bincount(self.route_of, weights=segment_cost[d], minlength=self.route_count)
+        return costs
+
+
+class RouteForecast:
+    """
+    Forecast rain along a route set, from the forecasts of the weather
+    cells the routes cross (independent of any road graph)
+    """
+
+    def __init__(self, route_set: RouteSet, forecast_fn: Callable, decimals: int = 1, workers: int = 8):
+        """
+        Args:
+            route_set: Routes whose segment midpoints need rain
+            forecast_fn: (lat, lng) -> [(epoch seconds, rain mm/h), ...]
+            decimals: Forecast cell size as rounding decimals of lat/lng
+            workers: Concurrent forecast fetches
+        """
+        points = np.stack([route_set.mid_lat, route_set.mid_lng], axis=1)
+        self.cells = np.unique(np.round(points, decimals), axis=0)
+        results = risk_weights.fetch_forecasts(forecast_fn, self.cells, workers)
+        self.fetched = sum(r is not None for r in results)
+        resampled = risk_weights.resample_forecasts(results)
+        self.times: List[float] = [] if resampled is None else resampled[0].tolist()
+        self._rain: Optional[np.ndarray] = None if resampled is None else resampled[1]
+
+    @property
+    def available(self) -> bool:
+        return self._rain is not None
+
+    def rain_at(self, lats, lngs, when) -> np.ndarray:
+        """Forecast rain (mm/h) at points and times (see risk_weights.interpolate_rain)"""
+        return risk_weights.interpolate_rain(np.asarray(self.times), self._rain, self.cells, lats, lngs, when)
+
+
+def sweep(departures: Sequence[float], evaluate: Callable[[float], dict], workers: int = 4) -> List[dict]:
+    """Evaluate every departure on a thread pool; results keep departure order"""
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(departures)))) as pool:
+        return list(pool.map(evaluate, departures))
+
+
+def rank(windows: List[dict]) -> List[dict]:
+    """Order windows by expected risk (then distance) and number them"""
+    ranked = sorted(windows, key=lambda w: (w["expected_risk"], w["distance_km"]))
+    for i, window in enumerate(ranked):
+        window["rank"] = i + 1
+    return ranked
@@ -0,0 +1,404 @@
+"""
+Contraction Hierarchy Module
+
+Customizable contraction hierarchy (CCH) over a RoadGraph:
+- Metric-independent preprocessing: nested-dissection node order (inertial
+  flow cuts), chordal fill-in (shortcuts) and lower-triangle lists, done
+  once per road graph, offline
+- Customization: applies a weight profile in a few vectorized passes, so
+  weather-driven weight changes never need a rebuild
+- Queries: bidirectional elimination-tree search, no priority queue
+
+Precompute the topology next to the road graph:
+
+    python graph_ch.py build road_graph.npz road_graph.cch.npz
+"""
+
+import sys
+import math
+import time
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, maximum_flow
+
+from road_graph import RoadGraph
+
+logger = logging.getLogger(__name__)
+
+LEAF_SIZE = 32
+# Share of a part's nodes (along the cut direction) held on each side of a flow cut
+FLOW_SIDE_SHARE = 0.25
+
+
+def _flow_cut(k: int, u: np.ndarray, v: np.ndarray, coord: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Minimum vertex cut between the first and last FLOW_SIDE_SHARE of a part's
+    nodes along `coord` (inertial flow), as a unit-capacity max flow over the
+    split-node graph: in(i) -> out(i) costs 1, edges are free
+
+    Args:
+        k: Nodes in the part
+        u, v: Internal edges, in local node ids
+        coord: Position of each local node along the cut direction
+
+    Returns:
+        (separator, left mask) in local node ids
+    """
+    by_coord = np.argsort(coord, kind="stable")
+    group = max(1, int(k * FLOW_SIDE_SHARE))
+    nodes = np.arange(k, dtype=np.int32)
+    source, sink = 2 * k, 2 * k + 1
+    free = k + 1  # more than any flow, so edges are never cut
+    tails = np.concatenate((nodes, k + u, k + v, np.full(group, source), k + by_coord[-group:]))
+    heads = np.concatenate((k + nodes, v, u, by_coord[:group], np.full(group, sink)))
+    capacity = np.concatenate((np.ones(k, dtype=np.int32), np.full(2 * len(u) + 2 * group, free, dtype=np.int32)))
+    graph = csr_matrix((capacity, (tails, heads)), shape=(2 * k + 2, 2 * k + 2))
+
+    flow = maximum_flow(graph, source, sink).flow
+    residual = (graph - flow).tocsr()
+    residual.data[residual.data < 0] = 0
+    residual.eliminate_zeros()
+    reached = np.zeros(2 * k + 2, dtype=bool)
+    reached[breadth_first_order(residual, source, directed=True, return_predecessors=False)] = True
+
+    left = reached[k:2 * k]
+    separator = np.flatnonzero(reached[:k] & ~left)
+    return separator, left
+
+
+def nested_dissection_order(graph: RoadGraph, leaf_size: int = LEAF_SIZE) -> np.ndarray:
+    """
+    Nested dissection by inertial flow: each part is cut along a few
+    directions by a minimum vertex cut between its two ends, the smallest
+    separator wins (ties: the more balanced cut), and separators are
+    contracted last. Disconnected parts split with an empty separator.
+
+    Returns:
+        Node ids in contraction order (first = least important)
+    """
+    cos_lat = math.cos(math.radians(float(np.mean(graph.lat)))) if graph.node_count else 1.0
+    x = graph.lng * cos_lat
+    y = graph.lat
+    directions = [x, y, x + y, x - y]
+
+    order: List[np.ndarray] = []
+    # Side of each node within the part being split; only entries of that part are read
+    side = np.zeros(graph.node_count, dtype=np.int8)
+    local = np.zeros(graph.node_count, dtype=np.int32)
+    # Explicit stack of (nodes, internal edge ids, separator to emit)
+    stack = [(np.arange(graph.node_count, dtype=np.int32), np.arange(graph.edge_count, dtype=np.int32), None)]
+
+    while stack:
+        nodes, edges, separator = stack.pop()
+        if separator is not None:
+            order.append(separator)
+            continue
+
+        if len(nodes) <= leaf_size:
+            order.append(nodes)
+            continue
+
+        u, v = graph.edge_u[edges], graph.edge_v[edges]
+        local[nodes] = np.arange(len(nodes), dtype=np.int32)
+        lu, lv = local[u], local[v]
+        best_sep, best_balance = None, 0.0
+        for axis in directions:
+            sep, left = _flow_cut(len(nodes), lu, lv, axis[nodes])
+            balance = min(left.sum(), len(nodes) - len(sep) - left.sum()) / len(nodes)
+            if best_sep is None or len(sep) < len(best_sep) or \
+                    (len(sep) == len(best_sep) and balance > best_balance):
+                best_sep, best_balance, best_left = sep, balance, left
+
+        side[nodes] = np.where(best_left, 0, 1)
+        best_sep = nodes[best_sep]
+        side[best_sep] = 2
+        parts = []
+        for s in (0, 1):
+            part_nodes = nodes[side[nodes] == s]
+            part_edges = edges[(side[u] == s) & (side[v] == s)]
+            if len(part_nodes):
+                parts.append((part_nodes, part_edges, None))
+
+        # Stack is LIFO: separator is emitted after both parts
+        if len(best_sep):
+            stack.append((None, None, best_sep))
+        stack.extend(reversed(parts))
+
+    return np.concatenate(order) if order else np.zeros(0, dtype=np.int32)
+
+
+class Metric:
+    """Customized arc weights for one weight profile"""
+
+    def __init__(self, weight: np.ndarray, middle: np.ndarray):
+        self.weight = weight
+        self.middle = middle
+        self._weight_list = weight.tolist()
+
+
+class CCH:
+    """Metric-independent CCH topology (everything indexed by rank)"""
+
+    def __init__(self, arrays: dict):
+        self.order = arrays["order"]              # rank -> node
+        self.rank = arrays["rank"]                # node -> rank
+        self.parent = arrays["parent"]            # elimination tree parent (rank), -1 for roots
+        self.up_indptr = arrays["up_indptr"]      # arcs of lower endpoint r: up_indptr[r]:up_indptr[r+1]
+        self.up_heads = arrays["up_heads"]        # upper endpoint of each arc (rank)
+        self.arc_tail = arrays["arc_tail"]        # lower endpoint of each arc (rank)
+        self.edge_arc = arrays["edge_arc"]        # input edge -> arc
+        self.tri_bottom = arrays["tri_bottom"]    # lower triangles, grouped by level
+        self.tri_a = arrays["tri_a"]
+        self.tri_b = arrays["tri_b"]
+        self.tri_top = arrays["tri_top"]
+        self.level_ptr = arrays["level_ptr"]
+
+        self._keys = self.arc_tail.astype(np.int64) * len(self.order) + self.up_heads
+        self._lists = (self.parent.tolist(), self.up_indptr.tolist(), self.up_heads.tolist())
+
+    @property
+    def arc_count(self) -> int:
+        return len(self.up_heads)
+
+    @classmethod
+    def build(cls, graph: RoadGraph, order: Optional[np.ndarray] = None) -> "CCH":
+        """
+        Order nodes, compute shortcuts and triangles (independent of weights)
+
+        Slow and memory-hungry for large graphs; run it offline via the CLI.
+        """
+        n = graph.node_count
+        if order is None:
+            order = nested_dissection_order(graph)
+        order = np.asarray(order, dtype=np.int32)
+        rank = np.empty(n, dtype=np.int32)
+        rank[order] = np.arange(n, dtype=np.int32)
+
+        # Chordal completion in rank space: eliminating r turns its upward
+        # neighbors into a clique, represented by handing them to its lowest
+        # upward neighbor (its elimination-tree parent). Every child is
+        # eliminated before its parent, so each node merges its inputs once.
+        ru, rv = rank[graph.edge_u], rank[graph.edge_v]
+        lo, hi = np.minimum(ru, rv), np.maximum(ru, rv)
+        by_tail = np.argsort(lo, kind="stable")
+        edge_ptr = np.searchsorted(lo[by_tail], np.arange(n + 1)).tolist()
+        edge_heads = hi[by_tail]
+        inputs: List[List[np.ndarray]] = [[] for _ in range(n)]
+        up: List[np.ndarray] = [None] * n
+        parent = np.full(n, -1, dtype=np.int32)
+        empty = np.zeros(0, dtype=np.int32)
+        for r in range(n):
+            own = edge_heads[edge_ptr[r]:edge_ptr[r + 1]]
+            merged = inputs[r]
+            inputs[r] = None
+            if merged:
+                merged.append(own)
+                own = np.concatenate(merged)
+            up[r] = neighbors = np.unique(own) if len(own) else empty
+            if len(neighbors):
+                p = int(neighbors[0])
+                parent[r] = p
+                if len(neighbors) > 1:
+                    inputs[p].append(neighbors[1:])
+        del inputs
+
+        degrees = np.fromiter((len(a) for a in up), dtype=np.int64, count=n)
+        up_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(degrees, out=up_indptr[1:])
+        up_heads = np.concatenate(up) if n else empty
+        del up
+        arc_tail = np.repeat(np.arange(n, dtype=np.int32), degrees)
+        keys = arc_tail.astype(np.int64) * n + up_heads
+        edge_arc = np.searchsorted(keys, lo.astype(np.int64) * n + hi).astype(np.int32)
+
+        # Elimination-tree heights: triangles with bottoms of equal height are independent
+        parent_list = parent.tolist()
+        height_list = [0] * n
+        for r in range(n):
+            p = parent_list[r]
+            if p >= 0 and height_list[p] < height_list[r] + 1:
+                height_list[p] = height_list[r] + 1
+        height = np.array(height_list, dtype=np.int32)
+
+        # Lower triangles (r, a, b) for every pair a < b of r's upward neighbors,
+        # written level by level straight into int32 arrays of the final size
+        pairs = degrees * (degrees - 1) // 2
+        by_level = np.argsort(height, kind="stable")
+        level_ptr = np.zeros(int(height.max(initial=0)) + 2, dtype=np.int64)
+        np.add.at(level_ptr, height.astype(np.int64) + 1, pairs)
+        np.cumsum(level_ptr, out=level_ptr)
+        total = int(level_ptr[-1])
+        tri_bottom, tri_a, tri_b, tri_top = (np.empty(total, dtype=np.int32) for _ in range(4))
+
+        triu = {}
+        offset = 0
+        for r in by_level[pairs[by_level] > 0].tolist():
+            d = int(degrees[r])
+            if d not in triu:
+                triu[d] = tuple(idx.astype(np.int32) for idx in np.triu_indices(d, k=1))
+            i, j = triu[d]
+            base = int(up_indptr[r])
+            heads = up_heads[base:base + d]
+            end = offset + len(i)
+            tri_bottom[offset:end] = r
+            tri_a[offset:end] = base + i
+            tri_b[offset:end] = base + j
+            tri_top[offset:end] = np.searchsorted(keys, heads[i].astype(np.int64) * n + heads[j])
+            offset = end
+
+        return cls({
+            "order": order,
+            "rank": rank,
+            "parent": parent,
+            "up_indptr": up_indptr,
+            "up_heads": up_heads,
+            "arc_tail": arc_tail,
+            "edge_arc": edge_arc,
+            "tri_bottom": tri_bottom,
+            "tri_a": tri_a,
+            "tri_b": tri_b,
+            "tri_top": tri_top,
+            "level_ptr": level_ptr,
+        })
+
+    def save(self, path: str) -> None:
+        np.savez(path, **{
+            name: getattr(self, name) for name in (
+                "order", "rank", "parent", "up_indptr", "up_heads", "arc_tail", "edge_arc",
+                "tri_bottom", "tri_a", "tri_b", "tri_top", "level_ptr"
+            )
+        })
+
+    @classmethod
+    def load(cls, path: str) -> "CCH":
+        with np.load(path) as data:
+            return cls({name: data[name] for name in data.files})
+
+    def customize(self, edge_weights: np.ndarray) -> Metric:
+        """
+        Apply a weight profile (one weight per road graph edge)
+
+        Runs one vectorized relaxation pass per elimination-tree level:
+        w(u, w) = min(w(u, w), w(v, u) + w(v, w)) over all lower triangles.
+        """
+        weight = np.full(self.arc_count, np.inf)
+        np.minimum.at(weight, self.edge_arc, np.asarray(edge_weights, dtype=np.float64))
+        original = weight.copy()
+
+        level_ptr = self.level_ptr
+        for level in range(len(level_ptr) - 1):
+            lo, hi = level_ptr[level], level_ptr[level + 1]
+            if lo == hi:
+                continue
+            candidate = weight[self.tri_a[lo:hi]] + weight[self.tri_b[lo:hi]]
+            np.minimum.at(weight, self.tri_top[lo:hi], candidate)
+
+        # Middle node of every arc whose weight comes from a shortcut, for path
+        # unpacking; again level by level, to keep temporaries small
+        middle = np.full(self.arc_count, -1, dtype=np.int32)
+        for level in range(len(level_ptr) - 1):
+            lo, hi = level_ptr[level], level_ptr[level + 1]
+            top = self.tri_top[lo:hi]
+            via = weight[self.tri_a[lo:hi]] + weight[self.tri_b[lo:hi]]
+            improved = (via == weight[top]) & (weight[top] < original[top])
+            middle[top[improved]] = self.tri_bottom[lo:hi][improved]
+
+        return Metric(weight, middle)
+
+    def _arc(self, lower: int, upper: int) -> int:
+        return int(np.searchsorted(self._keys, lower * len(self.order) + upper))
+
+    def _unpack(self, metric: Metric, lower: int, upper: int, out: List[int]) -> None:
+        """Append the ranks strictly after `lower` up to `upper` along the arc"""
+        stack = [(lower, upper)]
+        while stack:
+            a, b = stack.pop()
+            lo, hi = (a, b) if a < b else (b, a)
+            mid = int(metric.middle[self._arc(lo, hi)])
+            if mid < 0:
+                out.append(b)
+            else:
+                # a -> mid -> b; push in reverse so a -> mid is expanded first
+                stack.append((mid, b))
+                stack.append((a, mid))
+
+    def _search(self, metric: Metric, start: int):
+        parent, up_indptr, up_heads = self._lists
+        weights = metric._weight_list
+        dist = {start: 0.0}
+        pred = {}
+        get = dist.get
+        inf = math.inf
+        node = start
+        chain = []
+        # Upward arcs only lead to elimination-tree ancestors, so walking the
+        # ancestor chain in order settles every node before it is scanned
+        while node != -1:
+            chain.append(node)
+            d = get(node)
+            if d is not None:
+                lo, hi = up_indptr[node], up_indptr[node + 1]
+                for head, w in zip(up_heads[lo:hi], weights[lo:hi]):
+                    nd = d + w
+                    if nd < get(head, inf):
+                        dist[head] = nd
+                        pred[head] = node
+            node = parent[node]
+        return dist, pred, chain
+
+    def query(self, metric: Metric, source: int, target: int) -> Tuple[Optional[List[int]], float]:
+        """
+        Shortest path between two road graph nodes
+
+        Returns:
+            (list of node ids, total cost), or (None, inf) if unreachable
+        """
+        s, t = int(self.rank[source]), int(self.rank[target])
+        dist_f, pred_f, chain_f = self._search(metric, s)
+        dist_b, pred_b, chain_b = self._search(metric, t)
+
+        best, meet = math.inf, -1
+        for node in set(chain_f).intersection(chain_b):
+            total = dist_f.get(node, math.inf) + dist_b.get(node, math.inf)
+            if total < best:
+                best, meet = total, node
+
+        if meet < 0:
+            return None, math.inf
+
+        # Up-down path in rank space: s -> ... -> meet <- ... <- t
+        up_chain = [meet]
+        while up_chain[-1] != s:
+            up_chain.append(pred_f[up_chain[-1]])
+        up_chain.reverse()
+        down_chain = [meet]
+        while down_chain[-1] != t:
+            down_chain.append(pred_b[down_chain[-1]])
+
+        ranks = [s]
+        for a, b in zip(up_chain, up_chain[1:]):
+            self._unpack(metric, a, b, ranks)
+        for a, b in zip(down_chain, down_chain[1:]):
+            self._unpack(metric, a, b, ranks)
+
+        return [int(self.order[r]) for r in ranks], best
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("Usage: python graph_ch.py build <road_graph.npz> <road_graph.cch.npz>")
+        sys.exit(1)
+
+    road = RoadGraph.load(sys.argv[2])
+    start = time.perf_counter()
+    cch = CCH.build(road)
+    cch.save(sys.argv[3])
+    logger.info(
+        f"✓ CCH built in {time.perf_counter() - start:.1f}s: {road.node_count} nodes, {cch.arc_count} arcs "
+        f"({cch.arc_count - road.edge_count} shortcuts), {len(cch.tri_top)} triangles -> {sys.argv[3]}"
+    )
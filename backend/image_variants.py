@@ -0,0 +1,124 @@
+"""
+Image Variants Module
+
+Post-upload processing for hazard photos:
+- Compressed WebP variants at a few widths (thumbnail, popup, full view)
+- Runs in a background worker pool so /report-issue returns immediately
+- Reports the variant URLs back so the report record can list them
+"""
+
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Callable, Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+logger = logging.getLogger(__name__)
+
+# name -> target width in pixels (height keeps the aspect ratio)
+VARIANT_WIDTHS: Dict[str, int] = {
+    "thumb": 160,
+    "small": 480,
+    "medium": 960,
+}
+WEBP_QUALITY = 75
+
+# Pillow releases the GIL while decoding/resizing/encoding, so threads are enough here
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("IMAGE_VARIANT_WORKERS", "2")),
+    thread_name_prefix="image-variants"
+)
+
+
+def variant_filename(filename: str, name: str) -> str:
+    """Name of a variant file, derived from the original upload name"""
+    stem = os.path.splitext(filename)[0]
+    return f"{stem}__{name}.webp"
+
+
+def generate_variants(filepath: str) -> List[Dict]:
+    """
+    Create the WebP variants next to the original upload
+
+    Args:
+        filepath: Path of the uploaded image on disk
+
+    Returns:
+        List of dicts with name, width, height and filename, smallest first.
+        Sizes wider than the original are skipped, except the smallest one.
+    """
+    directory, filename = os.path.split(filepath)
+    variants = []
+
+    with Image.open(filepath) as img:
+        # Let the JPEG decoder downscale while decoding - much cheaper for big photos
+        img.draft("RGB", (max(VARIANT_WIDTHS.values()), max(VARIANT_WIDTHS.values())))
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        orig_width, orig_height = img.size
+
+        for name, width in sorted(VARIANT_WIDTHS.items(), key=lambda item: item[1]):
+            if width >= orig_width and variants:
+                break
+
+            target_width = min(width, orig_width)
+            target_height = max(1, round(orig_height * target_width / orig_width))
+            resized = img.resize((target_width, target_height), Image.LANCZOS)
+
+            out_name = variant_filename(filename, name)
+            resized.save(os.path.join(directory, out_name), "WEBP", quality=WEBP_QUALITY, method=4)
+
+            variants.append({
+                "name": name,
+                "width": target_width,
+                "height": target_height,
+                "filename": out_name
+            })
+
+    return variants
+
+
+def _process(filepath: str, base_url: str, on_done: Callable[[List[Dict]], None]) -> List[Dict]:
+    try:
+        variants = generate_variants(filepath)
+    except Exception as e:
+        logger.error(f"Image variant generation failed for {filepath}: {e}")
+        return []
+
+    for variant in variants:
+        variant["url"] = f"{base_url}/uploads/{variant.pop('filename')}"
+
+    try:
+        on_done(variants)
+    except Exception as e:
+        logger.error(f"Failed to record image variants for {filepath}: {e}")
+
+    return variants
+
+
+def schedule_variants(
+    filepath: str,
+    base_url: str,
+    on_done: Callable[[List[Dict]], None]
+) -> Optional[Future]:
+    """
+    Queue variant generation for an uploaded image on the worker pool
+
+    Args:
+        filepath: Path of the uploaded image on disk
+        base_url: Public backend URL used to build the variant URLs
+        on_done: Called from the worker with the list of variants
+            (name, width, height, url), smallest first
+
+    Returns:
+        Future for the job, or None if it could not be queued
+    """
+    try:
+        return _executor.submit(_process, filepath, base_url, on_done)
+    except RuntimeError as e:
+        # Executor already shut down (server stopping)
+        logger.warning(f"Could not queue image variants for {filepath}: {e}")
+        return None
@@ -0,0 +1,197 @@
+"""
+Load driver: replays a request mix against a running server at target RPS
+
+Start the server in load-test mode so external services are stood in:
+
+    LOAD_TEST_MODE=1 uvicorn main:app --workers 1
+    python load_driver.py --synthesize mix.jsonl --count 200
+    python load_driver.py --mix mix.jsonl --rps 2,5,10,20 --duration 30 --output curve.json
+
+A mix is JSON lines, one recorded request per line:
+
+    {"method": "POST", "path": "/score-routes", "json": {...}}
+    {"method": "GET", "path": "/area-risk", "params": {"location": "Howrah"}}
+
+Requests are replayed in order (cycling) on an open loop: send times are
+fixed by the target rate, not by when earlier responses return, and
+latency is measured from the scheduled send time. A server that falls
+behind therefore shows up as growing latency instead of a quietly lower
+request rate.
+"""
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import statistics
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from benchmark_suite import make_route_set
+
+_local = threading.local()
+
+
+def session():
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def load_mix(path):
+    mix = []
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            item = json.loads(line)
+            if "path" not in item:
+                raise ValueError(f"{path}:{number}: request has no path")
+            mix.append(item)
+    if not mix:
+        raise ValueError(f"{path}: no requests")
+    return mix
+
+
+def synthesize(path, count, seed):
+    """Write a mix of route scoring, Dijkstra and area-risk requests"""
+    rng = random.Random(seed)
+    places = ["Howrah", "Salt Lake", "Park Street", "Dum Dum", "Behala", "Garia"]
+    with open(path, "w", encoding="utf-8") as f:
+        for _ in range(count):
+            roll = rng.random()
+            if roll < 0.8:
+                points = rng.choice([100, 300, 1000, 3000])
+                routes = [{"coordinates": r} for r in make_route_set(rng, rng.randint(1, 3), points)]
+                item = {
+                    "method": "POST",
+                    "path": "/score-routes" if roll < 0.5 else "/dijkstra-multi-route",
+                    "json": {"routes": routes, "mode": rng.choice(["live", "monsoon"])},
+                }
+            else:
+                item = {"method": "GET", "path": "/area-risk", "params": {"location": rng.choice(places)}}
+            f.write(json.dumps(item) + "\n")
+    print(f"Wrote {count} requests to {path}")
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(samples, elapsed):
+    latencies = sorted(s["latency_ms"] for s in samples)
+    statuses = Counter(str(s["status"]) for s in samples)
+    errors = sum(1 for s in samples if not (isinstance(s["status"], int) and s["status"] < 400))
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else None,
+        "statuses": dict(statuses),
+        "p50_ms": percentile(latencies, 50),
+        "p90_ms": percentile(latencies, 90),
+        "p99_ms": percentile(latencies, 99),
+        "max_ms": latencies[-1] if latencies else None,
+        "mean_ms": round(statistics.fmean(latencies), 1) if latencies else None,
+    }
+
+
+def send(url, item, scheduled, timeout):
+    try:
+        response = session().request(
+            item.get("method", "GET"), url + item["path"],
+            params=item.get("params"), json=item.get("json"), headers=item.get("headers"), timeout=timeout
+        )
+        status = response.status_code
+    except requests.RequestException as e:
+        status = type(e).__name__
+    return {"path": item["path"], "status": status, "latency_ms": round((time.perf_counter() - scheduled) * 1000, 1)}
+
+
+def run_stage(url, mix, offset, rps, duration, concurrency, timeout):
+    """Replay the mix at `rps` for `duration` seconds; returns per-request samples"""
+    total = max(1, int(rps * duration))
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        start = time.perf_counter()
+        for i in range(total):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            futures.append(pool.submit(send, url, mix[(offset + i) % len(mix)], scheduled, timeout))
+        samples = [f.result() for f in futures]
+    return samples, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--mix", help="JSON lines file of recorded requests")
+    parser.add_argument("--rps", default="5", help="target request rate; comma separated for a curve")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds per rate")
+    parser.add_argument("--concurrency", type=int, default=256, help="maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="write JSON results here")
+    parser.add_argument("--synthesize", metavar="PATH", help="write a synthetic mix to PATH and exit")
+    parser.add_argument("--count", type=int, default=200, help="requests in a synthesized mix")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    if args.synthesize:
+        synthesize(args.synthesize, args.count, args.seed)
+        return
+    if not args.mix:
+        parser.error("--mix is required (or --synthesize to create one)")
+
+    mix = load_mix(args.mix)
+    rates = [float(r) for r in args.rps.split(",") if r]
+    try:
+        health = requests.get(f"{args.url}/health", timeout=10).json()
+    except requests.RequestException as e:
+        print(f"✗ Server not reachable: {e}")
+        sys.exit(1)
+    if "load_test" not in health:
+        print("⚠ Server is not in load-test mode; requests will reach the real external services")
+
+    print(f"Replaying {len(mix)} recorded requests against {args.url}")
+    print("=" * 78)
+    print(f"{'target rps':>10} {'achieved':>9} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+
+    stages = []
+    offset = 0
+    for rps in rates:
+        samples, elapsed = run_stage(args.url, mix, offset, rps, args.duration, args.concurrency, args.timeout)
+        offset += len(samples)
+        overall = summarize(samples, elapsed)
+        by_path = defaultdict(list)
+        for s in samples:
+            by_path[s["path"]].append(s)
+        stages.append({
+            "target_rps": rps,
+            **overall,
+            "paths": {path: summarize(items, elapsed) for path, items in sorted(by_path.items())},
+        })
+        print(f"{rps:>10.1f} {overall['throughput_rps']:>9.2f} {overall['requests']:>9} {overall['errors']:>7} "
+              f"{overall['p50_ms']:>9.1f} {overall['p90_ms']:>9.1f} {overall['p99_ms']:>9.1f} {overall['max_ms']:>9.1f}")
+    print("=" * 78)
+
+    if args.output:
+        try:
+            upstreams = requests.get(f"{args.url}/health", timeout=10).json().get("load_test")
+        except requests.RequestException:
+            upstreams = None
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"url": args.url, "mix": args.mix, "duration": args.duration,
+                       "stages": stages, "upstreams": upstreams}, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
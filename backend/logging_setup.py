@@ -0,0 +1,203 @@
+"""
+Logging Setup Module
+
+Non-blocking structured logging for the backend:
+- Callers only put records on a bounded queue (QueueHandler); one listener
+  thread formats and writes them, so a slow stderr never stalls a request.
+  When the queue is full, records are dropped and counted instead of waiting
+- JSON lines output (LOG_FORMAT=json, default) or plain text (LOG_FORMAT=text)
+- Request-ID correlation: RequestIdMiddleware takes X-Request-ID from the
+  client (or generates one), echoes it on the response and every record
+  logged while handling the request carries it
+- Rate limiting of repeated warnings and errors per call site: a failing
+  upstream logs a few lines per window plus a count of what was suppressed,
+  instead of one line per route point
+"""
+
+import sys
+import json
+import time
+import uuid
+import queue
+import atexit
+import logging
+import threading
+import contextvars
+import logging.handlers
+from typing import Dict, Optional, Tuple
+
+request_id_var: "contextvars.ContextVar[Optional[str]]" = contextvars.ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else came in through `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class RequestIdFilter(logging.Filter):
+    """Stamps records with the current request ID (runs in the caller's thread)"""
+
+    def filter(self, record):
+        record.request_id = request_id_var.get()
+        return True
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Lets at most `burst` WARNING-or-worse records per call site through in
+    each `window` seconds; the first record after a window with drops gets
+    a `suppressed` count
+    """
+
+    def __init__(self, burst: int = 5, window: float = 60.0):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._sites: Dict[Tuple[str, int], list] = {}  # site -> [window start, emitted, suppressed]
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        site = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            state = self._sites.get(site)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state else 0
+                self._sites[site] = [now, 1, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if state[1] < self.burst:
+                state[1] += 1
+                return True
+            state[2] += 1
+            return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and key != "request_id" and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """The previous console format, with the request ID when there is one"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s - %(levelname)s - %(message)s", datefmt="%H:%M:%S")
+
+    def format(self, record):
+        line = super().format(record)
+        if getattr(record, "request_id", None):
+            line = f"{line} [{record.request_id}]"
+        if getattr(record, "suppressed", None):
+            line = f"{line} (+{record.suppressed} similar suppressed)"
+        if getattr(record, "dropped", None):
+            line = f"{line} ({record.dropped} records dropped, log queue full)"
+        return line
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        record = super().prepare(record)
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+        return record
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup(level: int = logging.INFO, fmt: str = "json", queue_size: int = 10000,
+          burst: int = 5, window: float = 60.0) -> None:
+    """Route the root logger (and uvicorn's) through the queue; idempotent"""
+    global _listener
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+    handler.addFilter(RequestIdFilter())
+    handler.addFilter(RateLimitFilter(burst, window))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(level)
+
+    # uvicorn installs its own stream handlers; send its records through the queue too
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers.clear()
+        uvicorn_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def _clean_request_id(value: str) -> Optional[str]:
+    value = value.strip()
+    if 0 < len(value) <= 64 and all(c.isalnum() or c in "-_.:" for c in value):
+        return value
+    return None
+
+
+class RequestIdMiddleware:
+    """ASGI middleware binding an X-Request-ID to everything logged for the request"""
+
+    def __init__(self, app, header: str = "X-Request-ID"):
+        self.app = app
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                request_id = _clean_request_id(value.decode("latin-1"))
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        token = request_id_var.set(request_id)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", []).append((self.header, request_id.encode("latin-1")))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_id_var.reset(token)
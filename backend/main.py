@@ -1,8 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError, model_validator
 from typing import List, Optional
-from fastapi import FastAPI, UploadFile, File, Form
+from fastapi import FastAPI, UploadFile, File, Form, Request, Depends
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 import joblib
 import os
 from dotenv import load_dotenv
@@ -12,32 +13,71 @@ import datetime
 import aiofiles
 import uuid
 import google.generativeai as genai
-import heapq
+import asyncio
+import json
+import hashlib
 import math
 import logging
-import database
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%H:%M:%S'
-)
-logger = logging.getLogger(__name__)
+import image_variants
+import static_uploads
+import report_feed
+import report_stream
+import report_clusters
+import risk_model
+import road_graph
+import graph_ch
+import risk_weights
+import weather_service
+import departures
+import route_cache
+import risk_tiles
+import logging_setup
+import metrics
+import profiling
+import resilience
+import degradation
+import admission
+import wire
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 
 # Load environment variables from .env file in the same directory
 env_path = Path(__file__).parent / '.env'
 load_dotenv(dotenv_path=env_path)
 
+# Configure logging: JSON lines (LOG_FORMAT=text for the console format) written
+# from a background thread; repeated warnings/errors per call site are rate-limited.
+# After load_dotenv, so LOG_* settings in .env apply
+logging_setup.setup(
+    level=logging.INFO,
+    fmt=os.getenv("LOG_FORMAT", "json"),
+    burst=int(os.getenv("LOG_ERROR_BURST", "5")),
+    window=float(os.getenv("LOG_ERROR_WINDOW", "60"))
+)
+logger = logging.getLogger(__name__)
+
 logger.info("🚀 Starting SafeNav Backend...")
 logger.info(f"Loading environment from: {env_path}")
 
-# Configure Gemini
-gemini_api_key = os.getenv("GEMINI_API_KEY")
-if not gemini_api_key:
-    raise ValueError("GEMINI_API_KEY not found in environment variables")
-genai.configure(api_key=gemini_api_key)
-logger.info("✓ Gemini API configured")
+# Load-test mode: local stand-ins for OpenWeather, Firestore and Gemini
+# (latency and error injection are configured in stand_ins.py)
+LOAD_TEST_MODE = os.getenv("LOAD_TEST_MODE", "0") == "1"
+if LOAD_TEST_MODE:
+    import stand_ins
+    database = stand_ins.database
+    GenerativeModel = stand_ins.GenerativeModel
+    logger.warning("⚠ LOAD TEST MODE: external services replaced by local stand-ins")
+else:
+    import database
+    GenerativeModel = genai.GenerativeModel
+
+    # Configure Gemini
+    gemini_api_key = os.getenv("GEMINI_API_KEY")
+    if not gemini_api_key:
+        raise ValueError("GEMINI_API_KEY not found in environment variables")
+    genai.configure(api_key=gemini_api_key)
+    logger.info("✓ Gemini API configured")
 
 logger.info("Loading ML models...")
 clf = joblib.load("flood_risk_classifier.pkl")
@@ -46,10 +86,36 @@ reg = joblib.load("flood_severity_regressor.pkl")
 logger.info("✓ Flood severity regressor loaded")
 
 app = FastAPI()
+app.router.route_class = profiling.ProfiledRoute
 logger.info("✓ FastAPI app initialized")
 
-# Mount uploads directory to serve images
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+UPLOADS_DIR = "uploads"
+# Build .gz/.br sidecars for compressible uploads (images are served as-is)
+UPLOADS_PRECOMPRESS = os.getenv("UPLOADS_PRECOMPRESS", "0") == "1"
+
+# Admission control for the route-set endpoints: per-client token buckets
+# (API key from API_KEYS, else IP) charged by route points, and per-endpoint
+# concurrency limits with a bounded queue. Added before CORS so rejections
+# still carry CORS headers. Load tests come from one client, so there the
+# rate limit is off unless ADMISSION_CLIENT_RATE is set.
+ADMISSION_CONCURRENCY = int(os.getenv("ADMISSION_CONCURRENCY", "4"))  # per endpoint; 0 disables
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5"))  # seconds
+admission_policy = admission.Policy(
+    ADMISSION_CONCURRENCY, ADMISSION_QUEUE, ADMISSION_QUEUE_TIMEOUT, points=wire.estimate_points
+)
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    policies={
+        "/score-routes": admission_policy,
+        "/score-routes/batch": admission_policy,
+        "/dijkstra-multi-route": admission_policy,
+        "/best-departure": admission_policy,
+    },
+    client_rate=float(os.getenv("ADMISSION_CLIENT_RATE", "0" if LOAD_TEST_MODE else "5000")),  # route points/s
+    client_burst=float(os.getenv("ADMISSION_CLIENT_BURST", "50000")),
+    api_keys={k.strip() for k in os.getenv("API_KEYS", "").split(",") if k.strip()}
+)
 
 # allow frontend to talk to backend
 app.add_middleware(
@@ -60,26 +126,95 @@ app.add_middleware(
     allow_headers=["*"],
 )
 logger.info("✓ CORS middleware configured")
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Shared secret for /admin endpoints and the profiling debug header (unset: disabled)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Keep a sampling profile of requests slower than PROFILE_THRESHOLD_MS (0 turns
+# this off) or sent with `X-Debug-Profile: <ADMIN_TOKEN>`
+PROFILE_THRESHOLD_MS = float(os.getenv("PROFILE_THRESHOLD_MS", "5000"))
+profile_store = profiling.ProfileStore(
+    directory=os.getenv("PROFILE_DIR", "profiles"),
+    keep=int(os.getenv("PROFILE_KEEP", "50"))
+)
+app.add_middleware(
+    profiling.ProfilerMiddleware,
+    store=profile_store,
+    threshold_ms=PROFILE_THRESHOLD_MS,
+    interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "10")),
+    debug_header="X-Debug-Profile",
+    debug_token=ADMIN_TOKEN
+)
+# Batches of many route sets get a longer deadline of their own
+BATCH_DEADLINE_SECONDS = float(os.getenv("BATCH_DEADLINE_SECONDS", "120"))
+app.add_middleware(
+    resilience.DeadlineMiddleware,
+    default_seconds=float(os.getenv("REQUEST_DEADLINE_SECONDS", "30")),
+    overrides={"/score-routes/batch": BATCH_DEADLINE_SECONDS}
+)
+app.add_middleware(logging_setup.RequestIdMiddleware)
+logger.info("✓ Metrics, profiling, deadline and request-ID middleware configured")
 
 @app.on_event("startup")
 async def startup_event():
     database.init_db()
+    load_road_graph()
+    report_broker.attach(asyncio.get_running_loop())
+    app.state.report_expiry_task = asyncio.create_task(report_expiry_loop())
     logger.info("=" * 60)
     logger.info("🎉 SafeNav Backend is READY!")
     logger.info("=" * 60)
     logger.info("📍 Endpoints available:")
     logger.info("   GET  /health - Health check")
+    logger.info("   GET  /metrics - Prometheus metrics")
+    logger.info("   GET  /admin/profiles - Slow request profiles (X-Admin-Token)")
     logger.info("   GET  /area-risk - Area risk assessment")
     logger.info("   POST /score-routes - Standard route scoring")
+    logger.info("   POST /score-routes/batch - Many route sets in one pass (NDJSON)")
     logger.info("   POST /dijkstra-multi-route - Dijkstra optimal path")
+    logger.info("   GET  /route - Risk-weighted route on the local road graph (depart_in: forecast-aware)")
+    logger.info("   GET  /route/pareto - Distance vs risk trade-off routes")
+    logger.info("   POST /best-departure - Departure windows ranked by forecast risk")
+    logger.info("   GET  /tiles/risk/{month}/{z}/{x}/{y} - Flood-risk map tiles (PNG)")
     logger.info("   POST /report-issue - Report flood hazard")
-    logger.info("   GET  /reports - Get all reports")
+    logger.info("   GET  /reports - Get reports (full list or since/bbox delta)")
+    logger.info("   GET  /reports/clusters - Report clusters for a viewport")
+    logger.info("   GET  /reports/stream - Live report events (SSE)")
+    logger.info("   GET  /uploads/{file} - Uploaded images (immutable caching)")
     logger.info("=" * 60)
 
+# In-memory change log of active reports, backing incremental /reports queries.
+# In-process adds/expiries arrive through the listener; a periodic resync with
+# Firestore runs expiry cleanup and picks up reports from other instances.
+report_log = report_feed.ReportLog()
+database.add_listener(report_log.apply)
+REPORTS_SYNC_INTERVAL = float(os.getenv("REPORTS_SYNC_INTERVAL", "10"))  # seconds
+REPORTS_MAX_PAGE = 5000
+
+# Live report events for /reports/stream subscribers
+report_broker = report_stream.ReportBroker(
+    max_subscribers=int(os.getenv("REPORTS_STREAM_MAX_CLIENTS", "10000")),
+    cursor=lambda: report_log.cursor
+)
+database.add_listener(report_broker.publish)
+
+# Incrementally maintained per-zoom clusters for /reports/clusters
+cluster_index = report_clusters.ClusterIndex()
+database.add_listener(cluster_index.apply)
+
 # Weather cache to avoid repeated API calls
 weather_cache = {}
 weather_cache_timeout = 300  # 5 minutes
 
+# Per-cell forecasts for /best-departure route mode; a new forecast is issued every 3 hours
+forecast_cache = {}
+forecast_cache_timeout = 1800  # 30 minutes
+
+# Version stamp of each cell's last rain change, so consumers can ask what changed
+weather_cell_versions = {}
+weather_version_counter = itertools.count(1)
+
 class Report(BaseModel):
     id: str
     lat: float
@@ -87,6 +222,7 @@ class Report(BaseModel):
     issue_type: str
     description: str
     image_url: Optional[str] = None
+    image_variants: Optional[List[dict]] = None  # [{name, width, height, url}], smallest first
     timestamp: str
 
 @app.post("/report-issue")
@@ -98,22 +234,28 @@ async def report_issue(
     image: UploadFile = File(None)
 ):
     image_url = None
+    filepath = None
+    base_url = os.getenv("BACKEND_URL", "http://localhost:8000")
     if image:
         try:
             # Try to save locally, but don't crash if it fails (e.g. read-only filesystem)
-            os.makedirs("uploads", exist_ok=True)
+            os.makedirs(UPLOADS_DIR, exist_ok=True)
             filename = f"{uuid.uuid4()}_{image.filename}"
-            filepath = os.path.join("uploads", filename)
+            filepath = os.path.join(UPLOADS_DIR, filename)
             async with aiofiles.open(filepath, 'wb') as out_file:
                 content = await image.read()
                 await out_file.write(content)
+
+            if UPLOADS_PRECOMPRESS:
+                # gzip -9 / brotli 11 are slow; keep them off the event loop
+                await asyncio.get_running_loop().run_in_executor(None, static_uploads.precompress, filepath)
             
-            base_url = os.getenv("BACKEND_URL", "http://localhost:8000")
             image_url = f"{base_url}/uploads/{filename}"
         except Exception as e:
             logger.error(f"Failed to save image locally: {e}")
             # Continue without image
             image_url = None
+            filepath = None
     
     report = {
         "id": str(uuid.uuid4()),
@@ -122,15 +264,155 @@ async def report_issue(
         "issue_type": issue_type,
         "description": description,
         "image_url": image_url,
+        "image_variants": [],
         "timestamp": datetime.datetime.now().isoformat()
     }
     
     database.add_report(report)
+
+    # Thumbnails / WebP variants are built in the background; the report
+    # record gets its variant URLs once they exist on disk
+    if filepath:
+        report_id = report["id"]
+        image_variants.schedule_variants(
+            filepath,
+            base_url,
+            lambda variants: database.update_report(report_id, {"image_variants": variants})
+        )
+
     return {"message": "Report submitted successfully", "report": report}
 
+@app.api_route("/uploads/{filename}", methods=["GET", "HEAD"])
+def get_upload(filename: str, request: Request):
+    # Upload names are UUID-prefixed and never change, so they are cached as immutable
+    return static_uploads.serve_upload(request, UPLOADS_DIR, filename)
+
+def refresh_report_log():
+    if report_log.needs_sync(REPORTS_SYNC_INTERVAL):
+        # Changes made outside this process only show up on resync
+        for event, report in report_log.sync(database.get_all_reports()):
+            report_broker.publish(event, report)
+            cluster_index.apply(event, report)
+
+async def report_expiry_loop():
+    """Run expiry/resync in the background while stream clients are connected"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(max(REPORTS_SYNC_INTERVAL, 1))
+        if report_broker.subscriber_count:
+            try:
+                await loop.run_in_executor(None, refresh_report_log)
+            except Exception as e:
+                logger.error(f"Report expiry sweep failed: {e}")
+
+def report_etag_headers(query: str) -> dict:
+    """ETag for a report query: changes with the report set and the query"""
+    query_key = hashlib.sha1(query.encode()).hexdigest()[:12]
+    return {"ETag": f'"{report_log.state_tag}-{query_key}"', "Cache-Control": "no-cache"}
+
+def etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    return etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
 @app.get("/reports")
-def get_reports():
-    return database.get_all_reports()
+def get_reports(
+    request: Request,
+    since: Optional[str] = None,
+    bbox: Optional[str] = None,
+    limit: Optional[int] = None
+):
+    """
+    Without parameters: list of all active reports.
+
+    With since / bbox / limit: incremental delta for a viewport
+    - since: cursor from the previous response (or a sequence / ISO timestamp)
+    - bbox: min_lng,min_lat,max_lng,max_lat
+    - limit: page size; follow `cursor` while `has_more` is true
+    Returns {reports, removed, cursor, has_more, reset}; on `reset` the client
+    replaces its local set instead of merging.
+
+    Both forms send an ETag and answer a matching If-None-Match with 304.
+    """
+    refresh_report_log()
+
+    try:
+        viewport = report_feed.parse_bbox(bbox)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid bbox: {e}"})
+
+    headers = report_etag_headers(f"{since}|{bbox}|{limit}")
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    if since is None and viewport is None and limit is None:
+        return JSONResponse(content=report_log.active_reports(), headers=headers)
+
+    page_size = max(1, min(limit or REPORTS_MAX_PAGE, REPORTS_MAX_PAGE))
+    return JSONResponse(content=report_log.changes(since, viewport, page_size), headers=headers)
+
+@app.get("/reports/clusters")
+def get_report_clusters(request: Request, zoom: int, bbox: Optional[str] = None):
+    """
+    Grid clusters of active reports for a viewport at a zoom level.
+    Each cluster has a centroid, count, dominant issue_type and per-type counts.
+    """
+    refresh_report_log()
+
+    try:
+        viewport = report_feed.parse_bbox(bbox)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid bbox: {e}"})
+
+    headers = report_etag_headers(f"clusters|{zoom}|{bbox}")
+    if etag_matches(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    zoom = max(0, min(zoom, cluster_index.max_zoom))
+    return JSONResponse(
+        content={
+            "zoom": zoom,
+            "cell_size_deg": report_clusters.cell_size(zoom),
+            "clusters": cluster_index.query(viewport, zoom)
+        },
+        headers=headers
+    )
+
+@app.get("/reports/stream")
+async def stream_reports(request: Request, bbox: Optional[str] = None):
+    """
+    Server-Sent Events feed of report-added / report-updated / report-expired
+    events inside an optional bbox (min_lng,min_lat,max_lng,max_lat).
+
+    Event ids are /reports cursors: on reconnect, Last-Event-ID replays the
+    missed changes as one `report-delta` event. A `resync` event means the
+    client fell behind and should re-fetch /reports.
+    """
+    try:
+        viewport = report_feed.parse_bbox(bbox)
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"message": f"Invalid bbox: {e}"})
+
+    if report_broker.subscriber_count >= report_broker.max_subscribers:
+        return JSONResponse(
+            status_code=503,
+            content={"message": "Too many stream clients, fall back to polling /reports"},
+            headers={"Retry-After": "30"}
+        )
+
+    initial = None
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id:
+        delta = report_log.changes(last_event_id, viewport, REPORTS_MAX_PAGE)
+        if delta["reports"] or delta["removed"] or delta["reset"]:
+            initial = report_stream.format_sse("report-delta", json.dumps(delta, default=str), delta["cursor"])
+
+    return StreamingResponse(
+        report_broker.stream(viewport, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/")
 def root():
@@ -140,8 +422,44 @@ def root():
 @app.get("/health")
 def health_check():
     logger.info("💚 Health check accessed")
+    if LOAD_TEST_MODE:
+        return {"status": "OK", "load_test": stand_ins.stats()}
     return {"status": "OK"}
 
+@app.get("/metrics")
+def get_metrics():
+    """Prometheus metrics: request and stage latency, upstream calls, caches"""
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+def admin_denied(request: Request):
+    """Error response unless the request carries X-Admin-Token: <ADMIN_TOKEN>"""
+    if not ADMIN_TOKEN:
+        return JSONResponse(status_code=404, content={"message": "Admin endpoints are disabled"})
+    if request.headers.get("x-admin-token") != ADMIN_TOKEN:
+        return JSONResponse(status_code=403, content={"message": "Invalid admin token"})
+    return None
+
+@app.get("/admin/profiles")
+def list_profiles(request: Request):
+    """Stored request profiles, newest first"""
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    return {"threshold_ms": PROFILE_THRESHOLD_MS, "profiles": profile_store.list()}
+
+@app.get("/admin/profiles/{profile_id}")
+def get_profile(profile_id: str, request: Request, format: str = "json"):
+    """One stored profile; format=folded gives flamegraph input"""
+    denied = admin_denied(request)
+    if denied:
+        return denied
+    record = profile_store.get(profile_id)
+    if record is None:
+        return JSONResponse(status_code=404, content={"message": "Profile not found"})
+    if format == "folded":
+        return Response(content=profiling.folded(record), media_type="text/plain")
+    return record
+
 @app.get("/safe-route")
 def get_safe_route(start: str, destination: str, mode: str = "live"):
     """
@@ -177,8 +495,47 @@ def get_safe_route(start: str, destination: str, mode: str = "live"):
         ]
     }
 
+# Flood-risk map tiles: monthly model probability, cached in memory and on disk
+TILE_CACHE_DIR = os.getenv("TILE_CACHE_DIR", "tile_cache")
+TILE_CACHE_CONTROL = "public, max-age=604800"  # a week; the ETag changes with the model
+risk_tile_cache = risk_tiles.TileCache(
+    render_fn=metrics.stage("model")(lambda month, lats, lngs: risk_model.predict_probability(
+        clf, lats.ravel(), lngs.ravel(), month
+    ).reshape(lats.shape)),
+    cache_dir=TILE_CACHE_DIR or None,
+    tag=risk_tiles.model_tag("flood_risk_classifier.pkl"),
+    memory_tiles=int(os.getenv("TILE_MEMORY_CACHE", "512"))
+)
+
+@app.get("/tiles/risk/{month}/{z}/{x}/{y}")
+def get_risk_tile(month: int, z: int, x: int, y: str, request: Request):
+    """
+    Flood-risk overlay tile (XYZ scheme, 256px PNG) for a month 1-12
+    y may carry a ".png" suffix.
+    """
+    try:
+        png, source = risk_tile_cache.get(month, z, x, int(y.removesuffix(".png")))
+    except ValueError:
+        return JSONResponse(status_code=404, content={"message": "Tile not found"})
+    metrics.cache("risk_tiles", source != "render")
+
+    etag = f'"{risk_tile_cache.tag}-{hashlib.sha1(png).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": TILE_CACHE_CONTROL, "X-Tile-Cache": source}
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=png, media_type="image/png", headers=headers)
+
+AREA_RISK_MAX_GRID = 200
+AREA_RISK_WEATHER_SAMPLES = int(os.getenv("AREA_RISK_WEATHER_SAMPLES", "3"))  # k x k weather lattice
+
 @app.get("/area-risk")
-def get_area_risk(location: str):
+def get_area_risk(location: str, grid: int = 50, radius_km: float = 3.0):
+    """
+    Area risk around a location, with a grid x grid heatmap over +/- radius_km
+    The heatmap comes from one batched model call; rain is interpolated from
+    a small lattice of weather cells. `heatmap.data` holds one byte per cell
+    (intensity * 255, row-major, row 0 at the north edge), base64 encoded.
+    """
     lat, lon = geocode_location(location)
     
     if lat is None:
@@ -188,29 +545,40 @@ def get_area_risk(location: str):
             "riskScore": 0,
             "humidity": 0,
             "warnings": ["Location not found"],
-            "heatmapPoints": []
+            "heatmapPoints": [],
+            "heatmap": None
         }
 
     current_month = datetime.datetime.now().month
-    
-    # Prepare features for model: [lat, lng, month, 0, 1000, 0]
-    X = [[lat, lon, current_month, 0, 1000, 0]]
+    grid = max(2, min(grid, AREA_RISK_MAX_GRID))
+    radius_km = max(0.1, min(radius_km, 50.0))
     
     rain, humidity = get_live_weather(lat, lon)
     
     try:
-        proba = clf.predict_proba(X)[0]
-        
-        # Handle probability
-        if len(proba) == 1:
-            base_risk = proba[0]
-        else:
-            # Assuming class 1 is high risk
-            base_risk = proba[1]
-            
-        rain_factor = 1 + min(rain / 10, 1)
-        risk_score_val = base_risk * rain_factor * 10
-        risk_score_val = min(max(risk_score_val, 0), 10)
+        lats, lngs, bounds = risk_model.area_grid(lat, lon, radius_km, grid)
+
+        # Rain at a k x k lattice of weather cells, fetched concurrently
+        k = max(1, AREA_RISK_WEATHER_SAMPLES)
+        lattice_lats, lattice_lngs, _ = risk_model.area_grid(lat, lon, radius_km, k) if k > 1 else (
+            np.array([[lat]]), np.array([[lon]]), None
+        )
+        with ThreadPoolExecutor(max_workers=k * k) as pool:
+            lattice_rain = list(pool.map(
+                resilience.bind(lambda p: get_live_weather(p[0], p[1])[0]),
+                zip(lattice_lats.ravel().tolist(), lattice_lngs.ravel().tolist())
+            ))
+        grid_rain = risk_model.interpolate_lattice(np.reshape(lattice_rain, (k, k)), bounds, lats, lngs)
+
+        # One model pass for the whole grid plus the location itself
+        with metrics.stage("model"):
+            probability = risk_model.predict_probability(
+                clf, np.append(lats.ravel(), lat), np.append(lngs.ravel(), lon), current_month
+            )
+        rain_all = np.append(grid_rain.ravel(), rain)
+        scores = np.clip(probability * risk_model.rain_factor(rain_all) * 10, 0, 10)
+        risk_score_val = float(scores[-1])
+        intensity = (scores[:-1] / 10).reshape(grid, grid)
         
         if risk_score_val > 8:
             risk_level = "High"
@@ -229,10 +597,11 @@ def get_area_risk(location: str):
         if not warnings:
             warnings.append("No immediate alerts")
 
+        # Location first (the map centres on it), then the riskiest grid cell
+        peak = np.unravel_index(int(np.argmax(intensity)), intensity.shape)
         heatmap_points = [
             {"lat": lat, "lng": lon, "intensity": risk_score_val / 10},
-            {"lat": lat + 0.001, "lng": lon + 0.001, "intensity": (risk_score_val / 10) * 0.8},
-            {"lat": lat - 0.001, "lng": lon - 0.001, "intensity": (risk_score_val / 10) * 0.9},
+            {"lat": float(lats[peak]), "lng": float(lngs[peak]), "intensity": float(intensity[peak])},
         ]
 
         return {
@@ -241,46 +610,115 @@ def get_area_risk(location: str):
             "riskScore": round(risk_score_val, 1),
             "humidity": humidity,
             "warnings": warnings,
-            "heatmapPoints": heatmap_points
+            "heatmapPoints": heatmap_points,
+            "heatmap": {
+                "rows": grid,
+                "cols": grid,
+                "bounds": [round(v, 6) for v in bounds],  # [min_lat, min_lng, max_lat, max_lng]
+                "encoding": "uint8-base64",
+                "data": risk_model.encode_intensity(intensity),
+                "max": round(float(intensity.max()), 3),
+                "mean": round(float(intensity.mean()), 3)
+            }
         }
 
     except Exception as e:
-        print("Prediction failed:", e)
+        logger.error(f"Prediction failed: {e}")
         return {
             "riskLevel": "Error",
             "liveRain": 0,
             "riskScore": 0,
             "humidity": 0,
             "warnings": ["Analysis failed"],
-            "heatmapPoints": []
+            "heatmapPoints": [],
+            "heatmap": None
         }
 
 class Route(BaseModel):
-    coordinates: List[List[float]]  # [[lat, lng], ...]
+    coordinates: List[List[float]] = []  # [[lat, lng], ...]
+    # Compact alternatives to `coordinates` (see wire.py); decoded with NumPy
+    polyline: Optional[str] = None  # Google encoded polyline, precision 5
+    points_f32: Optional[str] = None  # base64 little-endian float32 lat,lng pairs
+
+    @model_validator(mode="after")
+    def decode_points(self):
+        if self.polyline is not None:
+            self.coordinates = wire.decode_polyline(self.polyline).tolist()
+        elif self.points_f32 is not None:
+            self.coordinates = wire.decode_f32(self.points_f32).tolist()
+        self.polyline = self.points_f32 = None
+        return self
 
 class RouteRequest(BaseModel):
     routes: List[Route]
     mode: str  # "live" or "monsoon"
 
+class ScoreSet(BaseModel):
+    id: Optional[str] = None
+    routes: List[Route]
+    mode: str = "live"  # "live" or "monsoon"
+
+class BatchScoreRequest(BaseModel):
+    sets: List[ScoreSet]
+    use_gemini: bool = False  # fallback summaries keep large batches fast
+
 class DijkstraRequest(BaseModel):
     routes: List[Route]
     mode: str  # "live" or "monsoon"
+    k: int = 1  # number of diverse paths to return (best + k-1 alternatives)
+
+class DepartureRequest(BaseModel):
+    mode: str = "monsoon"  # "live" or "monsoon"
+    start: Optional[str] = None  # "lat,lng"; with end, plans on the road graph
+    end: Optional[str] = None
+    routes: Optional[List[Route]] = None  # or evaluate these routes instead
+    horizon_hours: float = 24
+    include_paths: bool = False
+
+def parse_route_body(model, body: bytes, content_type: str, params: dict):
+    """
+    `model` from a JSON body, or from packed routes (application/octet-stream,
+    see wire.py) with the other fields taken from `params`
+
+    Raises:
+        RequestValidationError: Malformed body (422, as for JSON bodies)
+    """
+    try:
+        if content_type.startswith(wire.OCTET_STREAM):
+            routes = [Route.model_construct(coordinates=points.tolist()) for points in wire.unpack_routes(body)]
+            return model.model_validate({**params, "routes": routes})
+        return model.model_validate_json(body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+    except ValueError as e:
+        raise RequestValidationError([{"type": "value_error", "loc": ("body",), "msg": str(e), "input": None}])
+
+def route_body(model):
+    """Dependency reading a `model` request body in any of the route wire formats"""
+    async def dependency(request: Request):
+        body = await request.body()
+        return parse_route_body(model, body, request.headers.get("content-type", ""), dict(request.query_params))
+    return dependency
 
 def geocode_location(location_name):
     try:
-        api_key = os.getenv("OPENWEATHER_API_KEY")
-        if not api_key:
-            print("API Key missing")
-            return None, None
-            
-        url = f"http://api.openweathermap.org/geo/1.0/direct?q={location_name}&limit=1&appid={api_key}"
-        res = requests.get(url, timeout=5)
-        data = res.json()
+        if LOAD_TEST_MODE:
+            fetch = lambda timeout: stand_ins.geocode(location_name, timeout)
+        else:
+            api_key = os.getenv("OPENWEATHER_API_KEY")
+            if not api_key:
+                logger.error("Geocoding skipped: OPENWEATHER_API_KEY missing")
+                return None, None
+
+            url = f"http://api.openweathermap.org/geo/1.0/direct?q={location_name}&limit=1&appid={api_key}"
+            fetch = lambda timeout: requests.get(url, timeout=timeout).json()
+        with metrics.stage("geocode"):
+            data = geocode_upstream.call(fetch)
         if data:
             return data[0]['lat'], data[0]['lon']
         return None, None
     except Exception as e:
-        print("Geocoding failed:", e)
+        logger.warning(f"Geocoding failed for {location_name!r}: {e}")
         return None, None
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -305,126 +743,105 @@ def predict_point_risk(lat, lng, month):
         rain, humidity = get_live_weather(lat, lng)
         rain_factor = 1 + min(rain / 10, 1)
         
-        proba = clf.predict_proba(X)[0]
+        with metrics.stage("model"):
+            proba = clf.predict_proba(X)[0]
+            severity = reg.predict(X)[0]
         risk = proba[1] if len(proba) > 1 else proba[0]
         risk = risk * rain_factor
         
-        severity = reg.predict(X)[0]
-        
         return risk, severity, rain
     except Exception as e:
-        print(f"Risk prediction error: {e}")
+        logger.error(f"Risk prediction error: {e}")
         return 0.5, 1.0, 0.0
 
-def dijkstra_shortest_safest_path(all_routes, month):
+def score_graph_edges(graph, month):
+    """
+    Risk-weighted cost of every edge of a road graph
+    One batched model pass over edge midpoints and one weather lookup per
+    weather cell, instead of a model call and weather lookup per edge.
+    """
+    with metrics.stage("model"):
+        probability, severity = risk_model.predict_points(clf, reg, graph.edge_mid_lat, graph.edge_mid_lng, month)
+    cells, edge_cell = graph.weather_cells()
+    cell_rain = np.array([get_live_weather(float(lat), float(lng))[0] for lat, lng in cells])
+    rain = cell_rain[edge_cell] if len(cells) else np.zeros(0)
+    return graph.edge_length_km * risk_model.edge_weight_factor(probability, severity, rain)
+
+def dijkstra_shortest_safest_path(all_routes, month, k=1):
     """
-    Dijkstra's algorithm to find shortest + safest path across multiple routes
+    Dijkstra's algorithm to find shortest + safest paths across multiple routes
     
     Edge weight = distance × (1 + risk_factors)
-    This balances shortest distance with flood safety
+    This balances shortest distance with flood safety. The graph is built and
+    scored once; extra paths (k > 1) come from re-searching the same scored
+    edge array with the edges of earlier paths penalized.
+
+    Returns:
+        List of (path, total weight, distance km), best first; empty if no path
     """
     logger.info("    Building graph from route points...")
-    # Build graph from all route points
-    graph = {}
-    all_points = []
-    point_to_idx = {}
-    
-    # Collect all unique points from all routes
-    for route in all_routes:
-        for point in route:
-            point_tuple = (round(point[0], 6), round(point[1], 6))
-            if point_tuple not in point_to_idx:
-                idx = len(all_points)
-                point_to_idx[point_tuple] = idx
-                all_points.append(point)
-                graph[idx] = []
-    
-    logger.info(f"    Graph has {len(all_points)} unique points")
+    with metrics.stage("graph_build"):
+        graph = road_graph.RoadGraph.from_segments(all_routes, precision=6)
+    logger.info(f"    Graph has {graph.node_count} unique points, {graph.edge_count} edges")
+
     logger.info("    Calculating edge weights with flood risk...")
-    
-    # Build edges within each route
-    edge_count = 0
-    for route in all_routes:
-        # Optimization: If route is very long (>500 points), sample to reduce graph size?
-        # For now, we rely on weather caching to speed up edge weight calculation.
-        
-        for i in range(len(route) - 1):
-            p1 = (round(route[i][0], 6), round(route[i][1], 6))
-            p2 = (round(route[i+1][0], 6), round(route[i+1][1], 6))
-            
-            idx1 = point_to_idx[p1]
-            idx2 = point_to_idx[p2]
-            
-            # Calculate edge weight: distance × risk_weight
-            lat1, lng1 = all_points[idx1]
-            lat2, lng2 = all_points[idx2]
-            
-            distance = haversine_distance(lat1, lng1, lat2, lng2)
-            
-            # Get flood risk for this segment
-            risk, severity, rain = predict_point_risk(lat2, lng2, month)
-            
-            # Weight formula: distance × (1 + risk_factors)
-            # Higher risk = higher weight = avoid this edge
-            risk_weight = 1.0 + (risk * 5) + (severity * 0.5) + (min(rain/10, 1) * 0.3)
-            edge_weight = distance * risk_weight
-            
-            # Add bidirectional edges
-            graph[idx1].append((idx2, edge_weight))
-            graph[idx2].append((idx1, edge_weight))
-            edge_count += 2
-            
-    logger.info(f"    Graph built with {edge_count} edges")
-    logger.info("    Running Dijkstra's algorithm...")
-    
-    # Run Dijkstra from start to end
-    start_idx = 0  # First point of first route
-    end_idx = point_to_idx[(round(all_routes[0][-1][0], 6), round(all_routes[0][-1][1], 6))]
-    
-    # Priority queue: (distance, node)
-    pq = [(0, start_idx)]
-    distances = {i: float('inf') for i in range(len(all_points))}
-    distances[start_idx] = 0
-    previous = {i: None for i in range(len(all_points))}
-    visited = set()
-    
-    while pq:
-        current_dist, current = heapq.heappop(pq)
-        
-        if current in visited:
-            continue
-            
-        visited.add(current)
-        
-        if current == end_idx:
-            logger.info(f"    Path found! Visited {len(visited)} nodes")
-            break
-        
-        for neighbor, weight in graph[current]:
-            distance = current_dist + weight
-            
-            if distance < distances[neighbor]:
-                distances[neighbor] = distance
-                previous[neighbor] = current
-                heapq.heappush(pq, (distance, neighbor))
-    
-    # Reconstruct path
-    if distances[end_idx] == float('inf'):
+    weights = score_graph_edges(graph, month)
+
+    # Start is the first point of the first route (node 0), end is its last point
+    start_idx = 0
+    end_idx, _ = graph.nearest_node(all_routes[0][-1][0], all_routes[0][-1][1])
+
+    logger.info(f"    Searching for {k} path(s)...")
+    with metrics.stage("graph_search"):
+        found = graph.alternative_paths(weights, start_idx, end_idx, k)
+    if not found:
         logger.warning("    No path found to destination!")
-        return None, float('inf')
-    
-    path = []
-    current = end_idx
-    while current is not None:
-        path.append(all_points[current])
-        current = previous[current]
-    
-    path.reverse()
-    logger.info(f"    Optimal path has {len(path)} points")
-    
-    return path, distances[end_idx]
+        return []
+
+    results = []
+    for nodes, cost, edges in found:
+        results.append((graph.coordinates(nodes), cost, float(graph.edge_length_km[edges].sum())))
+    logger.info(f"    Found {len(results)} path(s); optimal path has {len(results[0][0])} points")
+    return results
+
+# Per-upstream timeouts (seconds), retries, hedging and circuit breakers
+weather_upstream = resilience.Upstream(
+    "weather", timeout=float(os.getenv("WEATHER_TIMEOUT", "3")), retries=1,
+    hedge_after=float(os.getenv("WEATHER_HEDGE_AFTER", "0.5"))
+)
+forecast_upstream = resilience.Upstream("forecast", timeout=float(os.getenv("FORECAST_TIMEOUT", "5")), retries=1)
+geocode_upstream = resilience.Upstream("geocode", timeout=float(os.getenv("GEOCODE_TIMEOUT", "3")), retries=1)
+gemini_upstream = resilience.Upstream("gemini", timeout=float(os.getenv("GEMINI_TIMEOUT", "10")), retries=0)
+
+def fetch_weather(lat, lon, timeout):
+    """One OpenWeather current-weather call; raises on API errors"""
+    if LOAD_TEST_MODE:
+        data = stand_ins.current_weather(lat, lon, timeout)
+    else:
+        url = "https://api.openweathermap.org/data/2.5/weather"
+        params = {
+            "lat": lat,
+            "lon": lon,
+            "appid": os.getenv("OPENWEATHER_API_KEY"),
+            "units": "metric"
+        }
+        res = requests.get(url, params=params, timeout=timeout)
+        data = res.json()
+    if "main" not in data:
+        raise ValueError(f"Weather API error: {data}")
+    return data
+
+def weather_is_fresh(cache_key):
+    """True if the cell has weather younger than weather_cache_timeout"""
+    cached = weather_cache.get(cache_key)
+    return cached is not None and datetime.datetime.now().timestamp() - cached[1] < weather_cache_timeout
 
-def get_live_weather(lat, lon):
+def stale_weather(cache_key):
+    """Last known (rain, humidity) for a cell however old, else no rain"""
+    cached = weather_cache.get(cache_key)
+    return cached[0] if cached else (0.0, 0.0)
+
+def get_live_weather(lat, lon, cached_only=False):
     # Round to 2 decimal places (~1.1km) for caching to group nearby points
     cache_key = (round(lat, 2), round(lon, 2))
     current_time = datetime.datetime.now().timestamp()
@@ -432,24 +849,15 @@ def get_live_weather(lat, lon):
     if cache_key in weather_cache:
         cached_data, timestamp = weather_cache[cache_key]
         if current_time - timestamp < weather_cache_timeout:
+            metrics.cache("weather", True)
             return cached_data
+    metrics.cache("weather", False)
+    if cached_only:
+        return stale_weather(cache_key)
 
     try:
-        url = "https://api.openweathermap.org/data/2.5/weather"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "appid": os.getenv("OPENWEATHER_API_KEY"),
-            "units": "metric"
-        }
-
-        res = requests.get(url, params=params, timeout=5)
-        data = res.json()
-
-        # If API error, fallback
-        if "main" not in data:
-            logger.warning(f"Weather API error for ({lat}, {lon}): {data}")
-            return 0.0, 0.0
+        with metrics.stage("weather"):
+            data = weather_upstream.call(lambda timeout: fetch_weather(lat, lon, timeout))
 
         rain = 0.0
         if "rain" in data:
@@ -457,17 +865,76 @@ def get_live_weather(lat, lon):
 
         humidity = data["main"].get("humidity", 0.0)
         
-        # Update cache
+        # Update cache; the cell version only moves when the rain value changes
+        previous = weather_cache.get(cache_key)
         weather_cache[cache_key] = ((rain, humidity), current_time)
+        if previous is None or previous[0][0] != rain:
+            weather_cell_versions[cache_key] = next(weather_version_counter)
 
         return rain, humidity
 
+    except resilience.UpstreamUnavailable as e:
+        logger.warning(f"Weather skipped for ({lat}, {lon}): {e}")
+        return stale_weather(cache_key)
     except Exception as e:
         logger.error(f"Weather API failed for ({lat}, {lon}): {e}")
-        return 0.0, 0.0
+        return stale_weather(cache_key)
+
+
+
+def weather_changes_since(version):
+    """Weather cells whose rain changed after `version`, and the latest version"""
+    changed = []
+    latest = version
+    for cell, cell_version in list(weather_cell_versions.items()):
+        if cell_version > version:
+            changed.append(cell)
+            latest = max(latest, cell_version)
+    return changed, latest
 
+def latest_cell_rain(cell):
+    """Last known rain for a weather cell, even if stale (0 if never fetched)"""
+    cached = weather_cache.get(cell)
+    return cached[0][0] if cached else 0.0
 
+# Cached /score-routes and /dijkstra-multi-route responses
+route_responses = route_cache.RouteCache(
+    max_entries=int(os.getenv("ROUTE_CACHE_SIZE", "256")),
+    max_age=float(os.getenv("ROUTE_CACHE_MAX_AGE", "1800"))
+)
+HAZARD_MATCH_DEG = 0.0015  # same radius as get_reports_on_route
+ROUTE_WEATHER_WORKERS = 8
+# Refreshing weather for a cache key may use at most this share of the time left
+ROUTE_KEY_WEATHER_SHARE = 0.3
+
+metrics.gauge("safenav_cache_entries", "Entries held per cache", ("cache",), lambda: {
+    ("weather",): len(weather_cache),
+    ("forecast",): len(forecast_cache),
+    ("route_responses",): route_responses.stats()["entries"],
+    ("risk_tiles",): len(risk_tile_cache),
+})
+
+def route_response_key(endpoint, mode, routes, *options):
+    """
+    Cache key for a route response under the current conditions
+    Stale weather cells along the routes are refreshed first, so a key only
+    repeats while both rain and nearby hazard reports are unchanged.
+    """
+    cells = route_cache.covered_cells(routes)
+    if cells:
+        with resilience.deadline_scope(resilience.time_left() * ROUTE_KEY_WEATHER_SHARE), \
+                ThreadPoolExecutor(max_workers=min(ROUTE_WEATHER_WORKERS, len(cells))) as pool:
+            list(pool.map(resilience.bind(lambda cell: get_live_weather(*cell)), cells))
+    weather_epoch = [weather_cell_versions.get(cell, 0) for cell in cells]
+
+    refresh_report_log()
+    nearby = report_log.active_reports(route_cache.padded_bbox(routes, HAZARD_MATCH_DEG))
+    hazard_epoch = sorted((r.get("id"), r.get("issue_type"), r.get("description")) for r in nearby)
+
+    geometry = [route_cache.fingerprint(route) for route in routes]
+    return route_cache.make_key(endpoint, mode, options, geometry, weather_epoch, hazard_epoch)
 
+@metrics.stage("hazards")
 def get_reports_on_route(route_coords, reports):
     on_route_reports = []
     # Use ALL points for accuracy, not sampled points
@@ -574,7 +1041,7 @@ def generate_fallback_summary(route_stats, hazards, is_recommended=False):
 
 def generate_gemini_summary(route_stats, hazards, is_recommended=False):
     try:
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = GenerativeModel('gemini-2.5-flash')
         
         hazards_text = "None"
         if hazards:
@@ -601,7 +1068,15 @@ def generate_gemini_summary(route_stats, hazards, is_recommended=False):
         Output ONLY the bullet points as a list of strings. Do not include "Here is the summary" or markdown formatting like **.
         """
         
-        response = model.generate_content(prompt)
+        call_start = datetime.datetime.now()
+        try:
+            with metrics.stage("gemini"):
+                response = gemini_upstream.call(lambda timeout: model.generate_content(prompt))
+        except Exception as e:
+            if not isinstance(e, resilience.UpstreamUnavailable):  # short-circuits say nothing about latency
+                gemini_call_cost.update((datetime.datetime.now() - call_start).total_seconds())
+            raise
+        gemini_call_cost.update((datetime.datetime.now() - call_start).total_seconds())
         text = response.text
         
         # Clean up response to get a list of strings
@@ -615,13 +1090,76 @@ def generate_gemini_summary(route_stats, hazards, is_recommended=False):
             logger.warning(f"Gemini API Error: {e}, using fallback summaries")
         return generate_fallback_summary(route_stats, hazards, is_recommended)
 
-def predict_route_risk(route_coords, month):
+def route_risk_stats(route_len, risk_preds, severity_preds, total_rain):
+    """
+    Route risk level, severity and average rain from per-sample predictions
+
+    Returns:
+        (risk_level 0-2, final severity, average rain)
+    """
+    max_risk = max(risk_preds) if risk_preds else 0
+    avg_risk = sum(risk_preds) / len(risk_preds) if risk_preds else 0
+
+    # exposure = how many points are risky
+    exposure = sum(1 for r in risk_preds if r > 0.6) / (len(risk_preds) if risk_preds else 1)
+
+    # route penalty
+    length_factor = 1.3 if route_len > 120 else 1.0
+
+    final_risk = (0.6 * max_risk + 0.4 * avg_risk) * (1 + exposure) * length_factor
+
+    if final_risk > 1.1:
+        risk_level = 2      # HIGH
+    elif final_risk > 0.7:
+        risk_level = 1      # MEDIUM
+    else:
+        risk_level = 0      # LOW
+
+    avg_severity = sum(severity_preds) / len(severity_preds) if severity_preds else 0
+
+    avg_rain = total_rain / len(risk_preds) if risk_preds else 0
+
+    route_complexity = route_len / 100
+
+    final_severity = avg_severity * (1 + avg_rain / 20) * route_complexity
+
+    return risk_level, final_severity, avg_rain
+
+def assign_relative_risk(results):
+    """
+    Re-level routes relative to the worst severity in the set
+
+    Returns:
+        route_index of the safest route
+    """
+    max_severity = max(r["severity"] for r in results)
+
+    for r in results:
+        ratio = r["severity"] / max_severity if max_severity > 0 else 0
+
+        if ratio >= 0.9:
+            r["risk_level"] = 2   # HIGH
+        elif ratio >= 0.6:
+            r["risk_level"] = 1   # MEDIUM
+        else:
+            r["risk_level"] = 0   # LOW
+
+    return min(results, key=lambda r: r["severity"])["route_index"]
+
+ROUTE_SAMPLE_STRIDE = 10
+
+def predict_route_risk(route_coords, month, stride=ROUTE_SAMPLE_STRIDE, cached_weather=False, summarize=True):
+    """
+    Risk of one route from every `stride`-th point
+    cached_weather: only use cached (possibly stale) weather
+    summarize: ask Gemini for insights (else "insights" is None)
+    """
     risk_preds = []
     severity_preds = []
     route_len = len(route_coords)
 
-    # sample every 5th point to reduce computation
-    sampled_coords = route_coords[::10]
+    # sample every 10th point (by default) to reduce computation
+    sampled_coords = route_coords[::stride]
     
     # Calculate average rain for the route
     total_rain = 0
@@ -636,11 +1174,13 @@ def predict_route_risk(route_coords, month):
             0       # State Enc (unknown)
         ]]
 
-        rain, humidity = get_live_weather(lat, lng)
+        rain, humidity = get_live_weather(lat, lng, cached_only=cached_weather)
         total_rain += rain
 
         rain_factor = 1 + min(rain / 10, 1)
-        proba = clf.predict_proba(X)[0]
+        with metrics.stage("model"):
+            proba = clf.predict_proba(X)[0]
+            severity = reg.predict(X)[0]
         # print("Classifier proba:", proba)
 
         # if only one class was trained
@@ -651,41 +1191,14 @@ def predict_route_risk(route_coords, month):
 
         # print("Flood probability:", risk)
 
-        severity = reg.predict(X)[0]
-
         risk_preds.append(risk)
         severity_preds.append(severity)
 
-    max_risk = max(risk_preds) if risk_preds else 0
-    avg_risk = sum(risk_preds) / len(risk_preds) if risk_preds else 0
-
-    # exposure = how many points are risky
-    exposure = sum(1 for r in risk_preds if r > 0.6) / (len(risk_preds) if risk_preds else 1)
-
-    # route penalty
-    length_factor = 1.3 if route_len > 120 else 1.0
-
-    final_risk = (0.6 * max_risk + 0.4 * avg_risk) * (1 + exposure) * length_factor
-
-
-    if final_risk > 1.1:
-        risk_level = 2      # HIGH
-    elif final_risk > 0.7:
-        risk_level = 1      # MEDIUM
-    else:
-        risk_level = 0      # LOW
-
-    avg_severity = sum(severity_preds) / len(severity_preds) if severity_preds else 0
-
-    avg_rain = total_rain / len(sampled_coords) if sampled_coords else 0
-
-    route_complexity = len(route_coords) / 100
-
-    final_severity = avg_severity * (1 + avg_rain / 20) * route_complexity
+    risk_level, final_severity, avg_rain = route_risk_stats(route_len, risk_preds, severity_preds, total_rain)
 
     # --- GEMINI INTEGRATION ---
     # 1. Find hazards on this route
-    on_route_hazards = get_reports_on_route(route_coords, database.get_all_reports())
+    on_route_hazards = get_reports_on_route(route_coords, report_log.active_reports())
     
     # 2. Prepare stats for Gemini
     route_stats = {
@@ -696,7 +1209,7 @@ def predict_route_risk(route_coords, month):
     }
     
     # 3. Generate summary (without is_recommended context - will be regenerated with context later)
-    insights = generate_gemini_summary(route_stats, on_route_hazards, False)
+    insights = generate_gemini_summary(route_stats, on_route_hazards, False) if summarize else None
 
     return {
         "risk_level": risk_level,
@@ -708,53 +1221,78 @@ def predict_route_risk(route_coords, month):
 
 
 
+# Latency budget for /score-routes; X-Request-Deadline-Ms can only shorten it
+SCORE_ROUTES_BUDGET = float(os.getenv("SCORE_ROUTES_BUDGET_SECONDS", "10"))
+route_point_cost = degradation.UnitCost(initial=0.03)
+# Observed Gemini latency (successes and failures, not short-circuited calls)
+gemini_call_cost = degradation.UnitCost(initial=2.0)
+
 @app.post("/score-routes")
-def score_routes(data: RouteRequest):
+def score_routes(response: Response, data: RouteRequest = Depends(route_body(RouteRequest))):
+    """
+    Risk of each route plus a recommendation, within SCORE_ROUTES_BUDGET
+    Routes may be sent as JSON coordinates, encoded polylines or float32
+    (see Route), or as a packed octet-stream body with ?mode=.
+    As the deadline nears, scoring degrades step by step (coarser sampling,
+    cached weather, template summaries); `degradations` lists what was
+    applied. Degraded responses are not cached.
+    """
+    with resilience.deadline_scope(SCORE_ROUTES_BUDGET):
+        return score_routes_within_budget(data, response)
+
+def score_routes_within_budget(data, response):
     logger.info(f"📊 Score-routes called: mode={data.mode}, routes={len(data.routes)}")
     start_time = datetime.datetime.now()
+
+    cache_key = route_response_key("score-routes", data.mode, [r.coordinates for r in data.routes])
+    cached = route_responses.get(cache_key)
+    metrics.cache("route_responses", cached is not None)
+    if cached is not None:
+        response.headers["X-Cache"] = "HIT"
+        logger.info("✓ Score-routes served from cache")
+        return cached
+    response.headers["X-Cache"] = "MISS"
     
     results = []
+    budget = degradation.Budget(route_point_cost, gemini_call_cost)
 
     month = 7 if data.mode == "monsoon" else 4
+    points_left = sum(len(route.coordinates) for route in data.routes)
 
-    # 1️⃣ First: collect raw predictions
+    # 1️⃣ First: collect raw predictions (insights come in step 4)
     for idx, route in enumerate(data.routes):
-        logger.info(f"  Analyzing route {idx+1}/{len(data.routes)} ({len(route.coordinates)} points)...")
-        pred = predict_route_risk(route.coordinates, month)
+        stride = budget.stride(ROUTE_SAMPLE_STRIDE, len(route.coordinates), points_left)
+        points_left -= len(route.coordinates)
+        logger.info(f"  Analyzing route {idx+1}/{len(data.routes)} ({len(route.coordinates)} points, stride {stride})...")
+        route_start = datetime.datetime.now()
+        pred = predict_route_risk(
+            route.coordinates, month, stride=stride, cached_weather=budget.cached_weather(), summarize=False
+        )
+        route_point_cost.update(
+            (datetime.datetime.now() - route_start).total_seconds(), len(route.coordinates[::stride])
+        )
 
         results.append({
             "route_index": idx,
             "severity": pred["severity"],
             "risk_level": pred["risk_level"],
-            "insights": pred["insights"],
             "route_stats": pred.get("route_stats"),
             "hazards": pred.get("hazards", [])
         })
 
 
-    # 2️⃣ Find worst severity (baseline)
-    max_severity = max(r["severity"] for r in results)
-
-    # 3️⃣ Assign RELATIVE risk levels
-    for r in results:
-        ratio = r["severity"] / max_severity
-
-        if ratio >= 0.9:
-            r["risk_level"] = 2   # HIGH
-        elif ratio >= 0.6:
-            r["risk_level"] = 1   # MEDIUM
-        else:
-            r["risk_level"] = 0   # LOW
-
-    # 4️⃣ Recommend safest route
-    safest = min(results, key=lambda r: r["severity"])
-    safest_index = safest["route_index"]
+    # 2️⃣ Assign RELATIVE risk levels against the worst severity
+    # 3️⃣ Recommend safest route
+    safest_index = assign_relative_risk(results)
     
-    # 5️⃣ Regenerate insights with is_recommended flag for context-aware summaries
+    # 4️⃣ Generate insights with is_recommended flag for context-aware summaries
     final_results = []
-    for r in results:
+    for n, r in enumerate(results):
         is_recommended = (r["route_index"] == safest_index)
-        insights = generate_gemini_summary(r["route_stats"], r["hazards"], is_recommended)
+        if budget.fallback_summaries(len(results) - n):
+            insights = generate_fallback_summary(r["route_stats"], r["hazards"], is_recommended)
+        else:
+            insights = generate_gemini_summary(r["route_stats"], r["hazards"], is_recommended)
         
         final_results.append({
             "route_index": r["route_index"],
@@ -763,21 +1301,188 @@ def score_routes(data: RouteRequest):
             "insights": insights
         })
 
+    degradations = budget.applied
     elapsed = (datetime.datetime.now() - start_time).total_seconds()
-    logger.info(f"✓ Score-routes completed in {elapsed:.2f}s - Recommended: Route {safest_index+1}")
+    logger.info(
+        f"✓ Score-routes completed in {elapsed:.2f}s - Recommended: Route {safest_index+1}"
+        + (f" - degraded: {', '.join(d['step'] for d in degradations)}" if degradations else "")
+    )
 
-    return {
+    result = {
         "mode": data.mode,
         "routes": final_results,
-        "recommended_route": safest_index
+        "recommended_route": safest_index,
+        "degradations": degradations
     }
+    if degradations:
+        response.headers["X-Degraded"] = ",".join(d["step"] for d in degradations)
+    else:
+        route_responses.put(cache_key, result)
+    return result
+
+DIJKSTRA_MAX_PATHS = 5
+
+def encode_paths(result, fmt):
+    """Copy of a Dijkstra result with its paths in wire format `fmt` (cached results stay as lists)"""
+    if fmt == "json":
+        return result
+    encoded = {**result, "path": wire.encode_path(result["path"], fmt), "path_format": fmt}
+    encoded["alternatives"] = [{**alt, "path": wire.encode_path(alt["path"], fmt)} for alt in result["alternatives"]]
+    return encoded
+
+def path_risk_level(total_risk, path):
+    avg_risk = total_risk / len(path) if path else 0
+    if avg_risk > 2.5:
+        return "HIGH"
+    elif avg_risk > 1.5:
+        return "MEDIUM"
+    return "LOW"
+
+BATCH_MAX_SETS = int(os.getenv("BATCH_MAX_SETS", "500"))
+
+def score_route_sets(sets):
+    """
+    Raw per-route predictions for many route sets with shared work:
+    sampled points are deduplicated across all sets, weather is fetched once
+    per weather cell, and each month gets a single model pass.
+
+    Returns:
+        Per set, a list of (risk_level, severity, avg_rain) per route; and
+        the weather cells that fell back to stale (or no) rain because the
+        upstream failed or the deadline ran out
+    """
+    # Same sampling as predict_route_risk
+    samples = [[route.coordinates[::ROUTE_SAMPLE_STRIDE] for route in s.routes] for s in sets]
+
+    cells = sorted({(round(lat, 2), round(lng, 2)) for routes in samples for sampled in routes for lat, lng in sampled})
+    cell_rain = {}
+    if cells:
+        with ThreadPoolExecutor(max_workers=min(ROUTE_WEATHER_WORKERS, len(cells))) as pool:
+            rain = pool.map(resilience.bind(lambda cell: get_live_weather(*cell)[0]), cells)
+            cell_rain = dict(zip(cells, rain))
+    fallback_cells = [cell for cell in cells if not weather_is_fresh(cell)]
+
+    # Unique points per month -> index into one model pass
+    point_index = {}
+    for s, routes in zip(sets, samples):
+        month = 7 if s.mode == "monsoon" else 4
+        index = point_index.setdefault(month, {})
+        for sampled in routes:
+            for lat, lng in sampled:
+                index.setdefault((lat, lng), len(index))
+
+    point_risk = {}
+    for month, index in point_index.items():
+        points = list(index)
+        lats = [p[0] for p in points]
+        lngs = [p[1] for p in points]
+        rain = np.array([cell_rain[(round(lat, 2), round(lng, 2))] for lat, lng in points])
+        with metrics.stage("model"):
+            probability, severity = risk_model.predict_points(clf, reg, lats, lngs, month)
+        point_risk[month] = (probability * risk_model.rain_factor(rain), severity, rain)
+
+    results = []
+    for s, routes in zip(sets, samples):
+        month = 7 if s.mode == "monsoon" else 4
+        index = point_index.get(month, {})
+        risk, severity, rain = point_risk.get(month, (None, None, None))
+        scored = []
+        for route, sampled in zip(s.routes, routes):
+            idx = [index[(lat, lng)] for lat, lng in sampled]
+            scored.append(route_risk_stats(
+                len(route.coordinates), risk[idx].tolist() if idx else [],
+                severity[idx].tolist() if idx else [], float(rain[idx].sum()) if idx else 0
+            ))
+        results.append(scored)
+    return results, fallback_cells
+
+@app.post("/score-routes/batch")
+def score_routes_batch(data: BatchScoreRequest):
+    """
+    Score many route sets in one request, streamed back as NDJSON
+    One line per set in request order ({index, id, mode, routes,
+    recommended_route} or {index, id, error}), then a summary line listing
+    the weather cells scored with stale or no rain (`weather_fallback_cells`).
+    Runs under BATCH_DEADLINE_SECONDS rather than the default deadline.
+    """
+    logger.info(f"📊 Score-routes batch called: sets={len(data.sets)}, gemini={data.use_gemini}")
+    start_time = datetime.datetime.now()
+
+    if len(data.sets) > BATCH_MAX_SETS:
+        return JSONResponse(status_code=413, content={"message": f"At most {BATCH_MAX_SETS} sets per batch"})
+
+    valid = [s for s in data.sets if s.routes]
+    scored, fallback_cells = score_route_sets(valid)
+    scored = iter(scored)
+    if fallback_cells:
+        logger.warning(f"Batch scored {len(fallback_cells)} weather cell(s) with stale or no rain")
+    refresh_report_log()
+    reports = report_log.active_reports()
+    summarize = generate_gemini_summary if data.use_gemini else generate_fallback_summary
+
+    def lines():
+        route_count = 0
+        for i, s in enumerate(data.sets):
+            if not s.routes:
+                yield json.dumps({"index": i, "id": s.id, "error": "No routes"}) + "\n"
+                continue
+
+            results = []
+            for idx, (route, (risk_level, severity, avg_rain)) in enumerate(zip(s.routes, next(scored))):
+                route_stats = {
+                    "risk_level": risk_level,
+                    "severity": round(severity, 2),
+                    "rain": round(avg_rain, 1),
+                    "length": len(route.coordinates)
+                }
+                results.append({
+                    "route_index": idx,
+                    "severity": route_stats["severity"],
+                    "risk_level": risk_level,
+                    "route_stats": route_stats,
+                    "hazards": get_reports_on_route(route.coordinates, reports)
+                })
+            safest_index = assign_relative_risk(results)
+
+            routes = []
+            for r in results:
+                routes.append({
+                    "route_index": r["route_index"],
+                    "severity": r["severity"],
+                    "risk_level": r["risk_level"],
+                    "insights": summarize(r["route_stats"], r["hazards"], r["route_index"] == safest_index)
+                })
+            route_count += len(routes)
+            yield json.dumps({
+                "index": i,
+                "id": s.id,
+                "mode": s.mode,
+                "routes": routes,
+                "recommended_route": safest_index
+            }) + "\n"
+
+        elapsed = (datetime.datetime.now() - start_time).total_seconds()
+        logger.info(f"✓ Score-routes batch completed in {elapsed:.2f}s - {len(data.sets)} sets, {route_count} routes")
+        yield json.dumps({"summary": {
+            "sets": len(data.sets),
+            "routes": route_count,
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "weather_fallback_cells": [list(cell) for cell in fallback_cells]
+        }}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
 
 @app.post("/dijkstra-multi-route")
-def dijkstra_multi_route(data: DijkstraRequest):
+def dijkstra_multi_route(response: Response, data: DijkstraRequest = Depends(route_body(DijkstraRequest)),
+                         format: str = "json"):
     """
     Use Dijkstra's algorithm to find optimal path across multiple routes
     Balances shortest distance with flood safety
+    Routes are accepted in the same formats as /score-routes; `format`
+    (json, polyline or f32) sets how paths are encoded in the response.
     """
+    if format not in wire.FORMATS:
+        return JSONResponse(status_code=400, content={"message": f"format must be one of {', '.join(wire.FORMATS)}"})
     logger.info(f"🎯 Dijkstra-multi-route called: mode={data.mode}, routes={len(data.routes)}")
     start_time = datetime.datetime.now()
     
@@ -788,12 +1493,22 @@ def dijkstra_multi_route(data: DijkstraRequest):
         all_routes = [route.coordinates for route in data.routes]
         total_points = sum(len(r) for r in all_routes)
         logger.info(f"  Total route points: {total_points}")
+        k = max(1, min(data.k, DIJKSTRA_MAX_PATHS))
+
+        cache_key = route_response_key("dijkstra-multi-route", data.mode, all_routes, k)
+        cached = route_responses.get(cache_key)
+        metrics.cache("route_responses", cached is not None)
+        if cached is not None:
+            response.headers["X-Cache"] = "HIT"
+            logger.info("✓ Dijkstra served from cache")
+            return encode_paths(cached, format)
+        response.headers["X-Cache"] = "MISS"
         
-        # Run Dijkstra to find optimal path
+        # Run Dijkstra to find optimal path (and alternatives)
         logger.info("  Running Dijkstra's algorithm...")
-        optimal_path, total_risk = dijkstra_shortest_safest_path(all_routes, month)
+        paths = dijkstra_shortest_safest_path(all_routes, month, k)
         
-        if optimal_path is None:
+        if not paths:
             logger.warning("  ⚠️ No path found!")
             return {
                 "success": False,
@@ -803,26 +1518,15 @@ def dijkstra_multi_route(data: DijkstraRequest):
                 "distance_km": 0,
                 "risk_level": "UNKNOWN",
                 "insights": ["Unable to find safe route"],
-                "mode": data.mode
+                "mode": data.mode,
+                "alternatives": []
             }
         
+        optimal_path, total_risk, total_distance = paths[0]
         logger.info(f"  Optimal path found: {len(optimal_path)} points")
         
-        # Calculate total distance
-        total_distance = 0
-        for i in range(len(optimal_path) - 1):
-            lat1, lng1 = optimal_path[i]
-            lat2, lng2 = optimal_path[i + 1]
-            total_distance += haversine_distance(lat1, lng1, lat2, lng2)
-        
         # Determine risk level
-        avg_risk = total_risk / len(optimal_path) if optimal_path else 0
-        if avg_risk > 2.5:
-            risk_level = "HIGH"
-        elif avg_risk > 1.5:
-            risk_level = "MEDIUM"
-        else:
-            risk_level = "LOW"
+        risk_level = path_risk_level(total_risk, optimal_path)
         
         logger.info(f"  Distance: {total_distance:.2f}km, Risk: {risk_level}")
         
@@ -839,7 +1543,7 @@ def dijkstra_multi_route(data: DijkstraRequest):
             insights.append("Optimized for current weather conditions")
         
         # Check for hazards on route
-        on_route_hazards = get_reports_on_route(optimal_path, database.get_all_reports())
+        on_route_hazards = get_reports_on_route(optimal_path, report_log.active_reports())
         if on_route_hazards:
             insights.append(f"⚠️ {len(on_route_hazards)} reported hazard(s) on route")
         else:
@@ -848,7 +1552,18 @@ def dijkstra_multi_route(data: DijkstraRequest):
         elapsed = (datetime.datetime.now() - start_time).total_seconds()
         logger.info(f"✓ Dijkstra completed in {elapsed:.2f}s")
         
-        return {
+        alternatives = []
+        for path, risk, distance in paths[1:]:
+            alternatives.append({
+                "path": path,
+                "total_risk": round(risk, 2),
+                "distance_km": round(distance, 2),
+                "risk_level": path_risk_level(risk, path)
+            })
+        if alternatives:
+            insights.append(f"{len(alternatives)} alternative route(s) available")
+        
+        result = {
             "success": True,
             "path": optimal_path,
             "total_risk": round(total_risk, 2),
@@ -856,8 +1571,11 @@ def dijkstra_multi_route(data: DijkstraRequest):
             "risk_level": risk_level,
             "insights": insights,
             "mode": data.mode,
-            "route_index": 0
+            "route_index": 0,
+            "alternatives": alternatives
         }
+        route_responses.put(cache_key, result)
+        return encode_paths(result, format)
         
     except Exception as e:
         logger.error(f"❌ Dijkstra error: {e}")
@@ -874,6 +1592,348 @@ def dijkstra_multi_route(data: DijkstraRequest):
             "mode": data.mode
         }
 
+# Local road network (compiled with `python road_graph.py build ...`)
+ROAD_GRAPH_PATH = os.getenv("ROAD_GRAPH_PATH", "road_graph.npz")
+# Contraction hierarchy topology (`python graph_ch.py build ...`); /route uses plain A* without it
+ROAD_CCH_PATH = os.getenv("ROAD_CCH_PATH", ROAD_GRAPH_PATH.replace(".npz", ".cch.npz"))
+ROAD_SNAP_MAX_KM = 2.0  # start/end farther than this from any road are rejected
+road_network = None
+road_ch = None
+road_weights = None  # risk_weights.RiskWeightPipeline once the graph is loaded
+ROAD_WEIGHTS_INTERVAL = float(os.getenv("ROAD_WEIGHTS_INTERVAL", "30"))  # seconds
+ROAD_WEATHER_CELLS_PER_TICK = int(os.getenv("ROAD_WEATHER_CELLS_PER_TICK", "10"))
+road_forecast = None  # risk_weights.ForecastWeights for departure-time-aware routing
+ROAD_FORECAST_INTERVAL = float(os.getenv("ROAD_FORECAST_INTERVAL", "1800"))  # seconds
+ROUTE_SPEED_KMH = float(os.getenv("ROUTE_SPEED_KMH", "25"))  # assumed average speed for arrival times
+DEPARTURE_WORKERS = int(os.getenv("DEPARTURE_WORKERS", "4"))
+
+def get_cell_forecast(lat, lng):
+    """Forecast rain for a cell as [(epoch seconds, mm per hour), ...]"""
+    with metrics.stage("forecast"):
+        if LOAD_TEST_MODE:
+            return forecast_upstream.call(lambda timeout: stand_ins.forecast(lat, lng, timeout))
+        forecasts = forecast_upstream.call(
+            lambda timeout: weather_service.get_weather_service().get_forecast(lat, lng, timeout)
+        )
+    # expected_rainfall is the 3-hour volume; live weather is per hour
+    return [(f.timestamp.timestamp(), f.expected_rainfall / 3.0) for f in forecasts]
+
+def get_cached_cell_forecast(lat, lng):
+    """get_cell_forecast through forecast_cache (failures are not cached)"""
+    cache_key = (lat, lng)
+    current_time = datetime.datetime.now().timestamp()
+    cached = forecast_cache.get(cache_key)
+    if cached is not None and current_time - cached[1] < forecast_cache_timeout:
+        metrics.cache("forecast", True)
+        return cached[0]
+    metrics.cache("forecast", False)
+    series = get_cell_forecast(lat, lng)
+    if series:
+        forecast_cache[cache_key] = (series, current_time)
+    return series
+
+def load_road_graph():
+    global road_network, road_ch, road_weights, road_forecast
+    if not os.path.exists(ROAD_GRAPH_PATH):
+        logger.warning(f"Road graph not found at {ROAD_GRAPH_PATH} - /route disabled")
+        return
+    start_time = datetime.datetime.now()
+    road_network = road_graph.RoadGraph.load(ROAD_GRAPH_PATH)
+    elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    logger.info(f"✓ Road graph loaded: {road_network.node_count} nodes, {road_network.edge_count} edges in {elapsed:.2f}s")
+
+    # Edge weights are kept current by a background pipeline fed by weather refreshes
+    road_weights = risk_weights.RiskWeightPipeline(
+        road_network,
+        base_fn=lambda month: risk_model.predict_points(
+            clf, reg, road_network.edge_mid_lat, road_network.edge_mid_lng, month
+        ),
+        cell_rain_fn=latest_cell_rain,
+        changes_fn=weather_changes_since,
+        interval=ROAD_WEIGHTS_INTERVAL,
+        refresh_cell_fn=get_live_weather,
+        refresh_per_tick=ROAD_WEATHER_CELLS_PER_TICK
+    )
+
+    if os.path.exists(ROAD_CCH_PATH):
+        road_ch = graph_ch.CCH.load(ROAD_CCH_PATH)
+        road_weights.set_hierarchy(road_ch)
+        logger.info(f"✓ Contraction hierarchy loaded: {road_ch.arc_count} arcs")
+    else:
+        # Building it takes minutes and gigabytes on a metro-sized graph; it is done offline only
+        logger.warning(
+            f"Contraction hierarchy not found at {ROAD_CCH_PATH} - /route uses A* "
+            f"(build it with `python graph_ch.py build {ROAD_GRAPH_PATH} {ROAD_CCH_PATH}`)"
+        )
+
+    road_weights.start()
+
+    road_forecast = risk_weights.ForecastWeights(
+        road_weights, get_cell_forecast, interval=ROAD_FORECAST_INTERVAL
+    )
+    road_forecast.start()
+
+def parse_lat_lng(value: str):
+    lat_str, lng_str = value.split(",")
+    return float(lat_str), float(lng_str)
+
+@app.get("/route")
+def road_route(start: str, end: str, mode: str = "live", depart_in: Optional[float] = None):
+    """
+    Risk-weighted shortest path on the local road graph
+    start / end: "lat,lng"; mode: "live" or "monsoon"
+    depart_in: minutes until departure; when given, edge risk follows the
+    weather forecast for the time each edge is reached
+    Unlike /dijkstra-multi-route this can find detours that are not in any
+    route the client already has.
+    """
+    logger.info(f"🛣️ Route called: start={start}, end={end}, mode={mode}, depart_in={depart_in}")
+    start_time = datetime.datetime.now()
+
+    if road_network is None:
+        return {"success": False, "message": "Road graph not loaded", "path": [], "mode": mode}
+
+    try:
+        start_lat, start_lng = parse_lat_lng(start)
+        end_lat, end_lng = parse_lat_lng(end)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"message": "start and end must be 'lat,lng'"})
+
+    source, source_km = road_network.nearest_node(start_lat, start_lng)
+    target, target_km = road_network.nearest_node(end_lat, end_lng)
+    if max(source_km, target_km) > ROAD_SNAP_MAX_KM:
+        return {"success": False, "message": "Start or end is outside the road network", "path": [], "mode": mode}
+
+    month = 7 if mode == "monsoon" else 4
+
+    # Weights are precomputed by the risk weight pipeline; this is a lock-free read
+    weights = road_weights.current(month)
+    forecast = road_forecast.current(month) if depart_in is not None else None
+    now = datetime.datetime.now().timestamp()
+    depart = now + max(depart_in or 0.0, 0.0) * 60
+
+    if forecast is not None:
+        schedule = forecast.schedule(weights, now)
+        nodes, total_risk, arrive = road_network.time_dependent_path(
+            schedule, depart, source, target, ROUTE_SPEED_KMH
+        )
+    else:
+        if weights.metric is not None:
+            nodes, total_risk = road_ch.query(weights.metric, source, target)
+        else:
+            nodes, total_risk = road_network.shortest_path(weights.weight_list(), source, target)
+        arrive = None
+
+    if nodes is None:
+        logger.warning("  ⚠️ No path found!")
+        return {"success": False, "message": "No path found", "path": [], "mode": mode}
+
+    path = road_network.coordinates(nodes)
+    total_distance = float(road_network.edge_length_km[road_network.path_edges(nodes)].sum())
+    if arrive is None:
+        arrive = depart + total_distance / ROUTE_SPEED_KMH * 3600
+
+    risk_level = path_risk_level(total_risk, path)
+
+    refresh_report_log()
+    on_route_hazards = get_reports_on_route(path, report_log.active_reports())
+
+    insights = [
+        f"Route computed on the local road network",
+        f"Total distance: {total_distance:.2f} km",
+        f"Risk level: {risk_level}"
+    ]
+    if on_route_hazards:
+        insights.append(f"⚠️ {len(on_route_hazards)} reported hazard(s) on route")
+    else:
+        insights.append("✓ No reported hazards on this route")
+    if forecast is not None:
+        insights.append("Risk based on the weather forecast along the trip")
+    elif depart_in:
+        insights.append("Forecast unavailable - risk based on current weather")
+
+    elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    logger.info(f"✓ Route completed in {elapsed*1000:.1f}ms - {len(path)} points, {total_distance:.2f}km")
+
+    return {
+        "success": True,
+        "path": path,
+        "total_risk": round(total_risk, 2),
+        "distance_km": round(total_distance, 2),
+        "risk_level": risk_level,
+        "insights": insights,
+        "hazards": on_route_hazards,
+        "mode": mode,
+        "weights_version": weights.version,
+        "forecast": forecast is not None,
+        "departure_time": datetime.datetime.fromtimestamp(depart).isoformat(timespec="seconds"),
+        "arrival_time": datetime.datetime.fromtimestamp(arrive).isoformat(timespec="seconds")
+    }
+
+PARETO_MAX_LABELS = int(os.getenv("PARETO_MAX_LABELS", "16"))  # per node; bounds /route/pareto runtime
+
+@app.get("/route/pareto")
+def road_route_pareto(start: str, end: str, mode: str = "live", epsilon: float = 0.02):
+    """
+    Distance vs flood-risk trade-off routes on the local road graph
+    Returns the (epsilon-thinned) Pareto frontier, shortest first; risk is
+    the extra cost the risk-weighted edge weights add over plain distance,
+    so any trade-off distance + w * risk can be picked on the client.
+    """
+    logger.info(f"⚖️ Pareto route called: start={start}, end={end}, mode={mode}, epsilon={epsilon}")
+    start_time = datetime.datetime.now()
+
+    if road_network is None:
+        return {"success": False, "message": "Road graph not loaded", "paths": [], "mode": mode}
+
+    try:
+        start_lat, start_lng = parse_lat_lng(start)
+        end_lat, end_lng = parse_lat_lng(end)
+    except ValueError:
+        return JSONResponse(status_code=400, content={"message": "start and end must be 'lat,lng'"})
+
+    source, source_km = road_network.nearest_node(start_lat, start_lng)
+    target, target_km = road_network.nearest_node(end_lat, end_lng)
+    if max(source_km, target_km) > ROAD_SNAP_MAX_KM:
+        return {"success": False, "message": "Start or end is outside the road network", "paths": [], "mode": mode}
+
+    month = 7 if mode == "monsoon" else 4
+    weights = road_weights.current(month)
+    risk = np.maximum(weights.weights - road_network.edge_length_km, 0.0)
+    frontier = road_network.pareto_paths(
+        risk, source, target, epsilon=max(epsilon, 0.0), max_labels=PARETO_MAX_LABELS
+    )
+
+    if not frontier:
+        return {"success": False, "message": "No path found", "paths": [], "mode": mode}
+
+    paths = []
+    for nodes, distance, path_risk in frontier:
+        paths.append({
+            "path": road_network.coordinates(nodes),
+            "distance_km": round(distance, 2),
+            "risk": round(path_risk, 2),
+            "total_risk": round(distance + path_risk, 2)
+        })
+
+    elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    logger.info(f"✓ Pareto route completed in {elapsed*1000:.1f}ms - {len(paths)} trade-off paths")
+
+    return {
+        "success": True,
+        "paths": paths,
+        "mode": mode,
+        "epsilon": epsilon,
+        "weights_version": weights.version
+    }
+
+@app.post("/best-departure")
+def best_departure(data: DepartureRequest):
+    """
+    Rank departure windows by expected risk over the weather forecast
+    Evaluates `routes` if given, otherwise the risk-weighted optimum on the
+    road graph between `start` and `end`, leaving now and at every 3-hour
+    forecast slot within `horizon_hours`.
+    """
+    logger.info(f"🕒 Best-departure called: mode={data.mode}, horizon={data.horizon_hours}h")
+    start_time = datetime.datetime.now()
+    month = 7 if data.mode == "monsoon" else 4
+
+    now = datetime.datetime.now().timestamp()
+    to_iso = lambda t: datetime.datetime.fromtimestamp(t).isoformat(timespec="seconds")
+
+    if data.routes:
+        route_set = departures.RouteSet([r.coordinates for r in data.routes], clf, reg, month)
+        # Forecasts for the cells the routes cross, fetched under this request's deadline
+        forecast = departures.RouteForecast(route_set, resilience.bind(get_cached_cell_forecast))
+        if not forecast.available:
+            return {"success": False, "message": "Weather forecast not available", "windows": [], "mode": data.mode}
+        candidates = departures.departure_times(now, forecast.times, data.horizon_hours)
+        # One vectorized pass over every departure and route
+        costs = route_set.costs(candidates, forecast.rain_at, ROUTE_SPEED_KMH)
+        windows = []
+        for depart, row in zip(candidates, costs):
+            best = int(np.argmin(row))
+            distance = route_set.distance_km[best]
+            windows.append({
+                "departure_time": to_iso(depart),
+                "arrival_time": to_iso(depart + distance / ROUTE_SPEED_KMH * 3600),
+                "route_index": best,
+                "expected_risk": round(float(row[best]), 2),
+                "distance_km": round(distance, 2),
+                "route_risks": [round(float(c), 2) for c in row]
+            })
+        leave_now = windows[0]
+        forecast_version = None
+    else:
+        if road_network is None:
+            return {"success": False, "message": "Road graph not loaded", "windows": [], "mode": data.mode}
+        forecast = road_forecast.current(month)
+        if forecast is None:
+            return {"success": False, "message": "Weather forecast not available", "windows": [], "mode": data.mode}
+        forecast_version = forecast.version
+        candidates = departures.departure_times(now, forecast.times, data.horizon_hours)
+        try:
+            start_lat, start_lng = parse_lat_lng(data.start or "")
+            end_lat, end_lng = parse_lat_lng(data.end or "")
+        except ValueError:
+            return JSONResponse(status_code=400, content={"message": "Give routes, or start and end as 'lat,lng'"})
+
+        source, source_km = road_network.nearest_node(start_lat, start_lng)
+        target, target_km = road_network.nearest_node(end_lat, end_lng)
+        if max(source_km, target_km) > ROAD_SNAP_MAX_KM:
+            return {"success": False, "message": "Start or end is outside the road network", "windows": [], "mode": data.mode}
+
+        # All departures share the same graph, model outputs and slot arrays
+        schedule = forecast.schedule(road_weights.current(month), now)
+
+        def evaluate(depart):
+            nodes, cost, arrive = road_network.time_dependent_path(
+                schedule, depart, source, target, ROUTE_SPEED_KMH
+            )
+            if nodes is None:
+                return None
+            distance = float(road_network.edge_length_km[road_network.path_edges(nodes)].sum())
+            window = {
+                "departure_time": to_iso(depart),
+                "arrival_time": to_iso(arrive),
+                "expected_risk": round(cost, 2),
+                "distance_km": round(distance, 2)
+            }
+            if data.include_paths:
+                window["path"] = road_network.coordinates(nodes)
+            return window
+
+        results = departures.sweep(candidates, evaluate, DEPARTURE_WORKERS)
+        windows = [w for w in results if w is not None]
+        if not windows:
+            return {"success": False, "message": "No path found", "windows": [], "mode": data.mode}
+        # candidates[0] is now; without a path then there is nothing to compare against
+        leave_now = results[0]
+
+    for window in windows:
+        window["risk_per_km"] = round(window["expected_risk"] / window["distance_km"], 3) if window["distance_km"] else 0.0
+        if leave_now is None:
+            window["risk_vs_now_pct"] = None
+        else:
+            window["risk_vs_now_pct"] = (
+                round((window["expected_risk"] / leave_now["expected_risk"] - 1) * 100, 1)
+                if leave_now["expected_risk"] else 0.0
+            )
+
+    ranked = departures.rank(windows)
+    elapsed = (datetime.datetime.now() - start_time).total_seconds()
+    logger.info(f"✓ Best-departure completed in {elapsed*1000:.1f}ms - {len(ranked)} windows")
+
+    return {
+        "success": True,
+        "mode": data.mode,
+        "windows": ranked,
+        "best": ranked[0],
+        "leave_now_feasible": leave_now is not None,
+        "forecast_version": forecast_version  # graph mode only
+    }
+
 # // ...existing code...
 
 #############################
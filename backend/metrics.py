@@ -0,0 +1,250 @@
+"""
+Metrics Module
+
+Lightweight request tracing and Prometheus metrics (`/metrics`):
+- Per-request stage timing: `with metrics.stage("weather"):` adds the time
+  to the current request's total for that stage; when the request ends each
+  stage total is observed once into `safenav_stage_seconds`. Stages should
+  be leaves (a stage never wraps another one) so totals don't overlap
+- Upstream calls and errors (`metrics.upstream("weather")`), which is a
+  stage that is also counted, plus an error counter for failed calls
+- Cache hit/miss counters and gauges read at scrape time
+- An ASGI middleware timing every request by route template and status
+
+Everything is in-process: with several workers each one exposes its own
+numbers. Recording costs two perf_counter calls and a short lock, so it is
+fine inside per-point loops.
+"""
+
+import time
+import bisect
+import functools
+import threading
+import contextvars
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4"  # Response adds the charset
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter with labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self._series: Dict[LabelValues, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(series[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose values are read from a callback at scrape time"""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str], read: Callable[[], Dict[LabelValues, float]]):
+        self.name, self.help, self.labelnames = name, help, tuple(labelnames)
+        self.read = read
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.read().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}")
+        return lines
+
+
+_registry: List = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = register(Histogram(
+    "safenav_request_seconds", "HTTP request latency", ("method", "endpoint", "status")
+))
+STAGE_SECONDS = register(Histogram(
+    "safenav_stage_seconds", "Time per request spent in a pipeline stage", ("stage",)
+))
+UPSTREAM_CALLS = register(Counter("safenav_upstream_calls_total", "Calls to external services", ("upstream",)))
+UPSTREAM_ERRORS = register(Counter("safenav_upstream_errors_total", "Failed calls to external services", ("upstream",)))
+CACHE_REQUESTS = register(Counter("safenav_cache_requests_total", "Cache lookups", ("cache", "result")))
+
+# Stage totals of the request being handled (None outside requests)
+_request_stages: "contextvars.ContextVar[Optional[Dict[str, float]]]" = contextvars.ContextVar(
+    "request_stages", default=None
+)
+# Pool workers bound to a request add to its totals concurrently
+_stages_lock = threading.Lock()
+
+
+def _record(name: str, elapsed: float) -> None:
+    totals = _request_stages.get()
+    if totals is None:
+        STAGE_SECONDS.observe(elapsed, name)
+    else:
+        with _stages_lock:
+            totals[name] = totals.get(name, 0.0) + elapsed
+
+
+class stage:
+    """Time a block as part of a pipeline stage (also usable as a decorator)"""
+
+    __slots__ = ("name", "upstream", "_start")
+
+    def __init__(self, name: str, upstream: bool = False):
+        self.name = name
+        self.upstream = upstream
+
+    def __enter__(self):
+        if self.upstream:
+            UPSTREAM_CALLS.inc(self.name)
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _record(self.name, time.perf_counter() - self._start)
+        if exc_type is not None and self.upstream:
+            UPSTREAM_ERRORS.inc(self.name)
+        return False
+
+    def __call__(self, fn):
+        name, upstream = self.name, self.upstream
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name, upstream):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+
+def upstream(name: str) -> stage:
+    """Stage for a call to an external service; counts calls and raised errors"""
+    return stage(name, upstream=True)
+
+
+def upstream_error(name: str) -> None:
+    """Count an upstream failure that was reported without raising"""
+    UPSTREAM_ERRORS.inc(name)
+
+
+def cache(name: str, hit: bool) -> None:
+    CACHE_REQUESTS.inc(name, "hit" if hit else "miss")
+
+
+def gauge(name: str, help: str, labelnames: Sequence[str], read: Callable[[], Dict[LabelValues, float]]) -> Gauge:
+    return register(Gauge(name, help, labelnames, read))
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: request latency by route template, and per-request
+    stage totals. Streaming responses are timed until their last chunk.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        totals: Dict[str, float] = {}
+        token = _request_stages.set(totals)
+        status = {"code": 500}
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_stages.reset(token)
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.observe(elapsed, scope.get("method", ""), endpoint, str(status["code"]))
+            with _stages_lock:
+                stage_totals = list(totals.items())
+            for name, total in stage_totals:
+                STAGE_SECONDS.observe(total, name)
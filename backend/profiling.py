@@ -0,0 +1,321 @@
+"""
+Profiling Module
+
+Per-request sampling profiler for diagnosing slow requests in production:
+- Endpoints are wrapped (ProfiledRoute) so the middleware knows which
+  worker thread runs each request's handler
+- While some handler is running, one sampler thread reads the stacks of
+  those threads every PROFILE_INTERVAL_MS; otherwise it sleeps
+- Requests are timed, and sampled, until the response starts, so
+  streaming responses (SSE, NDJSON) count only their handler
+- A request's samples are kept only if it took longer than the threshold
+  or carried the debug header, and it has samples; otherwise they are
+  dropped
+- Kept profiles go to a bounded on-disk ring buffer as JSON (folded stacks
+  ready for flamegraph tools, plus top functions)
+
+Work a handler hands to other threads (its own thread pools, streaming
+response bodies) is not sampled.
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import asyncio
+import logging
+import datetime
+import functools
+import threading
+import contextvars
+from collections import Counter
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+logger = logging.getLogger(__name__)
+
+MAX_DEPTH = 64
+TOP_FUNCTIONS = 25
+
+
+class RequestProfile:
+    """Samples collected for one request"""
+
+    def __init__(self, method: str, path: str, forced: bool, sampler: "Sampler"):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.started = time.time()
+        self.threads = set()
+        self.stacks: Counter = Counter()
+        self.sample_count = 0
+        self.max_concurrent = 1
+        self.sampler = sampler
+
+    def bind(self, ident: int) -> None:
+        self.threads.add(ident)
+        self.sampler.bound(1)
+
+    def unbind(self, ident: int) -> None:
+        self.threads.discard(ident)
+        self.sampler.bound(-1)
+
+
+_current: "contextvars.ContextVar[Optional[RequestProfile]]" = contextvars.ContextVar("request_profile", default=None)
+
+
+def bind_thread(endpoint):
+    """Wrap an endpoint so the thread running it is sampled for its request"""
+    if asyncio.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def async_wrapper(*args, **kwargs):
+            profile = _current.get()
+            if profile is None:
+                return await endpoint(*args, **kwargs)
+            ident = threading.get_ident()
+            profile.bind(ident)
+            try:
+                return await endpoint(*args, **kwargs)
+            finally:
+                profile.unbind(ident)
+        return async_wrapper
+
+    @functools.wraps(endpoint)
+    def wrapper(*args, **kwargs):
+        profile = _current.get()
+        if profile is None:
+            return endpoint(*args, **kwargs)
+        ident = threading.get_ident()
+        profile.bind(ident)
+        try:
+            return endpoint(*args, **kwargs)
+        finally:
+            profile.unbind(ident)
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute whose endpoint reports its thread to the profiler"""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, bind_thread(endpoint), **kwargs)
+
+
+def _stack(frame) -> List[str]:
+    """Frames root first, as "file:function:line" """
+    stack = []
+    while frame is not None and len(stack) < MAX_DEPTH:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+        frame = frame.f_back
+    stack.reverse()
+    return stack
+
+
+class Sampler:
+    """Background thread sampling the stacks of in-flight requests' handlers"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._active: Dict[str, RequestProfile] = {}
+        self._bound = 0  # handler threads currently bound to a profile
+        self._lock = threading.Lock()
+        self._wake = threading.Event()  # set while _bound > 0
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active[profile.id] = profile
+            concurrent = len(self._active)
+            for p in self._active.values():
+                p.max_concurrent = max(p.max_concurrent, concurrent)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+
+    def remove(self, profile: RequestProfile) -> None:
+        with self._lock:
+            self._active.pop(profile.id, None)
+
+    def bound(self, delta: int) -> None:
+        with self._lock:
+            self._bound += delta
+            if self._bound > 0:
+                self._wake.set()
+            else:
+                self._wake.clear()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait()
+            time.sleep(self.interval)
+            with self._lock:
+                active = [p for p in self._active.values() if p.threads]
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                for ident in list(profile.threads):
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        profile.stacks[";".join(_stack(frame))] += 1
+                        profile.sample_count += 1
+            del frames
+
+
+def summarize(stacks: Counter, limit: int = TOP_FUNCTIONS) -> Dict[str, list]:
+    """Top functions by samples where they are running (self) or on the stack (total)"""
+    own, total = Counter(), Counter()
+    for stack, count in stacks.items():
+        functions = [frame.rsplit(":", 1)[0] for frame in stack.split(";")]
+        if functions:
+            own[functions[-1]] += count
+        for function in set(functions):
+            total[function] += count
+    return {
+        "self": [{"function": f, "samples": n} for f, n in own.most_common(limit)],
+        "total": [{"function": f, "samples": n} for f, n in total.most_common(limit)],
+    }
+
+
+class ProfileStore:
+    """Bounded on-disk ring buffer of profiles (oldest files are deleted)"""
+
+    def __init__(self, directory: str, keep: int):
+        self.directory = directory
+        self.keep = keep
+        self._lock = threading.Lock()
+
+    def _files(self) -> List[str]:
+        try:
+            return sorted(f for f in os.listdir(self.directory) if f.endswith(".json"))
+        except FileNotFoundError:
+            return []
+
+    def save(self, record: dict) -> None:
+        with self._lock:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                name = f"{int(record['started'] * 1000):015d}-{record['id']}.json"
+                tmp = os.path.join(self.directory, name + ".tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(record, f)
+                os.replace(tmp, os.path.join(self.directory, name))
+                for old in self._files()[:-self.keep]:
+                    os.remove(os.path.join(self.directory, old))
+            except OSError as e:
+                logger.warning(f"Could not store profile {record['id']}: {e}")
+
+    def list(self) -> List[dict]:
+        """Metadata of stored profiles, newest first"""
+        items = []
+        for name in reversed(self._files()):
+            record = self.get(name.rsplit("-", 1)[-1].removesuffix(".json"))
+            if record:
+                items.append({k: v for k, v in record.items() if k not in ("stacks", "top")})
+        return items
+
+    def get(self, profile_id: str) -> Optional[dict]:
+        if not profile_id.isalnum():
+            return None
+        for name in self._files():
+            if name.endswith(f"-{profile_id}.json"):
+                try:
+                    with open(os.path.join(self.directory, name), "r", encoding="utf-8") as f:
+                        return json.load(f)
+                except (OSError, ValueError):
+                    return None
+        return None
+
+
+def folded(record: dict) -> str:
+    """Profile in the folded-stack format read by flamegraph.pl and speedscope"""
+    return "".join(f"{stack} {count}\n" for stack, count in record["stacks"].items())
+
+
+class ProfilerMiddleware:
+    """
+    ASGI middleware sampling every request while it runs and keeping the
+    profile of requests slower than `threshold_ms` or sent with the debug
+    header (whose value must equal `debug_token`)
+    """
+
+    def __init__(self, app, store: ProfileStore, threshold_ms: float, interval_ms: float,
+                 debug_header: str, debug_token: Optional[str]):
+        self.app = app
+        self.store = store
+        self.threshold = threshold_ms / 1000.0 if threshold_ms > 0 else None
+        self.sampler = Sampler(interval_ms / 1000.0)
+        self.debug_header = debug_header.lower().encode("latin-1")
+        self.debug_token = debug_token
+
+    def _forced(self, scope) -> bool:
+        if not self.debug_token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == self.debug_header:
+                return value.decode("latin-1") == self.debug_token
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        forced = self._forced(scope)
+        if self.threshold is None and not forced:
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope.get("method", ""), scope.get("path", ""), forced, self.sampler)
+        token = _current.set(profile)
+        self.sampler.add(profile)
+        status = {"code": 500}
+        start = time.perf_counter()
+        elapsed = None
+
+        async def send_wrapper(message):
+            nonlocal elapsed
+            if message["type"] == "http.response.start":
+                # Stop here: a streaming body can stay open for as long as the client listens
+                elapsed = time.perf_counter() - start
+                self.sampler.remove(profile)
+                status["code"] = message["status"]
+                if forced:
+                    message.setdefault("headers", []).append((b"x-profile-id", profile.id.encode()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if elapsed is None:
+                elapsed = time.perf_counter() - start
+            self.sampler.remove(profile)
+            _current.reset(token)
+            if profile.sample_count and (forced or elapsed >= self.threshold):
+                route = scope.get("route")
+                record = {
+                    "id": profile.id,
+                    "started": profile.started,
+                    "time": datetime.datetime.fromtimestamp(profile.started).isoformat(timespec="seconds"),
+                    "method": profile.method,
+                    "path": profile.path,
+                    "endpoint": getattr(route, "path", None),
+                    "query": scope.get("query_string", b"").decode("latin-1"),
+                    "status": status["code"],
+                    "duration_ms": round(elapsed * 1000, 1),
+                    "trigger": "header" if forced else "threshold",
+                    "interval_ms": round(self.sampler.interval * 1000, 2),
+                    "samples": profile.sample_count,
+                    "max_concurrent_requests": profile.max_concurrent,
+                    "top": summarize(profile.stacks),
+                    "stacks": dict(profile.stacks),
+                }
+                logger.warning(
+                    f"Profiled {profile.method} {profile.path}: {record['duration_ms']:.0f}ms, "
+                    f"{profile.sample_count} samples (profile {profile.id})"
+                )
+                await asyncio.get_running_loop().run_in_executor(None, self.store.save, record)
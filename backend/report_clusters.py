@@ -0,0 +1,135 @@
+"""
+Report Clusters Module
+
+Server-side clustering of hazard reports for zoomed-out map views:
+- One lat/lng grid per zoom level, cell size halving with each zoom
+- Clusters updated incrementally as reports are added or expire
+- Viewport queries return at most one cluster per grid cell, so the payload
+  is bounded by zoom level and viewport instead of by report count
+"""
+
+import math
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from report_feed import BBox
+
+MAX_ZOOM = 18
+# Grid cells per 256px map tile side, i.e. roughly one cluster per 64px
+CELLS_PER_TILE = 4
+
+
+def cell_size(zoom: int) -> float:
+    """Grid cell size in degrees at a zoom level"""
+    return 360.0 / (2 ** zoom * CELLS_PER_TILE)
+
+
+class _Cluster:
+    __slots__ = ("count", "sum_lat", "sum_lng", "types", "ids")
+
+    def __init__(self):
+        self.count = 0
+        self.sum_lat = 0.0
+        self.sum_lng = 0.0
+        self.types: Counter = Counter()
+        self.ids: set = set()
+
+
+class ClusterIndex:
+    """Per-zoom grid clusters of active reports"""
+
+    def __init__(self, max_zoom: int = MAX_ZOOM):
+        self.max_zoom = max_zoom
+        self._lock = threading.Lock()
+        self._grids: List[Dict[Tuple[int, int], _Cluster]] = [{} for _ in range(max_zoom + 1)]
+        # id -> (lat, lng, issue_type) of reports currently indexed
+        self._reports: Dict[str, Tuple[float, float, str]] = {}
+
+    def _cell(self, lat: float, lng: float, zoom: int) -> Tuple[int, int]:
+        size = cell_size(zoom)
+        return math.floor(lng / size), math.floor(lat / size)
+
+    def apply(self, event: str, report: dict) -> None:
+        """
+        Update clusters for a report change; signature matches `database.add_listener`
+
+        Args:
+            event: "added", "updated" or "expired"
+            report: Report dict (needs id, lat, lng, issue_type for additions)
+        """
+        report_id = report.get("id")
+        if not report_id:
+            return
+
+        with self._lock:
+            if event == "added" and report_id not in self._reports:
+                entry = (float(report["lat"]), float(report["lng"]), report.get("issue_type") or "unknown")
+                self._reports[report_id] = entry
+                self._update(report_id, entry, +1)
+            elif event == "expired" and report_id in self._reports:
+                self._update(report_id, self._reports.pop(report_id), -1)
+
+    def _update(self, report_id: str, entry: Tuple[float, float, str], delta: int) -> None:
+        lat, lng, issue_type = entry
+        for zoom, grid in enumerate(self._grids):
+            key = self._cell(lat, lng, zoom)
+            cluster = grid.get(key)
+            if cluster is None:
+                cluster = grid[key] = _Cluster()
+
+            cluster.count += delta
+            cluster.sum_lat += lat * delta
+            cluster.sum_lng += lng * delta
+            cluster.types[issue_type] += delta
+            if delta > 0:
+                cluster.ids.add(report_id)
+            else:
+                cluster.ids.discard(report_id)
+                if cluster.types[issue_type] <= 0:
+                    del cluster.types[issue_type]
+                if cluster.count <= 0:
+                    del grid[key]
+
+    def query(self, bbox: Optional[BBox], zoom: int) -> List[dict]:
+        """
+        Clusters intersecting a viewport at a zoom level
+
+        Args:
+            bbox: (min_lng, min_lat, max_lng, max_lat), None for everything
+            zoom: Map zoom level (clamped to 0..max_zoom)
+
+        Returns:
+            List of clusters with centroid, count, dominant issue_type and
+            per-type counts. Single-report clusters also carry the report id.
+        """
+        zoom = max(0, min(int(zoom), self.max_zoom))
+        size = cell_size(zoom)
+
+        with self._lock:
+            if bbox is None:
+                cells = list(self._grids[zoom].items())
+            else:
+                min_lng, min_lat, max_lng, max_lat = bbox
+                x0, y0 = math.floor(min_lng / size), math.floor(min_lat / size)
+                x1, y1 = math.floor(max_lng / size), math.floor(max_lat / size)
+                cells = [
+                    (key, cluster) for key, cluster in self._grids[zoom].items()
+                    if x0 <= key[0] <= x1 and y0 <= key[1] <= y1
+                ]
+
+            clusters = []
+            for (x, y), cluster in cells:
+                item = {
+                    "lat": round(cluster.sum_lat / cluster.count, 6),
+                    "lng": round(cluster.sum_lng / cluster.count, 6),
+                    "count": cluster.count,
+                    "issue_type": cluster.types.most_common(1)[0][0],
+                    "issue_types": dict(cluster.types),
+                    "cell": [x, y]
+                }
+                if cluster.count == 1:
+                    item["id"] = next(iter(cluster.ids))
+                clusters.append(item)
+
+        return clusters
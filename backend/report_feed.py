@@ -0,0 +1,233 @@
+"""
+Report Feed Module
+
+In-memory change log of active hazard reports, used for incremental /reports delivery:
+- Every add/update/expiry gets a monotonically increasing sequence number
+- Expired reports leave short-lived tombstones so clients learn about removals
+- Queries by `since` cursor (sequence or ISO timestamp), bounding box and page size
+- A version number for cheap ETag / If-None-Match handling
+"""
+
+import time
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+# How long removed reports are remembered; older cursors get a full resync
+TOMBSTONE_TTL = 600  # 10 minutes
+
+BBox = Tuple[float, float, float, float]  # (min_lng, min_lat, max_lng, max_lat)
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[BBox]:
+    """
+    Parse a `min_lng,min_lat,max_lng,max_lat` query string
+
+    Raises:
+        ValueError: If the string does not hold four numbers
+    """
+    if not bbox:
+        return None
+    parts = [float(p) for p in bbox.split(",")]
+    if len(parts) != 4:
+        raise ValueError("bbox must be min_lng,min_lat,max_lng,max_lat")
+    min_lng, min_lat, max_lng, max_lat = parts
+    return min(min_lng, max_lng), min(min_lat, max_lat), max(min_lng, max_lng), max(min_lat, max_lat)
+
+
+def in_bbox(lat: float, lng: float, bbox: Optional[BBox]) -> bool:
+    if bbox is None:
+        return True
+    min_lng, min_lat, max_lng, max_lat = bbox
+    return min_lat <= lat <= max_lat and min_lng <= lng <= max_lng
+
+
+class _Entry:
+    __slots__ = ("seq", "changed_at", "report", "removed")
+
+    def __init__(self, seq: int, report: dict, removed: bool = False):
+        self.seq = seq
+        self.changed_at = time.time()
+        self.report = report
+        self.removed = removed
+
+
+class ReportLog:
+    """Sequence-numbered mirror of the active reports in Firestore"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._entries: Dict[str, _Entry] = {}
+        # Cursors at or below this sequence may have missed pruned tombstones
+        self._horizon = 0
+        self._synced_at = 0.0
+        # Identifies this process lifetime inside cursors
+        self._run = format(int(time.time() * 1000), "x")
+
+    @property
+    def version(self) -> int:
+        """Sequence of the latest change; changes whenever the report set changes"""
+        return self._seq
+
+    @property
+    def state_tag(self) -> str:
+        """Opaque tag of the current state, for ETags (unique across restarts)"""
+        return f"{self._run}-{self._seq}"
+
+    @property
+    def cursor(self) -> str:
+        """Cursor pointing at the latest change"""
+        return f"{self._run}_{self._seq}"
+
+    def _bump(self, report_id: str, report: dict, removed: bool = False) -> None:
+        self._seq += 1
+        self._entries[report_id] = _Entry(self._seq, report, removed)
+
+    def apply(self, event: str, report: dict) -> None:
+        """
+        Record a change; signature matches `database.add_listener` callbacks
+
+        Args:
+            event: "added", "updated" or "expired"
+            report: Full report, or only the changed fields plus id for "updated"
+        """
+        report_id = report.get("id")
+        if not report_id:
+            return
+
+        with self._lock:
+            current = self._entries.get(report_id)
+            if event == "expired":
+                if current and not current.removed:
+                    self._bump(report_id, current.report, removed=True)
+            elif event == "updated":
+                if current and not current.removed:
+                    self._bump(report_id, {**current.report, **report})
+            else:
+                self._bump(report_id, dict(report))
+            self._prune()
+
+    def needs_sync(self, interval: float) -> bool:
+        return time.time() - self._synced_at >= interval
+
+    def sync(self, reports: List[dict]) -> List[Tuple[str, dict]]:
+        """
+        Reconcile with the full report list from the database
+
+        Picks up changes made by other server instances or before a restart:
+        unknown/changed reports are added, missing ones are tombstoned.
+
+        Returns:
+            The (event, report) changes found, in listener format
+        """
+        found = []
+        with self._lock:
+            seen = set()
+            for report in reports:
+                report_id = report.get("id")
+                if not report_id:
+                    continue
+                seen.add(report_id)
+                current = self._entries.get(report_id)
+                if current is None or current.removed:
+                    self._bump(report_id, dict(report))
+                    found.append(("added", report))
+                elif current.report != report:
+                    self._bump(report_id, dict(report))
+                    found.append(("updated", report))
+
+            for report_id, entry in list(self._entries.items()):
+                if not entry.removed and report_id not in seen:
+                    self._bump(report_id, entry.report, removed=True)
+                    found.append(("expired", entry.report))
+
+            self._prune()
+            self._synced_at = time.time()
+        return found
+
+    def _prune(self) -> None:
+        cutoff = time.time() - TOMBSTONE_TTL
+        for report_id, entry in list(self._entries.items()):
+            if entry.removed and entry.changed_at < cutoff:
+                del self._entries[report_id]
+                self._horizon = max(self._horizon, entry.seq)
+
+    def active_reports(self, bbox: Optional[BBox] = None) -> List[dict]:
+        """All active reports (optionally inside a bbox), oldest change first"""
+        with self._lock:
+            entries = sorted(self._entries.values(), key=lambda e: e.seq)
+        return [
+            e.report for e in entries
+            if not e.removed and in_bbox(e.report["lat"], e.report["lng"], bbox)
+        ]
+
+    def _cursor_to_seq(self, since: str) -> Tuple[int, bool]:
+        """
+        Map a cursor to a sequence number
+
+        Returns:
+            (sequence, is_valid) - invalid/too old cursors mean a full resync
+        """
+        run, sep, seq_str = since.partition("_")
+        if sep and seq_str.isdigit():
+            # Cursors from another process lifetime refer to a different sequence
+            seq = int(seq_str)
+            return seq, run == self._run and self._horizon <= seq <= self._seq
+        if since.isdigit():
+            seq = int(since)
+            return seq, self._horizon <= seq <= self._seq
+
+        # ISO timestamp: everything that changed after it
+        try:
+            ts = datetime.fromisoformat(since).timestamp()
+        except ValueError:
+            return 0, False
+        older = [e.seq for e in self._entries.values() if e.changed_at <= ts]
+        seq = max(older) if older else 0
+        return seq, seq >= self._horizon
+
+    def changes(self, since: Optional[str] = None, bbox: Optional[BBox] = None, limit: int = 500) -> dict:
+        """
+        Reports added/updated and ids removed after a cursor, inside a bbox
+
+        Args:
+            since: Cursor from a previous response, a bare sequence number
+                or an ISO timestamp. None returns a full snapshot.
+            bbox: Viewport filter (min_lng, min_lat, max_lng, max_lat)
+            limit: Maximum number of changes in this page
+
+        Returns:
+            dict with `reports`, `removed` (ids), `cursor` for the next call,
+            `has_more` if another page is waiting, and `reset` when the client
+            must drop its local state (full snapshot instead of a delta)
+        """
+        with self._lock:
+            reset = True
+            after = 0
+            if since is not None:
+                after, valid = self._cursor_to_seq(since)
+                reset = not valid
+                if reset:
+                    after = 0
+
+            pending = sorted(
+                (e for e in self._entries.values()
+                 if e.seq > after
+                 and not (reset and e.removed)
+                 and in_bbox(e.report["lat"], e.report["lng"], bbox)),
+                key=lambda e: e.seq
+            )
+            head = self._seq
+
+        page = pending[:limit]
+        has_more = len(pending) > limit
+        cursor = page[-1].seq if has_more else head
+
+        return {
+            "reports": [e.report for e in page if not e.removed],
+            "removed": [e.report["id"] for e in page if e.removed],
+            "cursor": f"{self._run}_{cursor}",
+            "has_more": has_more,
+            "reset": reset
+        }
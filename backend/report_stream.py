@@ -0,0 +1,127 @@
+"""
+Report Stream Module
+
+In-process pub/sub for live hazard updates, served as Server-Sent Events:
+- Fed by database report events (added / updated / expired) from any thread
+- Each event is serialized once and fanned out on the asyncio loop
+- Subscribers filter by bounding box; idle connections only cost a queue
+- Slow clients are told to resync instead of buffering without bound
+"""
+
+import json
+import asyncio
+import logging
+from typing import AsyncIterator, Callable, Optional, Set
+
+from report_feed import BBox, in_bbox
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_INTERVAL = 15  # seconds; keeps proxies from closing idle streams
+QUEUE_SIZE = 100
+
+EVENT_NAMES = {
+    "added": "report-added",
+    "updated": "report-updated",
+    "expired": "report-expired",
+}
+
+
+def format_sse(event: str, data: str, event_id: Optional[str] = None) -> str:
+    """Encode one Server-Sent Event frame"""
+    frame = f"event: {event}\n"
+    if event_id:
+        frame += f"id: {event_id}\n"
+    return frame + f"data: {data}\n\n"
+
+
+class _Subscriber:
+    __slots__ = ("queue", "bbox", "lagged")
+
+    def __init__(self, bbox: Optional[BBox]):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.bbox = bbox
+        self.lagged = False
+
+
+class ReportBroker:
+    """Fans report events out to SSE subscribers on one event loop"""
+
+    def __init__(self, max_subscribers: int = 10000, cursor: Optional[Callable[[], str]] = None):
+        self.max_subscribers = max_subscribers
+        self._cursor = cursor
+        self._subscribers: Set[_Subscriber] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def attach(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Bind to the server's event loop (call from the startup hook)"""
+        self._loop = loop
+
+    def publish(self, event: str, report: dict) -> None:
+        """
+        Publish a report event; safe to call from worker threads
+
+        Signature matches `database.add_listener` callbacks.
+        """
+        if self._loop is None or not self._subscribers or self._loop.is_closed():
+            return
+
+        lat, lng = report.get("lat"), report.get("lng")
+        if event == "expired":
+            payload = {"id": report.get("id"), "lat": lat, "lng": lng}
+        else:
+            payload = report
+        frame = format_sse(
+            EVENT_NAMES.get(event, event),
+            json.dumps(payload, default=str),
+            self._cursor() if self._cursor else None
+        )
+
+        self._loop.call_soon_threadsafe(self._fan_out, frame, lat, lng)
+
+    def _fan_out(self, frame: str, lat: Optional[float], lng: Optional[float]) -> None:
+        for sub in self._subscribers:
+            # Partial updates carry no position; deliver them to everyone
+            if lat is not None and lng is not None and not in_bbox(lat, lng, sub.bbox):
+                continue
+            try:
+                sub.queue.put_nowait(frame)
+            except asyncio.QueueFull:
+                sub.lagged = True
+
+    async def stream(self, bbox: Optional[BBox], initial: Optional[str] = None) -> AsyncIterator[str]:
+        """
+        SSE frames for one client until it disconnects
+
+        Args:
+            bbox: Viewport filter
+            initial: Frame sent first (e.g. missed changes for Last-Event-ID)
+        """
+        sub = _Subscriber(bbox)
+        self._subscribers.add(sub)
+        try:
+            yield "retry: 5000\n\n"
+            if initial:
+                yield initial
+
+            while True:
+                if sub.lagged:
+                    # Dropped events - the client should re-fetch /reports
+                    sub.lagged = False
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    yield format_sse("resync", "{}")
+                    continue
+
+                try:
+                    frame = await asyncio.wait_for(sub.queue.get(), timeout=HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield frame
+        finally:
+            self._subscribers.discard(sub)
@@ -0,0 +1,330 @@
+"""
+Resilience Module
+
+Bounded-latency calls to external services (OpenWeather, geocoding, Gemini):
+- Request deadlines: DeadlineMiddleware gives every request a time budget
+  (X-Request-Deadline-Ms can shorten it); every upstream call made while
+  handling the request is capped by what is left of it
+- Per-upstream circuit breakers: after repeated failures calls fail fast
+  with UpstreamUnavailable for a cool-down period, then one probe is let
+  through to test recovery
+- Retries and hedged requests drawing on a per-upstream retry budget, so
+  a degraded upstream sees at most a fixed fraction of extra traffic
+- Attempt timeouts enforced by the caller, so even clients without a
+  timeout option (Gemini) can't hold a request past its budget
+
+Callers catch UpstreamUnavailable (and the upstream's own errors) and fall
+back to cached or default values.
+"""
+
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class UpstreamUnavailable(Exception):
+    """The circuit is open or the request deadline has passed"""
+
+
+# ------------------------------------------------------------------ deadlines
+
+# Monotonic time by which the current request must finish (None: no deadline)
+_deadline: "contextvars.ContextVar[Optional[float]]" = contextvars.ContextVar("deadline", default=None)
+
+
+def time_left() -> float:
+    """Seconds left before the current request's deadline (inf without one)"""
+    deadline = _deadline.get()
+    return float("inf") if deadline is None else deadline - time.monotonic()
+
+
+class deadline_scope:
+    """Narrow the deadline for a block (never extends an outer one)"""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+
+    def __enter__(self):
+        current = _deadline.get()
+        deadline = time.monotonic() + self.seconds
+        self._token = _deadline.set(deadline if current is None else min(current, deadline))
+        return self
+
+    def __exit__(self, *exc):
+        _deadline.reset(self._token)
+        return False
+
+
+def bind(fn: Callable) -> Callable:
+    """fn running in the caller's context (deadline, request ID) on other threads"""
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.copy().run(fn, *args, **kwargs)
+
+
+class DeadlineMiddleware:
+    """ASGI middleware setting a per-request deadline"""
+
+    def __init__(self, app, default_seconds: float, overrides: Optional[Dict[str, float]] = None,
+                 header: str = "X-Request-Deadline-Ms"):
+        """
+        Args:
+            default_seconds: Deadline of every request
+            overrides: Deadline per request path, instead of the default
+            header: Request header that can shorten the deadline
+        """
+        self.app = app
+        self.default_seconds = default_seconds
+        self.overrides = overrides or {}
+        self.header = header.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        seconds = self.overrides.get(scope.get("path"), self.default_seconds)
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                try:
+                    seconds = min(seconds, max(0.0, float(value) / 1000.0))
+                except ValueError:
+                    pass
+                break
+        token = _deadline.set(time.monotonic() + seconds)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+
+
+# ------------------------------------------------------------ circuit breaker
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures for `reset_timeout` seconds"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+                self._probing = False
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release(self) -> None:
+        """An allowed call ended without a verdict (cut short by its caller)"""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self.state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit for {self.name} opened after {self._failures} consecutive failures")
+                self.state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+
+class RetryBudget:
+    """
+    Retries (and hedges) allowed as a fraction of calls: each call deposits
+    `ratio` tokens, each retry spends one; `min_per_second` keeps a trickle
+    available at low traffic
+    """
+
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 1.0, cap: float = 20.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.cap = cap
+        self._tokens = cap
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def deposit(self) -> None:
+        with self._lock:
+            self._tokens = min(self.cap, self._tokens + self.ratio)
+
+    def withdraw(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.cap, self._tokens + (now - self._updated) * self.min_per_second)
+            self._updated = now
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+
+# ------------------------------------------------------------------ upstreams
+
+RETRIES = metrics.register(metrics.Counter("safenav_upstream_retries_total", "Retried upstream calls", ("upstream",)))
+HEDGES = metrics.register(metrics.Counter("safenav_upstream_hedges_total", "Hedged upstream calls", ("upstream",)))
+SHORT_CIRCUITS = metrics.register(metrics.Counter(
+    "safenav_upstream_short_circuits_total", "Upstream calls refused by an open circuit or spent deadline", ("upstream", "reason")
+))
+
+upstreams: Dict[str, "Upstream"] = {}
+
+# An attempt shortened by the deadline that fails this close to its expiry
+# is taken as cut short by the caller, not as an upstream failure
+DEADLINE_SLACK = 0.01  # seconds
+
+
+class Upstream:
+    """Circuit breaker, retry budget, hedging and timeouts for one external service"""
+
+    def __init__(self, name: str, timeout: float, retries: int = 0, hedge_after: Optional[float] = None,
+                 breaker: Optional[CircuitBreaker] = None, budget: Optional[RetryBudget] = None, workers: int = 16):
+        """
+        Args:
+            name: Upstream name used in logs and metrics
+            timeout: Seconds allowed per attempt (further capped by the deadline)
+            retries: Extra attempts after a failure
+            hedge_after: Start a parallel attempt if none finished after this
+                many seconds (None: no hedging); counts against `retries`
+            breaker, budget: Defaults when None
+            workers: Threads running attempts
+        """
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker(name)
+        self.budget = budget or RetryBudget()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"upstream-{name}")
+        upstreams[name] = self
+
+    def call(self, fn: Callable[[float], Any]) -> Any:
+        """
+        Run fn(timeout_seconds) with retries and hedging; the result of the
+        first successful attempt wins
+
+        Only errors raised by the upstream and attempts that used up the full
+        `timeout` count against the circuit breaker; attempts the request
+        deadline cut short are the caller's doing and don't.
+
+        Raises:
+            UpstreamUnavailable: Circuit open or deadline spent
+            Exception: The last attempt's error once retries are exhausted
+        """
+        if time_left() <= 0:
+            SHORT_CIRCUITS.inc(self.name, "deadline")
+            raise UpstreamUnavailable(f"{self.name}: request deadline exceeded")
+        if not self.breaker.allow():
+            SHORT_CIRCUITS.inc(self.name, "circuit_open")
+            raise UpstreamUnavailable(f"{self.name}: circuit open")
+
+        self.budget.deposit()
+        max_attempts = 1 + self.retries
+        pending: Dict[Any, Tuple[float, float]] = {}  # future -> (attempt expiry, attempt timeout)
+        attempts = 0
+        failed = False  # some attempt failed on the upstream's account
+        last_error: Exception = TimeoutError(f"{self.name}: timed out")
+        launch = True
+
+        def cut_short(attempt_timeout: float) -> Exception:
+            SHORT_CIRCUITS.inc(self.name, "deadline")
+            return UpstreamUnavailable(f"{self.name}: cut short by the request deadline after {attempt_timeout:.2f}s")
+
+        while True:
+            now = time.monotonic()
+            remaining = time_left()
+            if remaining <= 0:
+                if failed:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                SHORT_CIRCUITS.inc(self.name, "deadline")
+                raise UpstreamUnavailable(f"{self.name}: request deadline exceeded")
+
+            if launch:
+                attempt_timeout = min(self.timeout, remaining)
+                pending[self._pool.submit(fn, attempt_timeout)] = (now + attempt_timeout, attempt_timeout)
+                metrics.UPSTREAM_CALLS.inc(self.name)
+                attempts += 1
+                launch = False
+
+            can_hedge = self.hedge_after is not None and attempts < max_attempts
+            wait_for = min(remaining, min(expiry for expiry, _ in pending.values()) - now)
+            if can_hedge:
+                wait_for = min(wait_for, self.hedge_after)
+            done, _ = wait(list(pending), timeout=max(0.0, wait_for), return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in done:
+                expiry, attempt_timeout = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    if attempt_timeout < self.timeout and now >= expiry - DEADLINE_SLACK:
+                        last_error = cut_short(attempt_timeout)
+                    else:
+                        metrics.UPSTREAM_ERRORS.inc(self.name)
+                        failed, last_error = True, e
+                    continue
+                self.breaker.record_success()
+                return result
+
+            # Attempts past their own timeout are abandoned (left to finish in the pool)
+            for future, (expiry, attempt_timeout) in list(pending.items()):
+                if now >= expiry:
+                    del pending[future]
+                    if attempt_timeout < self.timeout:
+                        last_error = cut_short(attempt_timeout)
+                    else:
+                        metrics.UPSTREAM_ERRORS.inc(self.name)
+                        failed = True
+                        last_error = TimeoutError(f"{self.name}: timed out after {attempt_timeout:.2f}s")
+
+            if not pending:
+                if attempts < max_attempts and self.budget.withdraw():
+                    RETRIES.inc(self.name)
+                    launch = True
+                    continue
+                if failed:
+                    self.breaker.record_failure()
+                else:
+                    self.breaker.release()
+                raise last_error
+
+            if not done and can_hedge and self.budget.withdraw():
+                HEDGES.inc(self.name)
+                launch = True
+
+
+def _breaker_states():
+    codes = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    return {(name,): codes[u.breaker.state] for name, u in upstreams.items()}
+
+
+metrics.gauge("safenav_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ("upstream",), _breaker_states)
@@ -0,0 +1,138 @@
+"""
+Risk Model Module
+
+Batched helpers around the flood models so many points cost one model call:
+- Feature matrix for arrays of coordinates
+- Flood probability and severity per point
+- Risk-weighted edge cost factor (same formula as dijkstra_shortest_safest_path)
+- Area grids, lattice interpolation and compact intensity encoding for heatmaps
+"""
+
+import base64
+
+import numpy as np
+
+# Feature defaults used at inference: [lat, lng, month, main_cause, area, state]
+MAIN_CAUSE_ENC = 0   # unknown at inference
+AREA_AFFECTED = 1000
+STATE_ENC = 0        # unknown
+
+
+def features(lats, lngs, month) -> np.ndarray:
+    """
+    Model feature matrix for many points
+
+    Args:
+        lats: Latitudes (array-like)
+        lngs: Longitudes (array-like)
+        month: Month number, scalar or one per point
+
+    Returns:
+        (n, 6) float array
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    X = np.empty((lats.shape[0], 6), dtype=np.float64)
+    X[:, 0] = lats
+    X[:, 1] = lngs
+    X[:, 2] = month
+    X[:, 3] = MAIN_CAUSE_ENC
+    X[:, 4] = AREA_AFFECTED
+    X[:, 5] = STATE_ENC
+    return X
+
+
+def predict_points(clf, reg, lats, lngs, month):
+    """
+    Flood probability and severity for many points in one model pass
+
+    Args:
+        clf: Flood risk classifier
+        reg: Flood severity regressor
+        lats, lngs: Coordinates (array-like)
+        month: Month number
+
+    Returns:
+        (probability, severity) float arrays; probability is the class-1
+        column, or the only column if the classifier saw a single class
+    """
+    X = features(lats, lngs, month)
+    if X.shape[0] == 0:
+        return np.zeros(0), np.zeros(0)
+
+    severity = reg.predict(X)
+    return _probability(clf, X), np.asarray(severity, dtype=np.float64)
+
+
+def predict_probability(clf, lats, lngs, month) -> np.ndarray:
+    """Flood probability only, for callers that don't need severity"""
+    X = features(lats, lngs, month)
+    if X.shape[0] == 0:
+        return np.zeros(0)
+    return _probability(clf, X)
+
+
+def _probability(clf, X) -> np.ndarray:
+    proba = clf.predict_proba(X)
+    probability = proba[:, 1] if proba.shape[1] > 1 else proba[:, 0]
+    return probability.astype(np.float64)
+
+
+def rain_factor(rain):
+    """1 + min(rain / 10, 1), element-wise"""
+    return 1.0 + np.minimum(np.asarray(rain, dtype=np.float64) / 10.0, 1.0)
+
+
+def edge_weight_factor(probability, severity, rain):
+    """
+    Risk multiplier applied to edge distance:
+    1 + risk * 5 + severity * 0.5 + min(rain / 10, 1) * 0.3,
+    where risk = probability * rain_factor(rain)
+    """
+    rain = np.asarray(rain, dtype=np.float64)
+    risk = np.asarray(probability) * rain_factor(rain)
+    return 1.0 + risk * 5.0 + np.asarray(severity) * 0.5 + np.minimum(rain / 10.0, 1.0) * 0.3
+
+
+def area_grid(lat: float, lng: float, radius_km: float, size: int):
+    """
+    Regular size x size grid of points centred on a location
+
+    Returns:
+        (lats, lngs, bounds): (size, size) arrays with row 0 at the north
+        edge, and (min_lat, min_lng, max_lat, max_lng)
+    """
+    d_lat = radius_km / 111.32
+    d_lng = radius_km / (111.32 * max(np.cos(np.radians(lat)), 1e-6))
+    lat_axis = np.linspace(lat + d_lat, lat - d_lat, size)
+    lng_axis = np.linspace(lng - d_lng, lng + d_lng, size)
+    lngs, lats = np.meshgrid(lng_axis, lat_axis)
+    return lats, lngs, (lat - d_lat, lng - d_lng, lat + d_lat, lng + d_lng)
+
+
+def interpolate_lattice(values, bounds, lats, lngs) -> np.ndarray:
+    """
+    Bilinear interpolation of a k x k lattice of samples spanning `bounds`
+    (row 0 at the north edge, like area_grid) at arbitrary points
+    """
+    values = np.asarray(values, dtype=np.float64)
+    k = values.shape[0]
+    min_lat, min_lng, max_lat, max_lng = bounds
+    if k == 1:
+        return np.full(np.shape(lats), values[0, 0])
+
+    # Fractional lattice coordinates, clamped to the lattice
+    row = np.clip((max_lat - np.asarray(lats)) / (max_lat - min_lat) * (k - 1), 0, k - 1)
+    col = np.clip((np.asarray(lngs) - min_lng) / (max_lng - min_lng) * (k - 1), 0, k - 1)
+    r0 = np.minimum(row.astype(int), k - 2)
+    c0 = np.minimum(col.astype(int), k - 2)
+    fr = row - r0
+    fc = col - c0
+    top = values[r0, c0] * (1 - fc) + values[r0, c0 + 1] * fc
+    bottom = values[r0 + 1, c0] * (1 - fc) + values[r0 + 1, c0 + 1] * fc
+    return top * (1 - fr) + bottom * fr
+
+
+def encode_intensity(intensity) -> str:
+    """Quantize 0-1 intensities to one byte each (row-major) and base64 them"""
+    quantized = np.round(np.clip(np.asarray(intensity, dtype=np.float64), 0.0, 1.0) * 255).astype(np.uint8)
+    return base64.b64encode(quantized.tobytes()).decode("ascii")
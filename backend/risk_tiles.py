@@ -0,0 +1,190 @@
+"""
+Risk Tiles Module
+
+Flood-risk raster tiles for the map overlay (`/tiles/risk/{month}/{z}/{x}/{y}`):
+- Web Mercator (XYZ) tiles rendered from one batched model call per tile,
+  sampled on a coarse grid and smoothly upscaled to 256px
+- Transparent-to-red PNG colouring of flood probability for the month
+- Two cache levels keyed by model version, month and tile: an in-memory
+  LRU of encoded PNGs and a directory tree on disk
+"""
+
+import io
+import os
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+TILE_SIZE = 256
+SAMPLES = 64        # model samples per tile side; upscaled to TILE_SIZE
+MAX_ZOOM = 18
+MIN_ALPHA_INTENSITY = 0.05  # below this the tile stays transparent
+
+# Colour stops (intensity, RGBA): green -> yellow -> red, more opaque as risk rises
+COLOR_STOPS = [
+    (0.0, (34, 197, 94, 0)),
+    (0.3, (34, 197, 94, 90)),
+    (0.6, (234, 179, 8, 140)),
+    (1.0, (239, 68, 68, 190)),
+]
+
+TileKey = Tuple[int, int, int, int]  # (month, z, x, y)
+
+
+def tile_sample_points(z: int, x: int, y: int, samples: int = SAMPLES):
+    """
+    Sample point centres across a tile, evenly spaced in Mercator pixels
+
+    Returns:
+        (lats, lngs) arrays of shape (samples, samples), row 0 at the top
+    """
+    n = 2 ** z
+    frac = (np.arange(samples) + 0.5) / samples
+    lngs = (x + frac) / n * 360.0 - 180.0
+    lats = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y + frac) / n))))
+    lng_grid, lat_grid = np.meshgrid(lngs, lats)
+    return lat_grid, lng_grid
+
+
+def colorize(intensity: np.ndarray) -> np.ndarray:
+    """RGBA uint8 image from 0-1 intensities"""
+    intensity = np.clip(intensity, 0.0, 1.0)
+    stops = np.array([s[0] for s in COLOR_STOPS])
+    colors = np.array([s[1] for s in COLOR_STOPS], dtype=np.float64)
+    rgba = np.stack([np.interp(intensity, stops, colors[:, c]) for c in range(4)], axis=-1)
+    rgba[intensity < MIN_ALPHA_INTENSITY, 3] = 0
+    return rgba.round().astype(np.uint8)
+
+
+def encode_png(intensity: np.ndarray) -> bytes:
+    """Upscale a coarse intensity grid to a TILE_SIZE PNG"""
+    coarse = Image.fromarray(colorize(intensity))
+    tile = coarse.resize((TILE_SIZE, TILE_SIZE), Image.Resampling.BILINEAR)
+    out = io.BytesIO()
+    tile.save(out, format="PNG", optimize=False, compress_level=6)
+    return out.getvalue()
+
+
+def model_tag(*paths: str) -> str:
+    """Short tag that changes whenever a model file changes"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            st = os.stat(path)
+            digest.update(f"{path}:{st.st_size}:{st.st_mtime_ns}".encode())
+        except OSError:
+            digest.update(path.encode())
+    return digest.hexdigest()[:10]
+
+
+class TileCache:
+    """Rendered risk tiles with memory and disk caching"""
+
+    def __init__(
+        self,
+        render_fn: Callable[[int, np.ndarray, np.ndarray], np.ndarray],
+        cache_dir: Optional[str],
+        tag: str,
+        memory_tiles: int = 512
+    ):
+        """
+        Args:
+            render_fn: (month, lats, lngs) -> intensity (0-1), same shape
+            cache_dir: Disk cache root (None disables the disk level)
+            tag: Model version tag; part of every key and the disk path
+            memory_tiles: PNGs kept in memory
+        """
+        self.render_fn = render_fn
+        self.cache_dir = os.path.join(cache_dir, tag) if cache_dir else None
+        self.tag = tag
+        self.memory_tiles = memory_tiles
+        self._memory: "OrderedDict[TileKey, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        # One render per tile at a time; concurrent requests wait for it
+        self._render_locks: Dict[TileKey, threading.Lock] = {}
+        self.hits = {"memory": 0, "disk": 0, "render": 0}
+
+    def __len__(self) -> int:
+        """Tiles held in memory"""
+        return len(self._memory)
+
+    def _path(self, key: TileKey) -> Optional[str]:
+        if self.cache_dir is None:
+            return None
+        month, z, x, y = key
+        return os.path.join(self.cache_dir, str(month), str(z), str(x), f"{y}.png")
+
+    def _remember(self, key: TileKey, png: bytes) -> None:
+        with self._lock:
+            self._memory[key] = png
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_tiles:
+                self._memory.popitem(last=False)
+
+    def _from_memory(self, key: TileKey) -> Optional[bytes]:
+        with self._lock:
+            png = self._memory.get(key)
+            if png is not None:
+                self._memory.move_to_end(key)
+            return png
+
+    def get(self, month: int, z: int, x: int, y: int) -> Tuple[bytes, str]:
+        """
+        PNG bytes for a tile and where they came from ("memory", "disk", "render")
+
+        Raises:
+            ValueError: If the tile coordinates are out of range
+        """
+        if not (1 <= month <= 12 and 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+            raise ValueError("Tile out of range")
+        key = (month, z, x, y)
+
+        png = self._from_memory(key)
+        if png is not None:
+            self.hits["memory"] += 1
+            return png, "memory"
+
+        with self._lock:
+            render_lock = self._render_locks.setdefault(key, threading.Lock())
+
+        with render_lock:
+            png = self._from_memory(key)
+            if png is not None:
+                self.hits["memory"] += 1
+                return png, "memory"
+
+            path = self._path(key)
+            if path and os.path.exists(path):
+                with open(path, "rb") as f:
+                    png = f.read()
+                source = "disk"
+            else:
+                lats, lngs = tile_sample_points(z, x, y)
+                png = encode_png(self.render_fn(month, lats, lngs))
+                source = "render"
+                if path:
+                    self._write(path, png)
+
+            self._remember(key, png)
+            self.hits[source] += 1
+
+        with self._lock:
+            self._render_locks.pop(key, None)
+        return png, source
+
+    def _write(self, path: str, png: bytes) -> None:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp, "wb") as f:
+                f.write(png)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not write tile cache file {path}: {e}")
@@ -0,0 +1,456 @@
+"""
+Risk Weights Module
+
+Background pipeline that keeps road-graph edge weights up to date:
+- Model outputs per edge are computed once per weight profile (month)
+- Tracks which weather cells were refreshed since the last run and
+  recomputes weights only for edges inside cells whose rain changed
+- Publishes immutable, versioned weight arrays (plus the customized CCH
+  metric) by reference swap, so queries read them without locking
+- Builds one weight array per weather forecast slot for time-dependent
+  routing (edge risk at the predicted time of reaching the edge)
+"""
+
+import time
+import bisect
+import logging
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import risk_model
+from road_graph import RoadGraph
+
+logger = logging.getLogger(__name__)
+
+Cell = Tuple[float, float]
+
+
+class WeightVersion:
+    """One published, read-only set of edge weights for a profile"""
+
+    __slots__ = ("version", "month", "weights", "metric", "created_at", "_list")
+
+    def __init__(self, version: int, month: int, weights: np.ndarray, metric=None):
+        weights.flags.writeable = False
+        self.version = version
+        self.month = month
+        self.weights = weights
+        self.metric = metric
+        self.created_at = time.time()
+        self._list: Optional[list] = None
+
+    def weight_list(self) -> list:
+        # Converted once per version; the searches index plain lists
+        if self._list is None:
+            self._list = self.weights.tolist()
+        return self._list
+
+
+class RiskWeightPipeline:
+    """Incrementally maintained edge weights for each routing profile"""
+
+    def __init__(
+        self,
+        graph: RoadGraph,
+        base_fn: Callable[[int], Tuple[np.ndarray, np.ndarray]],
+        cell_rain_fn: Callable[[Cell], float],
+        changes_fn: Callable[[int], Tuple[List[Cell], int]],
+        months: Iterable[int] = (4, 7),
+        interval: float = 30.0,
+        refresh_cell_fn: Optional[Callable[[float, float], object]] = None,
+        refresh_per_tick: int = 10
+    ):
+        """
+        Args:
+            graph: Road graph
+            base_fn: month -> (flood probability, severity) per edge
+            cell_rain_fn: Latest known rain for a weather cell (0 if unknown)
+            changes_fn: version -> (cells refreshed after that version, latest version)
+            months: Profiles kept warm
+            interval: Seconds between background refreshes
+            refresh_cell_fn: Optional weather fetch (lat, lng) used to keep graph
+                cells from going stale; called for a few cells per tick
+            refresh_per_tick: Cells passed to refresh_cell_fn per tick
+        """
+        self.graph = graph
+        self.months = tuple(months)
+        self.interval = interval
+        self._base_fn = base_fn
+        self._cell_rain_fn = cell_rain_fn
+        self._changes_fn = changes_fn
+        self._refresh_cell_fn = refresh_cell_fn
+        self._refresh_per_tick = refresh_per_tick
+
+        self.cells, self.edge_cell = graph.weather_cells()
+        self._cell_index: Dict[Cell, int] = {
+            (round(float(lat), 2), round(float(lng), 2)): i for i, (lat, lng) in enumerate(self.cells)
+        }
+        # Edges grouped by cell: edges of cell i are _cell_edges[_cell_ptr[i]:_cell_ptr[i + 1]]
+        self._cell_edges = np.argsort(self.edge_cell, kind="stable")
+        self._cell_ptr = np.zeros(len(self.cells) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.edge_cell, minlength=len(self.cells)), out=self._cell_ptr[1:])
+
+        self._cell_rain = np.array(
+            [self._cell_rain_fn((round(float(lat), 2), round(float(lng), 2))) for lat, lng in self.cells],
+            dtype=np.float64
+        )
+        self._seen_version = 0
+        self._sweep_pos = 0
+
+        self._base: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        # Replaced wholesale on publish; readers never see a partial update
+        self._current: Dict[int, WeightVersion] = {}
+        self._version = 0
+        self._hierarchy = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------ readers
+
+    def current(self, month: int) -> WeightVersion:
+        """Latest weights for a profile (built on first use)"""
+        version = self._current.get(month)
+        if version is None:
+            with self._lock:
+                version = self._current.get(month)
+                if version is None:
+                    version = self._publish(month, self._full_weights(month))
+        return version
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    # ------------------------------------------------------------------ writers
+
+    def set_hierarchy(self, hierarchy) -> None:
+        """Attach a CCH once it is ready and customize the current versions"""
+        with self._lock:
+            self._hierarchy = hierarchy
+            for month, version in list(self._current.items()):
+                self._publish(month, version.weights)
+
+    def _publish(self, month: int, weights: np.ndarray) -> WeightVersion:
+        metric = self._hierarchy.customize(weights) if self._hierarchy is not None else None
+        self._version += 1
+        version = WeightVersion(self._version, month, weights, metric)
+        self._current = {**self._current, month: version}
+        return version
+
+    def _profile_base(self, month: int) -> Tuple[np.ndarray, np.ndarray]:
+        if month not in self._base:
+            self._base[month] = self._base_fn(month)
+        return self._base[month]
+
+    def _edge_weights(self, month: int, edges) -> np.ndarray:
+        probability, severity = self._profile_base(month)
+        rain = self._cell_rain[self.edge_cell[edges]]
+        return self.graph.edge_length_km[edges] * risk_model.edge_weight_factor(
+            probability[edges], severity[edges], rain
+        )
+
+    def _full_weights(self, month: int) -> np.ndarray:
+        return self._edge_weights(month, slice(None))
+
+    def refresh(self) -> int:
+        """
+        Apply weather changes since the last refresh
+
+        Returns:
+            Number of edges whose weights were recomputed (per profile)
+        """
+        cells, latest = self._changes_fn(self._seen_version)
+        self._seen_version = latest
+
+        changed = []
+        for cell in cells:
+            idx = self._cell_index.get(cell)
+            if idx is None:
+                continue
+            rain = self._cell_rain_fn(cell)
+            if rain != self._cell_rain[idx]:
+                self._cell_rain[idx] = rain
+                changed.append(idx)
+
+        if not changed:
+            return 0
+
+        edges = np.concatenate([
+            self._cell_edges[self._cell_ptr[i]:self._cell_ptr[i + 1]] for i in changed
+        ])
+
+        with self._lock:
+            for month in self.months:
+                old = self._current.get(month)
+                if old is None:
+                    continue
+                weights = old.weights.copy()
+                weights[edges] = self._edge_weights(month, edges)
+                self._publish(month, weights)
+
+        logger.info(f"    Risk weights updated: {len(changed)} weather cells, {len(edges)} edges")
+        return len(edges)
+
+    def _sweep_weather(self) -> None:
+        """Ask for a few graph cells per tick so their weather never goes stale"""
+        if self._refresh_cell_fn is None or not len(self.cells):
+            return
+        for _ in range(min(self._refresh_per_tick, len(self.cells))):
+            lat, lng = self.cells[self._sweep_pos]
+            self._sweep_pos = (self._sweep_pos + 1) % len(self.cells)
+            try:
+                self._refresh_cell_fn(float(lat), float(lng))
+            except Exception as e:
+                logger.warning(f"Weather refresh for cell ({lat}, {lng}) failed: {e}")
+
+    def _run(self) -> None:
+        for month in self.months:
+            self.current(month)
+        while not self._stop.wait(self.interval):
+            try:
+                self._sweep_weather()
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Risk weight refresh failed: {e}")
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="risk-weights", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+class TimeDependentWeights:
+    """
+    Edge weights that vary with time: one weight list per slot time
+
+    Weights between two slot times are linearly interpolated; before the
+    first and after the last slot the nearest slot is used. Slots are
+    materialized lazily, only when a search reaches them.
+    """
+
+    def __init__(self, times: List[float], loaders: List[Callable[[], list]]):
+        self.times = times
+        self._loaders = loaders
+        self._lists: Dict[int, list] = {}
+
+    def __len__(self) -> int:
+        return len(self._loaders)
+
+    def __getitem__(self, slot: int) -> list:
+        values = self._lists.get(slot)
+        if values is None:
+            values = self._lists[slot] = self._loaders[slot]()
+        return values
+
+
+class ForecastProfile:
+    """One published, read-only set of per-forecast-slot edge weights"""
+
+    __slots__ = ("version", "month", "times", "weights", "created_at", "_lists")
+
+    def __init__(self, version: int, month: int, times: List[float], weights: np.ndarray):
+        weights.flags.writeable = False
+        self.version = version
+        self.month = month
+        self.times = times          # slot times, epoch seconds
+        self.weights = weights      # (slots, edge_count)
+        self.created_at = time.time()
+        self._lists: Dict[int, list] = {}
+
+    def slot_list(self, slot: int) -> list:
+        # Plain lists index much faster than NumPy scalars inside the search loop
+        values = self._lists.get(slot)
+        if values is None:
+            values = self._lists[slot] = self.weights[slot].tolist()
+        return values
+
+    def schedule(self, live: WeightVersion, now: float) -> TimeDependentWeights:
+        """Live weights at `now`, followed by the forecast slots after it"""
+        first = bisect.bisect_right(self.times, now)
+        return TimeDependentWeights(
+            [now] + self.times[first:],
+            [live.weight_list]
+            + [functools.partial(self.slot_list, i) for i in range(first, len(self.times))]
+        )
+
+
+def fetch_forecasts(
+    forecast_fn: Callable[[float, float], List[Tuple[float, float]]], cells, workers: int = 8
+) -> List[Optional[Tuple[np.ndarray, np.ndarray]]]:
+    """Forecast (slot times, rain mm/h) per cell, None where it failed"""
+    def fetch(cell):
+        try:
+            series = forecast_fn(float(cell[0]), float(cell[1]))
+        except Exception as e:
+            logger.warning(f"Forecast for cell ({cell[0]}, {cell[1]}) failed: {e}")
+            return None
+        if not series:
+            return None
+        series = sorted(series)
+        return np.array([t for t, _ in series]), np.array([r for _, r in series])
+
+    if len(cells) == 0:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(cells)))) as pool:
+        return list(pool.map(fetch, cells))
+
+
+def resample_forecasts(results) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Per-cell forecasts on common slot times
+
+    Returns:
+        (slot times, rain per slot and cell); cells without a forecast use
+        the slot mean. None if no cell has a forecast
+    """
+    fetched = [r for r in results if r is not None]
+    if not fetched:
+        return None
+    times = np.unique(np.concatenate([t for t, _ in fetched]))
+    rain = np.full((len(times), len(results)), np.nan)
+    for i, result in enumerate(results):
+        if result is not None:
+            rain[:, i] = np.interp(times, result[0], result[1])
+    slot_mean = np.nanmean(rain, axis=1)
+    return times, np.where(np.isnan(rain), slot_mean[:, None], rain)
+
+
+def interpolate_rain(times: np.ndarray, rain: np.ndarray, cells: np.ndarray, lats, lngs, when) -> np.ndarray:
+    """
+    Forecast rain (mm/h) at points and times
+
+    Args:
+        times, rain: Slot times and rain per slot and cell (resample_forecasts)
+        cells: (lat, lng) of each cell; each point uses the nearest one
+        lats, lngs: Point coordinates, shape (n,)
+        when: Epoch seconds, any shape broadcastable to (..., n)
+
+    Returns:
+        Rain interpolated between forecast slots (clamped at both ends)
+    """
+    lats = np.asarray(lats, dtype=np.float64)
+    lngs = np.asarray(lngs, dtype=np.float64)
+    d2 = (lats[:, None] - cells[None, :, 0]) ** 2 + (lngs[:, None] - cells[None, :, 1]) ** 2
+    cell = np.argmin(d2, axis=1)
+
+    when = np.asarray(when, dtype=np.float64)
+    k0 = np.clip(np.searchsorted(times, when, side="right") - 1, 0, len(times) - 1)
+    k1 = np.minimum(k0 + 1, len(times) - 1)
+    span = np.where(k1 > k0, times[k1] - times[k0], 1.0)
+    frac = np.clip((when - times[k0]) / span, 0.0, 1.0)
+    cell = np.broadcast_to(cell, when.shape)
+    return rain[k0, cell] + frac * (rain[k1, cell] - rain[k0, cell])
+
+
+class ForecastWeights:
+    """
+    Per-forecast-slot edge weights for time-dependent routing
+
+    Forecasts are fetched for a coarse grid of cells covering the graph
+    (forecasts are far coarser than live observations), resampled onto
+    common slot times, and turned into one weight array per slot for
+    each profile, reusing the per-edge model outputs of the live pipeline.
+    """
+
+    def __init__(
+        self,
+        pipeline: RiskWeightPipeline,
+        forecast_fn: Callable[[float, float], List[Tuple[float, float]]],
+        decimals: int = 1,
+        interval: float = 1800.0,
+        workers: int = 8
+    ):
+        """
+        Args:
+            pipeline: Live weight pipeline (graph and per-edge model outputs)
+            forecast_fn: (lat, lng) -> [(epoch seconds, rain mm/h), ...]
+            decimals: Forecast cell size as rounding decimals of lat/lng
+            interval: Seconds between forecast refreshes
+            workers: Concurrent forecast fetches
+        """
+        self.pipeline = pipeline
+        self.graph = pipeline.graph
+        self.interval = interval
+        self._forecast_fn = forecast_fn
+        self._workers = workers
+        self.cells, self.edge_cell = self.graph.weather_cells(decimals)
+
+        self._current: Dict[int, ForecastProfile] = {}
+        self._rain: Optional[Tuple[np.ndarray, np.ndarray]] = None  # (slot times, rain per slot and cell)
+        self._version = 0
+        self._stop = threading.Event()
+
+    def current(self, month: int) -> Optional[ForecastProfile]:
+        """Latest forecast weights for a profile, None until the first refresh"""
+        return self._current.get(month)
+
+    def rain_at(self, lats, lngs, when) -> Optional[np.ndarray]:
+        """
+        Forecast rain (mm/h) at points and times
+
+        Args:
+            lats, lngs: Point coordinates, shape (n,); each point uses the
+                nearest forecast cell
+            when: Epoch seconds, any shape broadcastable to (..., n)
+
+        Returns:
+            Rain interpolated between forecast slots (clamped at both ends),
+            or None before the first refresh
+        """
+        snapshot = self._rain
+        if snapshot is None:
+            return None
+        times, rain = snapshot
+        return interpolate_rain(times, rain, self.cells, lats, lngs, when)
+
+    def refresh(self) -> bool:
+        """
+        Fetch forecasts and publish new slot weights
+
+        Returns:
+            True if new weights were published
+        """
+        results = fetch_forecasts(self._forecast_fn, self.cells, self._workers)
+        resampled = resample_forecasts(results)
+        if resampled is None:
+            logger.warning("No forecasts available - keeping previous forecast weights")
+            return False
+        times, rain = resampled
+        fetched = sum(r is not None for r in results)
+
+        edge_rain = rain[:, self.edge_cell]
+        published = {}
+        for month in self.pipeline.months:
+            probability, severity = self.pipeline._profile_base(month)
+            weights = (
+                self.graph.edge_length_km * risk_model.edge_weight_factor(probability, severity, edge_rain)
+            ).astype(np.float32)
+            self._version += 1
+            published[month] = ForecastProfile(self._version, month, times.tolist(), weights)
+
+        self._current = published
+        self._rain = (times, rain)
+        logger.info(
+            f"    Forecast weights updated: {fetched}/{len(self.cells)} cells, {len(times)} slots"
+        )
+        return True
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"Forecast weight refresh failed: {e}")
+            if self._stop.wait(self.interval):
+                return
+
+    def start(self) -> None:
+        threading.Thread(target=self._run, name="forecast-weights", daemon=True).start()
+
+    def stop(self) -> None:
+        self._stop.set()
@@ -0,0 +1,562 @@
+"""
+Road Graph Module
+
+Compact array-backed road network for risk-weighted routing:
+- Built from an OSM extract exported to GeoJSON, or from route polylines
+- CSR adjacency (indptr / indices / edge ids) in NumPy arrays
+- Saved as an uncompressed .npz so loading is a few array reads
+- A* shortest path over per-edge weight arrays, and a time-dependent
+  variant over per-time-slot weight arrays
+
+Build a graph file from an OSM PBF extract:
+
+    osmium tags-filter city.osm.pbf w/highway -o roads.osm.pbf
+    osmium export roads.osm.pbf -o roads.geojson
+    python road_graph.py build roads.geojson road_graph.npz
+"""
+
+import sys
+import json
+import math
+import heapq
+import bisect
+import logging
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0
+
+# OSM highway values that cars can use
+DRIVABLE_HIGHWAYS = {
+    "motorway", "trunk", "primary", "secondary", "tertiary", "unclassified", "residential",
+    "motorway_link", "trunk_link", "primary_link", "secondary_link", "tertiary_link",
+    "living_street", "service", "road",
+}
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance in km; works on scalars and NumPy arrays"""
+    lat1, lng1, lat2, lng2 = map(np.radians, (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class RoadGraph:
+    """Undirected road graph stored as CSR arrays"""
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, edge_u: np.ndarray, edge_v: np.ndarray):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.edge_u = np.asarray(edge_u, dtype=np.int32)
+        self.edge_v = np.asarray(edge_v, dtype=np.int32)
+        self.edge_length_km = haversine_km(
+            self.lat[self.edge_u], self.lng[self.edge_u],
+            self.lat[self.edge_v], self.lng[self.edge_v]
+        )
+        self.edge_mid_lat = (self.lat[self.edge_u] + self.lat[self.edge_v]) / 2
+        self.edge_mid_lng = (self.lng[self.edge_u] + self.lng[self.edge_v]) / 2
+        self._build_csr()
+        self._lists = None
+        self._cache = {}
+
+    @property
+    def node_count(self) -> int:
+        return self.lat.shape[0]
+
+    @property
+    def edge_count(self) -> int:
+        return self.edge_u.shape[0]
+
+    def _build_csr(self) -> None:
+        # Every undirected edge becomes two arcs
+        tails = np.concatenate([self.edge_u, self.edge_v])
+        heads = np.concatenate([self.edge_v, self.edge_u])
+        edge_ids = np.concatenate([np.arange(self.edge_count)] * 2).astype(np.int32)
+
+        order = np.argsort(tails, kind="stable")
+        self.indices = heads[order].astype(np.int32)
+        self.arc_edge = edge_ids[order]
+        counts = np.bincount(tails, minlength=self.node_count)
+        self.indptr = np.zeros(self.node_count + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.indptr[1:])
+
+    def _python_lists(self):
+        # Plain lists index much faster than NumPy scalars inside the search loop
+        if self._lists is None:
+            self._lists = (
+                self.indptr.tolist(),
+                self.indices.tolist(),
+                self.arc_edge.tolist(),
+                np.radians(self.lat).tolist(),
+                np.radians(self.lng).tolist(),
+            )
+        return self._lists
+
+    # ------------------------------------------------------------------ builders
+
+    @classmethod
+    def from_segments(cls, lines: Iterable[Sequence[Sequence[float]]], precision: int = 6) -> "RoadGraph":
+        """
+        Build a graph from polylines of [lat, lng] points
+
+        Points equal after rounding to `precision` decimals become one node;
+        consecutive points become edges (duplicates and self-loops dropped).
+        """
+        node_index: Dict[Tuple[float, float], int] = {}
+        lat: List[float] = []
+        lng: List[float] = []
+        edges = set()
+
+        for line in lines:
+            prev = None
+            for point in line:
+                key = (round(point[0], precision), round(point[1], precision))
+                idx = node_index.get(key)
+                if idx is None:
+                    idx = node_index[key] = len(lat)
+                    lat.append(point[0])
+                    lng.append(point[1])
+                if prev is not None and prev != idx:
+                    edges.add((min(prev, idx), max(prev, idx)))
+                prev = idx
+
+        edge_array = np.array(sorted(edges), dtype=np.int32).reshape(-1, 2)
+        return cls(np.array(lat), np.array(lng), edge_array[:, 0], edge_array[:, 1])
+
+    @classmethod
+    def from_geojson(cls, path: str) -> "RoadGraph":
+        """
+        Build a graph from a GeoJSON FeatureCollection of road LineStrings
+
+        Features with a `highway` property outside DRIVABLE_HIGHWAYS are skipped.
+        GeoJSON positions are [lng, lat]; they are flipped to [lat, lng].
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        def lines():
+            for feature in data.get("features", []):
+                highway = (feature.get("properties") or {}).get("highway")
+                if highway is not None and highway not in DRIVABLE_HIGHWAYS:
+                    continue
+                geometry = feature.get("geometry") or {}
+                if geometry.get("type") == "LineString":
+                    parts = [geometry["coordinates"]]
+                elif geometry.get("type") == "MultiLineString":
+                    parts = geometry["coordinates"]
+                else:
+                    continue
+                for part in parts:
+                    yield [(p[1], p[0]) for p in part]
+
+        return cls.from_segments(lines(), precision=7)
+
+    def save(self, path: str) -> None:
+        """Write the compiled graph (uncompressed, so loading is just array reads)"""
+        np.savez(path, lat=self.lat, lng=self.lng, edge_u=self.edge_u, edge_v=self.edge_v)
+
+    @classmethod
+    def load(cls, path: str) -> "RoadGraph":
+        with np.load(path) as data:
+            return cls(data["lat"], data["lng"], data["edge_u"], data["edge_v"])
+
+    # ------------------------------------------------------------------ queries
+
+    def nearest_node(self, lat: float, lng: float) -> Tuple[int, float]:
+        """
+        Closest graph node to a coordinate
+
+        Returns:
+            (node index, distance in km)
+        """
+        # Equirectangular approximation to pick the node, haversine for the distance
+        dx = (self.lng - lng) * math.cos(math.radians(lat))
+        dy = self.lat - lat
+        node = int(np.argmin(dx * dx + dy * dy))
+        return node, float(haversine_km(lat, lng, self.lat[node], self.lng[node]))
+
+    def shortest_path(self, weights, source: int, target: int) -> Tuple[Optional[List[int]], float]:
+        """
+        A* search over per-edge weights
+
+        The straight-line distance is an admissible heuristic as long as every
+        edge weight is at least its length in km (risk factors are >= 1).
+
+        Args:
+            weights: Per-edge costs (length edge_count), NumPy array or list
+            source: Start node
+            target: Destination node
+
+        Returns:
+            (list of node indices, total cost), or (None, inf) if unreachable
+        """
+        indptr, indices, arc_edge, lat_r, lng_r = self._python_lists()
+        w = weights.tolist() if isinstance(weights, np.ndarray) else weights
+
+        t_lat, t_lng = lat_r[target], lng_r[target]
+        cos_t = math.cos(t_lat)
+        two_r = 2 * EARTH_RADIUS_KM
+
+        def heuristic(v):
+            s_lat = math.sin((t_lat - lat_r[v]) / 2)
+            s_lng = math.sin((t_lng - lng_r[v]) / 2)
+            a = s_lat * s_lat + math.cos(lat_r[v]) * cos_t * s_lng * s_lng
+            return two_r * math.asin(math.sqrt(min(a, 1.0))) * 0.9999
+
+        dist = {source: 0.0}
+        previous = {source: -1}
+        settled = set()
+        pq = [(heuristic(source), 0.0, source)]
+
+        while pq:
+            _, d, node = heapq.heappop(pq)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node == target:
+                break
+
+            for arc in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[arc]
+                if neighbor in settled:
+                    continue
+                nd = d + w[arc_edge[arc]]
+                if nd < dist.get(neighbor, math.inf):
+                    dist[neighbor] = nd
+                    previous[neighbor] = node
+                    heapq.heappush(pq, (nd + heuristic(neighbor), nd, neighbor))
+
+        if target not in settled:
+            return None, math.inf
+
+        path = []
+        node = target
+        while node != -1:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        return path, dist[target]
+
+    def alternative_paths(
+        self,
+        weights: np.ndarray,
+        source: int,
+        target: int,
+        k: int,
+        penalty: float = 1.5,
+        max_overlap: float = 0.7,
+        max_rounds: Optional[int] = None
+    ) -> List[Tuple[List[int], float, np.ndarray]]:
+        """
+        Up to k diverse low-cost paths (penalty method)
+
+        After each search the edges of the path found are made more expensive
+        and the search is repeated on the same penalized array, so each round
+        is one A* over arrays that are already scored. A candidate is kept
+        only if at most `max_overlap` of its length is shared with a path
+        already kept.
+
+        Args:
+            weights: Per-edge costs
+            source, target: End nodes
+            k: Number of paths wanted
+            penalty: Multiplier applied to a found path's edges per round
+            max_overlap: Largest allowed shared-length fraction
+            max_rounds: Search limit (default 3 * k)
+
+        Returns:
+            [(node path, cost under the original weights, edge ids)], best first
+        """
+        penalized = np.array(weights, dtype=np.float64)
+        found: List[Tuple[List[int], float, np.ndarray]] = []
+        kept_edges = np.zeros(self.edge_count, dtype=bool)
+
+        for _ in range(max_rounds or 3 * k):
+            path, _ = self.shortest_path(penalized, source, target)
+            if path is None:
+                break
+            edges = self.path_edges(path)
+            length = self.edge_length_km[edges]
+            shared = length[kept_edges[edges]].sum() / max(length.sum(), 1e-9)
+
+            if not found or shared <= max_overlap:
+                found.append((path, float(weights[edges].sum()), edges))
+                kept_edges[edges] = True
+                if len(found) == k:
+                    break
+            penalized[edges] *= penalty
+
+        found.sort(key=lambda item: item[1])
+        return found
+
+    def pareto_paths(
+        self,
+        risk: np.ndarray,
+        source: int,
+        target: int,
+        epsilon: float = 0.05,
+        max_labels: int = 16
+    ) -> List[Tuple[List[int], float, float]]:
+        """
+        Pareto frontier of (distance, accumulated risk) paths
+
+        Multi-criteria label-setting search: labels are expanded in order of
+        distance plus the straight-line distance to the target, so a label
+        is final when popped. A new label is dropped if a label at the same
+        node, or one already at the target, epsilon-dominates it (both
+        criteria within a factor 1 + epsilon), and at most `max_labels`
+        labels are kept per node, which bounds the runtime. The exact
+        shortest and lowest distance + risk paths are always included.
+
+        Args:
+            risk: Per-edge risk cost (>= 0), e.g. weights - edge_length_km
+            source, target: End nodes
+            epsilon: Relative dominance slack; 0 gives the exact frontier
+            max_labels: Label cap per node
+
+        Returns:
+            [(node path, distance km, risk)], ordered by distance (risk falls)
+        """
+        indptr, indices, arc_edge, lat_r, lng_r = self._python_lists()
+        if "length_list" not in self._cache:
+            self._cache["length_list"] = self.edge_length_km.tolist()
+        length = self._cache["length_list"]
+        r = risk.tolist() if isinstance(risk, np.ndarray) else risk
+        slack = 1.0 + epsilon
+
+        t_lat, t_lng = lat_r[target], lng_r[target]
+        cos_t = math.cos(t_lat)
+        two_r = 2 * EARTH_RADIUS_KM
+
+        def heuristic(v):
+            s_lat = math.sin((t_lat - lat_r[v]) / 2)
+            s_lng = math.sin((t_lng - lng_r[v]) / 2)
+            a = s_lat * s_lat + math.cos(lat_r[v]) * cos_t * s_lng * s_lng
+            return two_r * math.asin(math.sqrt(min(a, 1.0))) * 0.9999
+
+        # Label i: node, distance, risk, parent label
+        l_node, l_dist, l_risk, l_parent = [source], [0.0], [0.0], [-1]
+        alive = [True]
+        node_labels: Dict[int, List[int]] = {source: [0]}
+        done: List[int] = []
+        pq = [(heuristic(source), 0.0, 0)]
+
+        def dominated(d, rk, labels):
+            for j in labels:
+                if alive[j] and l_dist[j] <= d * slack and l_risk[j] <= rk * slack:
+                    return True
+            return False
+
+        while pq:
+            _, _, label = heapq.heappop(pq)
+            if not alive[label]:
+                continue
+            node, d, rk = l_node[label], l_dist[label], l_risk[label]
+            if node == target:
+                done.append(label)
+                continue
+            # Target pruning: a finished path already covers this label's best case
+            if dominated(d + heuristic(node), rk, done):
+                continue
+
+            for arc in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[arc]
+                edge = arc_edge[arc]
+                nd = d + length[edge]
+                nr = rk + r[edge]
+                labels = node_labels.setdefault(neighbor, [])
+                if dominated(nd, nr, labels) or dominated(nd + heuristic(neighbor), nr, done):
+                    continue
+
+                # Drop labels the new one strictly dominates; keep the cap
+                for j in labels:
+                    if alive[j] and nd <= l_dist[j] and nr <= l_risk[j]:
+                        alive[j] = False
+                labels[:] = [j for j in labels if alive[j]]
+                if len(labels) >= max_labels:
+                    continue
+
+                new = len(l_node)
+                l_node.append(neighbor)
+                l_dist.append(nd)
+                l_risk.append(nr)
+                l_parent.append(label)
+                alive.append(True)
+                labels.append(new)
+                heapq.heappush(pq, (nd + heuristic(neighbor), nr, new))
+
+        candidates = []
+        for label in done:
+            path = []
+            j = label
+            while j != -1:
+                path.append(l_node[j])
+                j = l_parent[j]
+            path.reverse()
+            candidates.append((path, l_dist[label], l_risk[label]))
+
+        # Slack compounds along a path and the cap can cut the search short,
+        # so add the two exact extremes: shortest, and lowest distance + risk
+        risk_array = np.asarray(risk, dtype=np.float64)
+        for weights in (self.edge_length_km, self.edge_length_km + risk_array):
+            path, _ = self.shortest_path(weights, source, target)
+            if path is not None:
+                edges = self.path_edges(path)
+                candidates.append((path, float(self.edge_length_km[edges].sum()), float(risk_array[edges].sum())))
+
+        # Keep the non-dominated ones, ordered by distance
+        frontier = []
+        for path, d, rk in sorted(candidates, key=lambda c: (c[1], c[2])):
+            if not frontier or rk < frontier[-1][2]:
+                frontier.append((path, d, rk))
+
+        # Thin to steps of at least epsilon in risk, keeping both ends
+        paths = frontier[:1]
+        for item in frontier[1:-1]:
+            if item[2] * slack <= paths[-1][2]:
+                paths.append(item)
+        if len(frontier) > 1:
+            if paths[-1][2] <= frontier[-1][2] * slack and len(paths) > 1:
+                paths.pop()
+            paths.append(frontier[-1])
+        return paths
+
+    def time_dependent_path(
+        self, schedule, depart: float, source: int, target: int, speed_kmh: float
+    ) -> Tuple[Optional[List[int]], float, float]:
+        """
+        A* search where an edge's weight depends on when it is reached
+
+        Arrival times follow edge length at a constant speed; the weight of an
+        edge is interpolated between the two schedule slots around the time
+        the edge is entered. This is an approximation: each node keeps only
+        its cheapest label, but a costlier path that reaches the node at a
+        different time can meet cheaper forecast slots further on, so the
+        result is not guaranteed to be the cheapest time-dependent path
+        (it is exact when the weights don't change between slots).
+
+        Args:
+            schedule: Slot times (`schedule.times`, epoch seconds, ascending)
+                and per-slot weight lists (`schedule[i]`), e.g.
+                risk_weights.TimeDependentWeights
+            depart: Departure time, epoch seconds
+            source: Start node
+            target: Destination node
+            speed_kmh: Assumed travel speed
+
+        Returns:
+            (list of node indices, total cost, arrival time), or (None, inf, inf)
+        """
+        indptr, indices, arc_edge, lat_r, lng_r = self._python_lists()
+        if "length_list" not in self._cache:
+            self._cache["length_list"] = self.edge_length_km.tolist()
+        length = self._cache["length_list"]
+        times = schedule.times
+        last = len(times) - 1
+        hours_per_km = 1.0 / speed_kmh
+
+        t_lat, t_lng = lat_r[target], lng_r[target]
+        cos_t = math.cos(t_lat)
+        two_r = 2 * EARTH_RADIUS_KM
+
+        def heuristic(v):
+            s_lat = math.sin((t_lat - lat_r[v]) / 2)
+            s_lng = math.sin((t_lng - lng_r[v]) / 2)
+            a = s_lat * s_lat + math.cos(lat_r[v]) * cos_t * s_lng * s_lng
+            return two_r * math.asin(math.sqrt(min(a, 1.0))) * 0.9999
+
+        dist = {source: 0.0}
+        arrival = {source: depart}
+        previous = {source: -1}
+        settled = set()
+        pq = [(heuristic(source), 0.0, source)]
+
+        while pq:
+            _, d, node = heapq.heappop(pq)
+            if node in settled:
+                continue
+            settled.add(node)
+            if node == target:
+                break
+
+            # Slot pair and blend for the time this node is left
+            t = arrival[node]
+            slot = bisect.bisect_right(times, t) - 1
+            if slot < 0:
+                w0 = w1 = schedule[0]
+                frac = 0.0
+            elif slot >= last:
+                w0 = w1 = schedule[last]
+                frac = 0.0
+            else:
+                w0, w1 = schedule[slot], schedule[slot + 1]
+                frac = (t - times[slot]) / (times[slot + 1] - times[slot])
+
+            for arc in range(indptr[node], indptr[node + 1]):
+                neighbor = indices[arc]
+                if neighbor in settled:
+                    continue
+                edge = arc_edge[arc]
+                a = w0[edge]
+                nd = d + a + frac * (w1[edge] - a)
+                if nd < dist.get(neighbor, math.inf):
+                    dist[neighbor] = nd
+                    arrival[neighbor] = t + length[edge] * hours_per_km * 3600.0
+                    previous[neighbor] = node
+                    heapq.heappush(pq, (nd + heuristic(neighbor), nd, neighbor))
+
+        if target not in settled:
+            return None, math.inf, math.inf
+
+        path = []
+        node = target
+        while node != -1:
+            path.append(node)
+            node = previous[node]
+        path.reverse()
+        return path, dist[target], arrival[target]
+
+    def weather_cells(self, decimals: int = 2) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Group edges by weather cache cell (midpoint rounded to `decimals`)
+
+        Returns:
+            (cells, edge_cell): unique (lat, lng) cell centers, shape (k, 2),
+            and the cell index of every edge, shape (edge_count,)
+        """
+        key = ("cells", decimals)
+        if key not in self._cache:
+            rounded = np.stack([
+                np.round(self.edge_mid_lat, decimals),
+                np.round(self.edge_mid_lng, decimals)
+            ], axis=1)
+            cells, edge_cell = np.unique(rounded, axis=0, return_inverse=True)
+            self._cache[key] = (cells, edge_cell.reshape(-1))
+        return self._cache[key]
+
+    def path_edges(self, path: Sequence[int]) -> np.ndarray:
+        """Edge ids along a node path"""
+        edge_ids = []
+        for a, b in zip(path, path[1:]):
+            lo, hi = self.indptr[a], self.indptr[a + 1]
+            arcs = np.nonzero(self.indices[lo:hi] == b)[0]
+            edge_ids.append(int(self.arc_edge[lo + arcs[0]]))
+        return np.array(edge_ids, dtype=np.int64)
+
+    def coordinates(self, path: Sequence[int]) -> List[List[float]]:
+        return [[float(self.lat[n]), float(self.lng[n])] for n in path]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+    if len(sys.argv) != 4 or sys.argv[1] != "build":
+        print("Usage: python road_graph.py build <roads.geojson> <road_graph.npz>")
+        sys.exit(1)
+
+    graph = RoadGraph.from_geojson(sys.argv[2])
+    graph.save(sys.argv[3])
+    logger.info(f"✓ Road graph saved: {graph.node_count} nodes, {graph.edge_count} edges -> {sys.argv[3]}")
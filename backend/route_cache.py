@@ -0,0 +1,96 @@
+"""
+Route Cache Module
+
+Response cache for the route scoring endpoints:
+- Keys hash the exact route points, mode and request options
+- Plus a weather epoch (versions of the weather cells the routes cross)
+  and a hazard epoch (active reports near the routes), so an entry stops
+  matching as soon as rain or reported hazards change along the route
+- Bounded LRU with a maximum age
+"""
+
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from report_feed import BBox
+
+def fingerprint(coords: Sequence[Sequence[float]]) -> str:
+    """
+    Hash of the exact [lat, lng] points, in order
+
+    Responses depend on more than the route's shape (point count drives
+    complexity, length and sampling; dijkstra echoes the points back), so
+    only an identical polyline may share a cache entry.
+    """
+    points = np.ascontiguousarray(coords, dtype=np.float64).reshape(-1, 2)
+    return f"{len(points)}:{hashlib.sha1(points.tobytes()).hexdigest()}"
+
+
+def covered_cells(routes: Sequence[Sequence[Sequence[float]]], decimals: int = 2) -> List[Tuple[float, float]]:
+    """Weather cache cells (points rounded to `decimals`) crossed by any route"""
+    cells = set()
+    for route in routes:
+        for lat, lng in route:
+            cells.add((round(lat, decimals), round(lng, decimals)))
+    return sorted(cells)
+
+
+def padded_bbox(routes: Sequence[Sequence[Sequence[float]]], pad: float) -> Optional[BBox]:
+    """Bounding box of all routes grown by `pad` degrees"""
+    points = [p for route in routes for p in route]
+    if not points:
+        return None
+    lats = [p[0] for p in points]
+    lngs = [p[1] for p in points]
+    return min(lngs) - pad, min(lats) - pad, max(lngs) + pad, max(lats) + pad
+
+
+def make_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable key parts"""
+    blob = json.dumps(parts, separators=(",", ":"), sort_keys=True, default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+class RouteCache:
+    """Thread-safe LRU of responses with a maximum age"""
+
+    def __init__(self, max_entries: int = 256, max_age: float = 1800.0):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.time() - entry[0] > self.max_age:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
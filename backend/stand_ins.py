@@ -0,0 +1,258 @@
+"""
+Stand-ins Module
+
+Local replacements for the external services, used when the server runs in
+load-test mode (LOAD_TEST_MODE=1):
+- OpenWeather current weather, 5-day forecast and geocoding, with rain that
+  is deterministic per weather cell
+- An in-memory report store with the same interface as database.py, seeded
+  with synthetic hazard reports
+- A Gemini model whose generate_content returns canned bullet points
+- Latency and error injection per upstream, configured from the environment:
+
+    LOAD_TEST_<UPSTREAM>_LATENCY_MS   mean added latency (default per upstream)
+    LOAD_TEST_<UPSTREAM>_JITTER_MS    uniform +/- jitter around the mean
+    LOAD_TEST_<UPSTREAM>_ERROR_RATE   fraction of calls that raise (0-1)
+
+  with UPSTREAM one of WEATHER, GEOCODE, FIRESTORE, GEMINI.
+"""
+
+import os
+import time
+import random
+import hashlib
+import logging
+import datetime
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Kolkata; where seeded reports and geocoded places end up
+CENTER = (22.5726, 88.3639)
+FORECAST_SLOTS = 40  # 5 days of 3-hour slots, as OpenWeather returns
+REPORT_ISSUES = ["flood", "waterlogging", "road_block", "pothole"]
+
+
+class StandInError(ConnectionError):
+    """Injected upstream failure"""
+
+
+class Injector:
+    """Adds latency and random failures to stand-in calls"""
+
+    def __init__(self, name: str, latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0, seed=None):
+        self.name = name
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+
+    @classmethod
+    def from_env(cls, name: str, latency_ms: float) -> "Injector":
+        prefix = f"LOAD_TEST_{name.upper()}_"
+        latency_ms = float(os.getenv(prefix + "LATENCY_MS", latency_ms))
+        return cls(
+            name,
+            latency_ms=latency_ms,
+            jitter_ms=float(os.getenv(prefix + "JITTER_MS", latency_ms / 4)),
+            error_rate=float(os.getenv(prefix + "ERROR_RATE", "0")),
+        )
+
+    def __call__(self, timeout: Optional[float] = None) -> None:
+        """
+        Wait the injected latency, then raise StandInError at the error rate;
+        a latency beyond `timeout` seconds waits the timeout and fails
+        """
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        if timeout is not None and delay / 1000.0 > timeout:
+            time.sleep(timeout)
+            raise StandInError(f"{self.name} timed out after {timeout:.2f}s")
+        if delay:
+            time.sleep(delay / 1000.0)
+        if fail:
+            raise StandInError(f"Injected {self.name} failure")
+
+    def stats(self) -> dict:
+        return {
+            "latency_ms": self.latency_ms,
+            "jitter_ms": self.jitter_ms,
+            "error_rate": self.error_rate,
+            "calls": self.calls,
+            "errors": self.errors,
+        }
+
+
+# Typical round trips of the real services
+upstreams: Dict[str, Injector] = {
+    "weather": Injector.from_env("weather", 80),
+    "geocode": Injector.from_env("geocode", 120),
+    "firestore": Injector.from_env("firestore", 30),
+    "gemini": Injector.from_env("gemini", 900),
+}
+
+
+def _cell_noise(lat: float, lon: float, salt: str = "") -> float:
+    """Stable 0-1 value for a ~1.1 km weather cell"""
+    cell = f"{round(lat, 2):.2f},{round(lon, 2):.2f}{salt}"
+    return int(hashlib.md5(cell.encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+
+
+def current_weather(lat: float, lon: float, timeout: Optional[float] = None) -> dict:
+    """OpenWeather /data/2.5/weather response body for a point"""
+    upstreams["weather"](timeout)
+    rain = round(_cell_noise(lat, lon) ** 2 * 15.0, 2)
+    return {
+        "main": {"temp": 29.0, "humidity": round(60 + 35 * _cell_noise(lat, lon, "h"), 1), "pressure": 1005},
+        "rain": {"1h": rain},
+        "wind": {"speed": 3.0},
+        "weather": [{"main": "Rain" if rain > 0.5 else "Clouds"}],
+        "dt": int(time.time()),
+    }
+
+
+def forecast(lat: float, lon: float, timeout: Optional[float] = None) -> List[Tuple[float, float]]:
+    """Forecast rain for a cell as [(epoch seconds, mm per hour), ...]"""
+    upstreams["weather"](timeout)
+    start = (int(time.time()) // 10800 + 1) * 10800
+    base = _cell_noise(lat, lon)
+    return [
+        (float(start + i * 10800), round(base * 10.0 * (0.5 + 0.5 * _cell_noise(lat, lon, str(i))), 2))
+        for i in range(FORECAST_SLOTS)
+    ]
+
+
+def geocode(location_name: str, timeout: Optional[float] = None) -> List[dict]:
+    """OpenWeather /geo/1.0/direct response body: places near CENTER"""
+    upstreams["geocode"](timeout)
+    offset = int(hashlib.md5(location_name.lower().encode()).hexdigest()[:8], 16) / 0xFFFFFFFF
+    return [{"name": location_name, "lat": CENTER[0] + (offset - 0.5) * 0.1, "lon": CENTER[1] + (offset - 0.5) * 0.1}]
+
+
+class _GeminiResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class GenerativeModel:
+    """Gemini model stand-in; answers every prompt with two bullet points"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def generate_content(self, prompt: str) -> _GeminiResponse:
+        upstreams["gemini"]()
+        if "None" in prompt.split("User Reported Hazards", 1)[-1][:80]:
+            return _GeminiResponse("- Route is clear of reported hazards\n- Expect normal traffic conditions")
+        return _GeminiResponse("- Reported hazards on this route, drive with caution\n- Consider the alternative route")
+
+
+class ReportStore:
+    """
+    In-memory hazard reports with the interface of database.py
+
+    Reports expire after two minutes like in Firestore, except the seeded
+    ones, which stay for the whole run.
+    """
+
+    def __init__(self, seed_reports: int = 0, seed: int = 0):
+        self._reports: Dict[str, dict] = {}
+        self._permanent = set()
+        self._listeners: List[Callable[[str, dict], None]] = []
+        self._lock = threading.Lock()
+        rng = random.Random(seed)
+        now = datetime.datetime.now().isoformat()
+        for i in range(seed_reports):
+            report = {
+                "id": f"seed-{i}",
+                "lat": CENTER[0] + rng.uniform(-0.15, 0.15),
+                "lng": CENTER[1] + rng.uniform(-0.15, 0.15),
+                "issue_type": rng.choice(REPORT_ISSUES),
+                "description": "Seeded load-test report",
+                "image_url": None,
+                "timestamp": now,
+            }
+            self._reports[report["id"]] = report
+            self._permanent.add(report["id"])
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, report: dict):
+        for callback in self._listeners:
+            try:
+                callback(event, report)
+            except Exception as e:
+                logger.warning(f"Report listener failed on {event}: {e}")
+
+    def init_db(self):
+        logger.info(f"✓ Using in-memory report store ({len(self._reports)} seeded reports)")
+
+    def add_report(self, report: dict):
+        try:
+            with metrics.upstream("firestore"):
+                upstreams["firestore"]()
+            with self._lock:
+                self._reports[report["id"]] = dict(report)
+            self._notify("added", report)
+        except StandInError as e:
+            logger.warning(f"Failed to add report: {e}")
+
+    def update_report(self, report_id: str, fields: dict):
+        try:
+            with metrics.upstream("firestore"):
+                upstreams["firestore"]()
+            with self._lock:
+                if report_id not in self._reports:
+                    raise KeyError(report_id)
+                self._reports[report_id].update(fields)
+            self._notify("updated", {"id": report_id, **fields})
+        except (StandInError, KeyError) as e:
+            logger.warning(f"Failed to update report {report_id}: {e}")
+
+    def cleanup_expired_reports(self):
+        try:
+            with metrics.upstream("firestore"):
+                upstreams["firestore"]()
+            cutoff = (datetime.datetime.now() - datetime.timedelta(minutes=2)).isoformat()
+            with self._lock:
+                expired = [
+                    self._reports.pop(key) for key, report in list(self._reports.items())
+                    if key not in self._permanent and report.get("timestamp", "") < cutoff
+                ]
+            for report in expired:
+                self._notify("expired", report)
+        except StandInError as e:
+            logger.warning(f"Cleanup failed: {e}")
+
+    def get_all_reports(self) -> List[dict]:
+        self.cleanup_expired_reports()
+        try:
+            with metrics.upstream("firestore"):
+                upstreams["firestore"]()
+            with self._lock:
+                return [dict(report) for report in self._reports.values()]
+        except StandInError as e:
+            logger.warning(f"Failed to fetch reports: {e}")
+            return []
+
+
+database = ReportStore(
+    seed_reports=int(os.getenv("LOAD_TEST_REPORTS", "200")),
+    seed=int(os.getenv("LOAD_TEST_SEED", "0")),
+)
+
+
+def stats() -> dict:
+    """Call and error counts per upstream"""
+    return {name: injector.stats() for name, injector in upstreams.items()}
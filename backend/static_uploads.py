@@ -0,0 +1,225 @@
+"""
+Static Uploads Module
+
+Cache-friendly serving of user uploaded files:
+- Strong content-hash ETags and `Cache-Control: immutable`
+  (upload names are UUID-prefixed and never reused)
+- Conditional requests (If-None-Match / If-Modified-Since -> 304)
+- Single byte ranges (Range / If-Range -> 206, 416)
+- Optional precompressed sidecars (`<file>.br`, `<file>.gz`)
+"""
+
+import os
+import gzip
+import hashlib
+import mimetypes
+import threading
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+try:
+    import brotli  # optional, only used to build .br sidecars
+except ImportError:
+    brotli = None
+
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+CHUNK_SIZE = 64 * 1024
+
+# Sidecar encodings in order of preference
+PRECOMPRESSED = [("br", ".br"), ("gzip", ".gz")]
+
+# Types worth compressing; images/video are already compressed
+COMPRESSIBLE_TYPES = ("text/", "image/svg+xml", "image/bmp", "image/tiff", "application/json")
+
+# (path, size, mtime_ns) -> etag, so each file is hashed once per process
+_etag_cache: Dict[Tuple[str, int, int], str] = {}
+_etag_lock = threading.Lock()
+
+
+def _file_etag(path: str, stat_result: os.stat_result) -> str:
+    """Strong ETag from the file content, cached by path/size/mtime"""
+    key = (path, stat_result.st_size, stat_result.st_mtime_ns)
+    etag = _etag_cache.get(key)
+    if etag:
+        return etag
+
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    etag = f'"{digest.hexdigest()[:20]}"'
+
+    with _etag_lock:
+        _etag_cache[key] = etag
+    return etag
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    """If-None-Match uses weak comparison, so W/ prefixes are ignored"""
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Parse a single `bytes=` range
+
+    Returns:
+        (start, end) inclusive, or None if the header should be ignored
+
+    Raises:
+        ValueError: If the range is syntactically valid but unsatisfiable
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        # Unknown unit or multipart ranges - serve the full body instead
+        return None
+
+    start_str, sep, end_str = spec.strip().partition("-")
+    if not sep:
+        return None
+
+    if start_str == end_str == "" or not (start_str.isdigit() or start_str == "") \
+            or not (end_str.isdigit() or end_str == ""):
+        # Malformed header - ignore it
+        return None
+
+    if start_str == "":
+        # Suffix range: last N bytes
+        if int(end_str) == 0:
+            raise ValueError("empty suffix range")
+        return max(size - int(end_str), 0), size - 1
+
+    start = int(start_str)
+    end = min(int(end_str), size - 1) if end_str else size - 1
+    if start >= size or end < start:
+        raise ValueError("range not satisfiable")
+    return start, end
+
+
+def _iter_file_range(path: str, start: int, end: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _select_representation(path: str, accept_encoding: str) -> Tuple[str, Optional[str]]:
+    """Pick a precompressed sidecar if the client accepts it and one exists"""
+    accepted = {part.split(";")[0].strip().lower() for part in accept_encoding.split(",")}
+    for encoding, suffix in PRECOMPRESSED:
+        if encoding in accepted and os.path.isfile(path + suffix):
+            return path + suffix, encoding
+    return path, None
+
+
+def precompress(path: str) -> None:
+    """
+    Write `.gz` (and `.br` when brotli is installed) sidecars for compressible files
+
+    Skips already-compressed media such as JPEG/PNG/WebP where it would only waste space.
+    """
+    media_type = mimetypes.guess_type(path)[0] or ""
+    if not media_type.startswith(COMPRESSIBLE_TYPES):
+        return
+
+    with open(path, "rb") as f:
+        data = f.read()
+
+    with open(path + ".gz", "wb") as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+
+    if brotli is not None:
+        with open(path + ".br", "wb") as f:
+            f.write(brotli.compress(data, quality=11))
+
+
+def serve_upload(request: Request, directory: str, filename: str) -> Response:
+    """
+    Serve one uploaded file with caching, conditional and range support
+
+    Args:
+        request: Incoming request (headers and method are inspected)
+        directory: Uploads directory
+        filename: Requested file name (no sub-directories)
+
+    Returns:
+        200/206 file response, 304 Not Modified, 404 or 416
+    """
+    if not filename or "/" in filename or "\\" in filename or filename.startswith("."):
+        return Response(status_code=404)
+
+    original_path = os.path.join(directory, filename)
+    if not os.path.isfile(original_path):
+        return Response(status_code=404)
+
+    path, encoding = _select_representation(original_path, request.headers.get("accept-encoding", ""))
+    stat_result = os.stat(path)
+    size = stat_result.st_size
+
+    etag = _file_etag(path, stat_result)
+    if encoding:
+        etag = f'{etag[:-1]}-{encoding}"'
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": CACHE_CONTROL,
+        "Last-Modified": formatdate(stat_result.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Vary": "Accept-Encoding",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+
+    # Conditional GET
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if _etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+    elif "if-modified-since" in request.headers:
+        try:
+            since = parsedate_to_datetime(request.headers["if-modified-since"]).timestamp()
+            if int(stat_result.st_mtime) <= since:
+                return Response(status_code=304, headers=headers)
+        except (TypeError, ValueError):
+            pass
+
+    media_type = mimetypes.guess_type(original_path)[0] or "application/octet-stream"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = _parse_range(range_header, size)
+        except ValueError:
+            headers["Content-Range"] = f"bytes */{size}"
+            return Response(status_code=416, headers=headers)
+
+        if byte_range is not None:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            headers["Content-Length"] = str(end - start + 1)
+            if request.method == "HEAD":
+                return Response(status_code=206, headers=headers, media_type=media_type)
+            return StreamingResponse(
+                _iter_file_range(path, start, end),
+                status_code=206,
+                headers=headers,
+                media_type=media_type
+            )
+
+    if request.method == "HEAD":
+        headers["Content-Length"] = str(size)
+        return Response(status_code=200, headers=headers, media_type=media_type)
+
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=stat_result)
@@ -162,13 +162,14 @@ class WeatherService:
             raise Exception(f"Weather data parsing error: {str(e)}")
 
     
-    def get_forecast(self, lat: float, lon: float) -> List[ForecastData]:
+    def get_forecast(self, lat: float, lon: float, timeout: float = 5) -> List[ForecastData]:
         """
         Fetch 5-day/3-hour forecast (40 data points)
         
         Args:
             lat: Latitude
             lon: Longitude
+            timeout: Request timeout in seconds
             
         Returns:
             List of ForecastData objects (up to 40 entries)
@@ -193,7 +194,7 @@ class WeatherService:
                 "units": "metric"
             }
             
-            response = requests.get(url, params=params, timeout=5)
+            response = requests.get(url, params=params, timeout=timeout)
             response.raise_for_status()
             data = response.json()
             
@@ -0,0 +1,114 @@
+"""
+Wire Module
+
+Compact encodings of [lat, lng] polylines for the route endpoints, as an
+alternative to JSON lists of float pairs (slow to parse and validate for
+routes of thousands of points):
+- Google encoded polyline (precision 5, ~1 m), as used by the Maps APIs
+- float32 pairs, little-endian lat,lng,lat,lng,... as base64 text
+- a packed binary request body (application/octet-stream):
+      uint32 route count, uint32 points per route, then the float32 pairs
+      of all routes in order
+
+Decoders return float64 NumPy arrays of shape (n, 2) and are vectorized;
+they raise ValueError on malformed input.
+"""
+
+import base64
+import struct
+from typing import List, Sequence
+
+import numpy as np
+
+OCTET_STREAM = "application/octet-stream"
+POLYLINE_PRECISION = 5
+MAX_CHUNKS = 7  # 5-bit chunks per polyline value; enough for any lat/lng delta
+
+FORMATS = ("json", "polyline", "f32")
+
+
+def _as_points(points) -> np.ndarray:
+    return np.asarray(points, dtype=np.float64).reshape(-1, 2)
+
+
+def decode_polyline(text: str, precision: int = POLYLINE_PRECISION) -> np.ndarray:
+    chars = np.frombuffer(text.encode("ascii"), dtype=np.uint8).astype(np.int64) - 63
+    if len(chars) == 0:
+        return np.zeros((0, 2))
+    if chars.min() < 0 or chars.max() > 63:
+        raise ValueError("Invalid character in polyline")
+    ends = np.flatnonzero((chars & 0x20) == 0)  # last chunk of each value
+    if len(ends) == 0 or ends[-1] != len(chars) - 1:
+        raise ValueError("Truncated polyline")
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    lengths = ends - starts + 1
+    if lengths.max() > MAX_CHUNKS:
+        raise ValueError("Polyline value out of range")
+    if len(ends) % 2:
+        raise ValueError("Polyline has an odd number of values")
+
+    shifts = (np.arange(len(chars)) - np.repeat(starts, lengths)) * 5
+    zigzag = np.add.reduceat((chars & 0x1f) << shifts, starts)
+    deltas = np.where(zigzag & 1, ~(zigzag >> 1), zigzag >> 1)
+    return np.cumsum(deltas.reshape(-1, 2), axis=0) / 10 ** precision
+
+
+def encode_polyline(points, precision: int = POLYLINE_PRECISION) -> str:
+    scaled = np.round(_as_points(points) * 10 ** precision).astype(np.int64)
+    deltas = np.diff(scaled, axis=0, prepend=np.zeros((1, 2), dtype=np.int64)).ravel()
+    zigzag = np.where(deltas < 0, ~(deltas << 1), deltas << 1)
+
+    index = np.arange(MAX_CHUNKS)
+    chunks = (zigzag[:, None] >> (index * 5)) & 0x1f
+    lengths = 1 + ((zigzag[:, None] >> (index[1:] * 5)) > 0).sum(axis=1)
+    chunks |= (index < (lengths - 1)[:, None]) * 0x20  # continuation bit
+    return (chunks[index < lengths[:, None]] + 63).astype(np.uint8).tobytes().decode("ascii")
+
+
+def decode_f32(text: str) -> np.ndarray:
+    raw = base64.b64decode(text, validate=True)
+    if len(raw) % 8:
+        raise ValueError("float32 points must be lat,lng pairs")
+    return np.frombuffer(raw, dtype="<f4").astype(np.float64).reshape(-1, 2)
+
+
+def encode_f32(points) -> str:
+    return base64.b64encode(_as_points(points).astype("<f4").tobytes()).decode("ascii")
+
+
+def pack_routes(routes: Sequence) -> bytes:
+    arrays = [_as_points(r) for r in routes]
+    header = struct.pack(f"<{len(arrays) + 1}I", len(arrays), *(len(a) for a in arrays))
+    return header + b"".join(a.astype("<f4").tobytes() for a in arrays)
+
+
+def unpack_routes(body: bytes) -> List[np.ndarray]:
+    if len(body) < 4:
+        raise ValueError("Body too short")
+    (count,) = struct.unpack_from("<I", body)
+    offset = 4 + 4 * count
+    if len(body) < offset or (len(body) - offset) % 8:
+        raise ValueError("Malformed packed routes")
+    sizes = np.frombuffer(body, dtype="<u4", count=count, offset=4).astype(np.int64)
+    points = np.frombuffer(body, dtype="<f4", offset=offset).astype(np.float64).reshape(-1, 2)
+    if len(points) != sizes.sum():
+        raise ValueError(f"Expected {sizes.sum()} points, got {len(points)}")
+    return np.split(points, np.cumsum(sizes)[:-1])
+
+
+def encode_path(points, fmt: str):
+    """A path in the response format `fmt` (one of FORMATS)"""
+    if fmt == "polyline":
+        return encode_polyline(points)
+    if fmt == "f32":
+        return encode_f32(points)
+    return points
+
+
+def estimate_points(body: bytes, content_type: str) -> int:
+    """Route points in a request body, cheaply (for admission control)"""
+    if content_type.startswith(OCTET_STREAM):
+        return max(0, len(body) - 4) // 8
+    if b'"polyline"' in body or b'"points_f32"' in body:
+        return len(body) // 5  # ~5 characters per encoded point
+    return body.count(b"[")